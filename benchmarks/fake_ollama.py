@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Endpoint HTTP que imita la API de Ollama para los benchmarks
+
+Implementa lo que usa brainslot-mcp-system.py (/api/chat con y sin streaming,
+/api/embed) con tiempos configurables: latencia hasta el primer token y tiempo
+por token. Se puede lanzar como proceso aparte o en un hilo con FakeOllama.
+"""
+
+import argparse
+import hashlib
+import json
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WORDS = ["El", " contenido", " crawleado", " describe", " patrocinadores,", " eventos", " y", " precios", "."]
+
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "FakeOllamaServer"
+
+    def log_message(self, format, *args):
+        pass  # Sin ruido en la salida del benchmark
+
+    def _read_body(self) -> dict:
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length) or b"{}") if length else {}
+
+    def _send_json(self, payload: dict, status: int = 200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/api/version":
+            self._send_json({"version": "0.0.0-fake"})
+        elif self.path == "/api/tags":
+            self._send_json({"models": []})
+        else:
+            self._send_json({"error": "not found"}, 404)
+
+    def do_POST(self):
+        body = self._read_body()
+        if self.path == "/api/chat":
+            self.handle_chat(body)
+        elif self.path == "/api/embed":
+            self.handle_embed(body)
+        else:
+            self._send_json({"error": "not found"}, 404)
+
+    def _chunk(self, model: str, content: str, done: bool, **extra) -> dict:
+        return {
+            "model": model,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "message": {"role": "assistant", "content": content},
+            "done": done,
+            **extra
+        }
+
+    def handle_chat(self, body: dict):
+        model = body.get("model", "fake")
+        settings = self.server.settings
+        started = time.monotonic()
+        tokens = [WORDS[i % len(WORDS)] for i in range(settings["tokens"])]
+        time.sleep(settings["ttft_ms"] / 1000)
+
+        if not body.get("stream", True):
+            time.sleep(settings["token_ms"] * len(tokens) / 1000)
+            self._send_json(self._chunk(model, "".join(tokens), True, done_reason="stop",
+                                        eval_count=len(tokens),
+                                        total_duration=int((time.monotonic() - started) * 1e9)))
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for token in tokens:
+            self._write_chunk(self._chunk(model, token, False))
+            time.sleep(settings["token_ms"] / 1000)
+        self._write_chunk(self._chunk(model, "", True, done_reason="stop", eval_count=len(tokens),
+                                      total_duration=int((time.monotonic() - started) * 1e9)))
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _write_chunk(self, payload: dict):
+        data = json.dumps(payload).encode() + b"\n"
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def handle_embed(self, body: dict):
+        texts = body.get("input", [])
+        if isinstance(texts, str):
+            texts = [texts]
+        dimensions = self.server.settings["embedding_dim"]
+        embeddings = []
+        for text in texts:
+            digest = hashlib.sha256(text.encode()).digest()
+            embeddings.append([(digest[i % len(digest)] - 128) / 128 for i in range(dimensions)])
+        self._send_json({"model": body.get("model", "fake"), "embeddings": embeddings})
+
+
+class FakeOllamaServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, settings: dict):
+        super().__init__(address, FakeOllamaHandler)
+        self.settings = settings
+
+
+class FakeOllama:
+    """Servidor Ollama falso en un hilo; usar como context manager"""
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, ttft_ms: float = 100.0,
+                 token_ms: float = 5.0, tokens: int = 40, embedding_dim: int = 64):
+        self.server = FakeOllamaServer((host, port), {
+            "ttft_ms": ttft_ms, "token_ms": token_ms, "tokens": tokens, "embedding_dim": embedding_dim
+        })
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self) -> "FakeOllama":
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="API de Ollama falsa para benchmarks")
+    parser.add_argument('--port', type=int, default=11435)
+    parser.add_argument('--ttft-ms', type=float, default=100.0, help="Latencia hasta el primer token")
+    parser.add_argument('--token-ms', type=float, default=5.0, help="Tiempo entre tokens")
+    parser.add_argument('--tokens', type=int, default=40, help="Tokens por respuesta")
+    args = parser.parse_args()
+
+    with FakeOllama(port=args.port, ttft_ms=args.ttft_ms, token_ms=args.token_ms, tokens=args.tokens) as fake:
+        print(f"🦙 Ollama falso escuchando en {fake.url} (OLLAMA_HOST={fake.url})")
+        try:
+            fake.thread.join()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+"""
+Benchmarks de la capa de integración (MCPToolExecutor / OllamaMCPSession)
+
+Funciona sin red: usa benchmarks/stub_mcp_server.py en lugar del servidor MCP real
+y benchmarks/fake_ollama.py en lugar de Ollama. Mide:
+
+- startup:  tiempo hasta que el executor responde a initialize + tools/list
+- executor: tools/call concurrentes contra el executor (o el pool con --workers)
+- e2e:      execute_mcp_for_request + respuesta en streaming de Ollama por turno
+
+Uso:
+    python benchmarks/run_benchmarks.py --requests 500 --concurrency 32
+    python benchmarks/run_benchmarks.py --json results.json
+    python benchmarks/run_benchmarks.py --baseline results.json --tolerance 0.2
+"""
+
+import argparse
+import asyncio
+import contextlib
+import importlib.util
+import io
+import json
+import logging
+import os
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Dict, List, Optional
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+SYSTEM_MODULE_PATH = os.path.join(REPO_ROOT, "brainslot-mcp-system.py")
+STUB_SERVER_PATH = os.path.join(BENCH_DIR, "stub_mcp_server.py")
+
+sys.path.insert(0, BENCH_DIR)
+from fake_ollama import FakeOllama  # noqa: E402
+
+# Métricas donde un valor mayor es peor (el resto, como rps, al revés)
+HIGHER_IS_WORSE = {"p50_ms", "p99_ms", "mean_ms"}
+
+
+def load_system_module():
+    """Importa brainslot-mcp-system.py (el guion del nombre impide un import normal)"""
+    spec = importlib.util.spec_from_file_location("brainslot_mcp_system", SYSTEM_MODULE_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Percentil por rango más cercano"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+def summarize(latencies: List[float], elapsed: float, errors: int = 0) -> Dict[str, float]:
+    """Resumen de latencias (segundos) en ms y throughput"""
+    return {
+        "count": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 2) if latencies else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+    }
+
+
+def peak_rss_mb() -> float:
+    """Pico de memoria residente de este proceso (ru_maxrss está en KB en Linux, bytes en macOS)"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def process_rss_mb(pid: int) -> Optional[float]:
+    """Pico de memoria de otro proceso (solo Linux, vía /proc)"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def server_rss_mb(executor) -> Optional[float]:
+    """Pico de memoria de los procesos servidor del executor o del pool"""
+    workers = getattr(executor, "workers", None) or [executor]
+    values = [process_rss_mb(w.mcp_process.pid) for w in workers if w.mcp_process]
+    values = [v for v in values if v is not None]
+    return round(sum(values), 1) if values else None
+
+
+class BenchmarkRunner:
+    def __init__(self, bs, args: argparse.Namespace):
+        self.bs = bs
+        self.args = args
+        self.stub_command = [
+            sys.executable, STUB_SERVER_PATH,
+            "--startup-ms", str(args.server_startup_ms),
+            "--latency-ms", str(args.latency_ms),
+            "--jitter-ms", str(args.jitter_ms),
+            "--payload-bytes", str(args.payload_bytes),
+            "--noise-lines", str(args.noise_lines),
+        ]
+
+    def new_executor(self):
+        if self.args.workers > 1:
+            return self.bs.MCPExecutorPool(self.stub_command, min_workers=self.args.workers,
+                                           max_workers=self.args.workers)
+        return self.bs.MCPToolExecutor(self.stub_command, verbose=False)
+
+    async def bench_startup(self) -> Dict[str, Any]:
+        latencies = []
+        for _ in range(self.args.startup_runs):
+            executor = self.new_executor()
+            started = time.monotonic()
+            response = await executor.start_mcp_server()
+            elapsed = time.monotonic() - started
+            await executor.stop()
+            if not response or response.get("error"):
+                raise RuntimeError("El servidor stub no respondió a initialize/tools/list")
+            latencies.append(elapsed)
+        return summarize(latencies, sum(latencies))
+
+    async def run_load(self, operation, total: int, concurrency: int) -> Dict[str, Any]:
+        """Ejecuta operation total veces con concurrency tareas; devuelve latencias y errores"""
+        latencies: List[float] = []
+        errors = 0
+        remaining = iter(range(total))
+
+        async def worker():
+            nonlocal errors
+            for index in remaining:
+                started = time.monotonic()
+                try:
+                    await operation(index)
+                    latencies.append(time.monotonic() - started)
+                except Exception:
+                    errors += 1
+
+        started = time.monotonic()
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+        return summarize(latencies, time.monotonic() - started, errors)
+
+    async def bench_executor(self) -> Dict[str, Any]:
+        executor = self.new_executor()
+        await executor.start_mcp_server()
+
+        async def call(index: int):
+            response = await executor.execute_tool("bs.ingest_url", {
+                "url": f"https://bench.example/{index}", "contentMode": self.args.content_mode
+            })
+            if response.get("error"):
+                raise RuntimeError(response["error"].get("message"))
+            # Incluir el coste de obtener el contenido, esté inline o referenciado
+            if self.bs.payload_content(self.bs.parse_tool_payload(response) or {}) is None:
+                raise RuntimeError("Respuesta sin contenido")
+
+        try:
+            await call(-1)  # Calentamiento
+            result = await self.run_load(call, self.args.requests, self.args.concurrency)
+            result["server_rss_mb"] = server_rss_mb(executor)
+        finally:
+            await executor.stop()
+        return result
+
+    async def bench_e2e(self) -> Dict[str, Dict[str, Any]]:
+        # Sin caché de respuestas: se mide la generación de Ollama en cada turno
+        session = self.bs.OllamaMCPSession(context_tokens=self.args.context_tokens, response_cache_size=0)
+        session.mcp_executor = self.new_executor()
+        await session.mcp_executor.start_mcp_server()
+
+        mcp_latencies: List[float] = []
+
+        async def turn(index: int):
+            user_input = f"Crawlea https://bench.example/{index} y dime qué patrocinadores aparecen"
+            started = time.monotonic()
+            mcp_result = await session.execute_mcp_for_request(user_input)
+            mcp_latencies.append(time.monotonic() - started)
+            # Sin add_turn: todos los turnos parten del mismo historial
+            await session.stream_chat(session.memory.build(f"{user_input}\n\n{mcp_result}"))
+
+        try:
+            await turn(-1)  # Calentamiento (conexión HTTP con Ollama)
+            mcp_latencies.clear()
+            turns = await self.run_load(turn, self.args.turns, self.args.turn_concurrency)
+            turns["server_rss_mb"] = server_rss_mb(session.mcp_executor)
+        finally:
+            await session.mcp_executor.stop()
+            session.artifact_index.close()
+
+        mcp = summarize(mcp_latencies, 0.0)
+        mcp.pop("rps")  # Solo tiene sentido para el turno completo
+        return {"e2e_mcp": mcp, "e2e_turn": turns}
+
+    async def run(self) -> Dict[str, Dict[str, Any]]:
+        results = {}
+        scenarios = [
+            ("startup", self.bench_startup),
+            ("executor", self.bench_executor),
+            ("e2e", self.bench_e2e),
+        ]
+        for name, scenario in scenarios:
+            if name not in self.args.only:
+                continue
+            if self.args.trace_memory:
+                tracemalloc.start()
+            print(f"⏱️  {name}...", file=sys.stderr, flush=True)
+            # La salida de consola de la integración (tools, tokens) forma parte del coste pero no del informe
+            with contextlib.redirect_stdout(io.StringIO()):
+                outcome = await scenario()
+            rows = outcome if name == "e2e" else {name: outcome}
+            for row in rows.values():
+                row["client_peak_rss_mb"] = peak_rss_mb()
+                if self.args.trace_memory:
+                    row["python_peak_mb"] = round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 2)
+            if self.args.trace_memory:
+                tracemalloc.stop()
+            results.update(rows)
+        return results
+
+
+def print_table(results: Dict[str, Dict[str, Any]]):
+    columns = ["count", "errors", "rps", "mean_ms", "p50_ms", "p99_ms", "client_peak_rss_mb", "server_rss_mb",
+               "python_peak_mb"]
+    columns = [c for c in columns if any(c in row for row in results.values())]
+    print(f"{'scenario':<10} " + " ".join(f"{c:>18}" for c in columns))
+    for name, row in results.items():
+        cells = " ".join(f"{'-' if row.get(c) is None else row[c]:>18}" for c in columns)
+        print(f"{name:<10} {cells}")
+
+
+def compare_with_baseline(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]],
+                          tolerance: float) -> List[str]:
+    """Lista de regresiones mayores que tolerance (fracción) respecto al baseline"""
+    regressions = []
+    for scenario, row in results.items():
+        for metric in ("rps", "p50_ms", "p99_ms"):
+            previous = baseline.get(scenario, {}).get(metric)
+            current = row.get(metric)
+            if not previous or current is None or (metric == "rps" and scenario == "startup"):
+                continue
+            change = (current - previous) / previous
+            worsening = change if metric in HIGHER_IS_WORSE else -change
+            if worsening > tolerance:
+                regressions.append(f"{scenario}.{metric}: {previous} → {current} ({change:+.0%})")
+    return regressions
+
+
+def parse_args(argv: List[str] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmarks offline de la integración Ollama + BrainSlot MCP")
+    parser.add_argument('--only', nargs='+', default=["startup", "executor", "e2e"],
+                        choices=["startup", "executor", "e2e"], help="Escenarios a ejecutar")
+    parser.add_argument('--startup-runs', type=int, default=5)
+    parser.add_argument('--requests', type=int, default=200, help="tools/call en el escenario executor")
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--turns', type=int, default=30, help="Turnos en el escenario e2e")
+    parser.add_argument('--turn-concurrency', type=int, default=4)
+    parser.add_argument('--workers', type=int, default=1, help="Procesos MCP (>1 usa MCPExecutorPool)")
+    parser.add_argument('--context-tokens', type=int, default=1500)
+    parser.add_argument('--content-mode', choices=["inline", "reference"], default="reference",
+                        help="contentMode de bs.ingest_url en el escenario executor (e2e usa el de la sesión)")
+    stub = parser.add_argument_group("servidor MCP stub")
+    stub.add_argument('--server-startup-ms', type=float, default=0.0)
+    stub.add_argument('--latency-ms', type=float, default=50.0)
+    stub.add_argument('--jitter-ms', type=float, default=20.0)
+    stub.add_argument('--payload-bytes', type=int, default=20000)
+    stub.add_argument('--noise-lines', type=int, default=0)
+    fake = parser.add_argument_group("Ollama falso")
+    fake.add_argument('--ollama-ttft-ms', type=float, default=100.0)
+    fake.add_argument('--ollama-token-ms', type=float, default=5.0)
+    fake.add_argument('--ollama-tokens', type=int, default=40)
+    parser.add_argument('--trace-memory', action='store_true',
+                        help="Medir el pico de memoria Python con tracemalloc (ralentiza las medidas)")
+    parser.add_argument('--json', help="Guardar los resultados en este fichero")
+    parser.add_argument('--baseline', help="Resultados previos (--json) con los que comparar")
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help="Empeoramiento máximo permitido respecto al baseline (0.2 = 20%%)")
+    parser.add_argument('--verbose', action='store_true', help="Mostrar los logs de la integración")
+    return parser.parse_args(argv)
+
+
+def main(argv: List[str] = None) -> int:
+    args = parse_args(argv)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+    output_path = os.path.abspath(args.json) if args.json else None
+
+    with FakeOllama(ttft_ms=args.ollama_ttft_ms, token_ms=args.ollama_token_ms,
+                    tokens=args.ollama_tokens) as fake, tempfile.TemporaryDirectory() as workdir:
+        # El cliente de Ollama lee OLLAMA_HOST al crearse; los datos (.data, log) van al directorio temporal
+        os.environ["OLLAMA_HOST"] = fake.url
+        os.chdir(workdir)
+        bs = load_system_module()
+        log_listener = bs.setup_logging(log_file=None) if args.verbose else None
+        if not args.verbose:
+            for name in ("OllamaMCP", "httpx"):
+                logging.getLogger(name).setLevel(logging.WARNING)
+        results = asyncio.run(BenchmarkRunner(bs, args).run())
+        if log_listener:
+            log_listener.stop()
+        os.chdir(REPO_ROOT)
+
+    print_table(results)
+    if output_path:
+        with open(output_path, "w", encoding="utf-8") as f:
+            json.dump({"config": vars(args), "results": results}, f, indent=2)
+        print(f"\n💾 Resultados guardados en {output_path}")
+
+    if baseline:
+        regressions = compare_with_baseline(results, baseline, args.tolerance)
+        if regressions:
+            print("\n❌ Regresiones respecto al baseline:")
+            for regression in regressions:
+                print(f"   • {regression}")
+            return 1
+        print("\n✅ Sin regresiones respecto al baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
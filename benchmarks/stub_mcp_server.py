@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Servidor MCP de pruebas para los benchmarks
+
+Habla el mismo JSON-RPC sobre stdio que mcp-server-standalone.ts pero sin crawler:
+cada tools/call responde tras una latencia configurable con un payload sintético
+del tamaño indicado. Puede intercalar líneas de ruido en stdout (como hacen los
+console.log del servidor real) y escribir diagnósticos en stderr. Con
+contentMode 'reference' devuelve contentRef a un fichero en .data/crawled, como
+el servidor real.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+
+TOOLS = [
+    {
+        "name": "bs.ingest_url",
+        "description": "Ingesta una URL (stub de benchmark)",
+        "inputSchema": {
+            "type": "object",
+            "properties": {
+                "url": {"type": "string", "description": "URL a ingerir"},
+                "rules": {"type": "object", "description": "Reglas de crawling"}
+            },
+            "required": ["url"]
+        }
+    },
+    {
+        "name": "bs.advanced_crawl",
+        "description": "Crawling avanzado (stub de benchmark)",
+        "inputSchema": {
+            "type": "object",
+            "properties": {"url": {"type": "string", "description": "URL a crawlear"}},
+            "required": ["url"]
+        }
+    }
+]
+
+PARAGRAPH = (
+    "BrainSlot benchmark content about sponsors, events, pricing and contact details. "
+    "Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod tempor. "
+)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Servidor MCP stub para benchmarks")
+    parser.add_argument('--startup-ms', type=float, default=0.0, help="Retardo antes de aceptar peticiones")
+    parser.add_argument('--latency-ms', type=float, default=50.0, help="Latencia media de tools/call")
+    parser.add_argument('--jitter-ms', type=float, default=0.0, help="Variación uniforme (±) de la latencia")
+    parser.add_argument('--payload-bytes', type=int, default=20000, help="Tamaño de fullContent en cada respuesta")
+    parser.add_argument('--noise-lines', type=int, default=0,
+                        help="Líneas no JSON escritas en stdout antes de cada respuesta")
+    parser.add_argument('--stderr-lines', type=int, default=0,
+                        help="Líneas de diagnóstico escritas en stderr por cada tools/call")
+    return parser.parse_args()
+
+
+def build_content(size: int) -> str:
+    """Markdown sintético de aproximadamente size bytes, con párrafos para el ContextBuilder"""
+    paragraphs = []
+    total = 0
+    section = 0
+    while total < size:
+        block = f"## Sección {section}\n\n{PARAGRAPH * 4}\n\n"
+        paragraphs.append(block)
+        total += len(block)
+        section += 1
+    return "".join(paragraphs)[:size]
+
+
+class StubServer:
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.content = build_content(args.payload_bytes)
+        self.content_file = None
+
+    def write(self, message: dict):
+        noise = "".join(f"🕷️ [Stub MCP] ruido {i}\n" for i in range(self.args.noise_lines))
+        sys.stdout.write(noise + json.dumps(message) + "\n")
+        sys.stdout.flush()
+
+    async def call_tool(self, params: dict) -> dict:
+        delay = self.args.latency_ms + random.uniform(-self.args.jitter_ms, self.args.jitter_ms)
+        await asyncio.sleep(max(0.0, delay) / 1000)
+        for i in range(self.args.stderr_lines):
+            print(f"🔧 [Stub MCP] diagnóstico {i}", file=sys.stderr)
+
+        arguments = params.get("arguments", {})
+        payload = {
+            "jobId": f"bench_{time.time_ns()}",
+            "url": arguments.get("url", ""),
+            "title": "Benchmark",
+            "status": "completed",
+            "contentSize": len(self.content),
+            "contentPreview": self.content[:500] + "...",
+            "files": {}
+        }
+        if arguments.get("contentMode") != "reference":
+            payload["fullContent"] = self.content
+            return {"content": [{"type": "text", "text": json.dumps(payload, ensure_ascii=False, indent=2)}]}
+
+        content_file = self.write_content_file()
+        payload["contentRef"] = {
+            "field": "fullContent",
+            "path": content_file,
+            "uri": f"file://{os.path.abspath(content_file)}",
+            "size": len(self.content.encode()),
+            "mimeType": "text/markdown"
+        }
+        payload["files"]["contentFile"] = content_file
+        return {"content": [
+            {"type": "text", "text": json.dumps(payload, ensure_ascii=False)},
+            {"type": "resource_link", "uri": payload["contentRef"]["uri"], "name": os.path.basename(content_file)}
+        ]}
+
+    def write_content_file(self) -> str:
+        """El contenido sintético se escribe una vez; todas las referencias apuntan a él"""
+        if self.content_file is None:
+            data_root = os.environ.get("BS_DATA_ROOT", ".data")
+            os.makedirs(os.path.join(data_root, "crawled"), exist_ok=True)
+            self.content_file = os.path.join(data_root, "crawled", "stub_benchmark_content.md")
+            with open(self.content_file, "w", encoding="utf-8") as f:
+                f.write(self.content)
+        return self.content_file
+
+    async def handle(self, request: dict):
+        if "id" not in request:
+            return  # Notificación (notifications/initialized, etc.)
+
+        method = request.get("method")
+        if method == "initialize":
+            result = {
+                "protocolVersion": request.get("params", {}).get("protocolVersion", "2025-06-18"),
+                "capabilities": {"tools": {}},
+                "serverInfo": {"name": "brainslot-stub", "version": "0.0.0"}
+            }
+        elif method == "tools/list":
+            result = {"tools": TOOLS}
+        elif method == "tools/call":
+            result = await self.call_tool(request.get("params", {}))
+        elif method == "ping":
+            result = {}
+        else:
+            self.write({"jsonrpc": "2.0", "id": request["id"],
+                        "error": {"code": -32601, "message": f"Método no soportado: {method}"}})
+            return
+        self.write({"jsonrpc": "2.0", "id": request["id"], "result": result})
+
+    async def run(self):
+        if self.args.startup_ms:
+            await asyncio.sleep(self.args.startup_ms / 1000)
+
+        loop = asyncio.get_running_loop()
+        reader = asyncio.StreamReader(limit=64 * 1024 * 1024)
+        await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+        print("✅ [Stub MCP] Servidor listo", file=sys.stderr, flush=True)
+
+        tasks = set()
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            try:
+                request = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            task = asyncio.create_task(self.handle(request))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+
+if __name__ == "__main__":
+    asyncio.run(StubServer(parse_args()).run())
@@ -7,40 +7,581 @@ creando una sesión interactiva donde el usuario puede solicitar crawling y
 Ollama automáticamente ejecuta las herramientas MCP necesarias.
 """
 
+import argparse
 import asyncio
+import contextlib
+import copy
+import gzip
+import hashlib
 import json
 import subprocess
-import ollama
 import sys
 import os
 import logging
+import logging.handlers
+import queue
+import math
+import mmap
+import random
+import re
+import sqlite3
+import struct
+import threading
 import time
-from typing import Dict, Any, List
-
-# Configurar logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('ollama-mcp-integration.log'),
-        logging.StreamHandler()
-    ]
-)
+import urllib.request
+import uuid
+import zlib
+from collections import Counter, OrderedDict, deque
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Iterable, AsyncIterator, Awaitable, Callable
+from urllib.parse import urljoin, urlparse, urlsplit, urlunsplit, parse_qsl, urlencode
+from urllib.robotparser import RobotFileParser
+from xml.etree import ElementTree
+
+try:
+    import ollama
+except ImportError:  # Necesario solo para hablar con el modelo: crawls batch, cola y empaquetado funcionan sin él
+    ollama = None
+
+try:
+    import numpy as np
+except ImportError:  # Solo necesario para el índice vectorial opcional
+    np = None
+
+try:
+    import zstandard
+except ImportError:  # Sin zstandard los segmentos empaquetados se comprimen con zlib
+    zstandard = None
+
+# Logging: setup_logging() lo configura al arrancar desde main()
+LOG_FILE = 'ollama-mcp-integration.log'
 logger = logging.getLogger('OllamaMCP')
+# Eventos por mensaje JSON-RPC (alto volumen, muestreados por SampleFilter)
+wire_logger = logging.getLogger('OllamaMCP.wire')
+
+class LazyJSON:
+    """Serializa el valor a JSON solo si el registro de log llega a formatearse"""
+    __slots__ = ('value', 'indent', 'text')
+    
+    def __init__(self, value: Any, indent: int = None):
+        self.value = value
+        self.indent = indent
+        self.text = None
+    
+    def __str__(self) -> str:
+        if self.text is None:
+            self.text = json.dumps(self.value, indent=self.indent, ensure_ascii=False, default=str)
+        return self.text
+
+class JsonLinesFormatter(logging.Formatter):
+    """Un objeto JSON por línea: ts, level, logger, msg, campos de extra= y excepción"""
+    RESERVED = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+    
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage()
+        }
+        entry.update((key, value) for key, value in record.__dict__.items() if key not in self.RESERVED)
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class SampleFilter(logging.Filter):
+    """Deja pasar 1 de cada `every` registros por debajo de WARNING; avisos y errores siempre"""
+    def __init__(self, every: int = 1):
+        super().__init__()
+        self.every = max(1, every)
+        self.seen = 0
+    
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        self.seen += 1
+        return (self.seen - 1) % self.every == 0
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler que no formatea en el hilo del event loop
+    
+    El QueueHandler estándar formatea el mensaje en prepare(); aquí el registro se
+    encola tal cual y el QueueListener lo formatea (LazyJSON incluido) al escribirlo.
+    Los argumentos de log no deben modificarse después de registrarlos.
+    """
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+def setup_logging(level: int = logging.INFO, log_file: Optional[str] = LOG_FILE,
+                  sample_every: int = 10) -> logging.handlers.QueueListener:
+    """
+    Logging fuera del event loop: los handlers (consola en texto, fichero en JSON
+    lines) escriben desde el hilo de un QueueListener
+    """
+    console = logging.StreamHandler()
+    console.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+    handlers: List[logging.Handler] = [console]
+    if log_file:
+        file_handler = logging.FileHandler(log_file, encoding='utf-8')
+        file_handler.setFormatter(JsonLinesFormatter())
+        handlers.append(file_handler)
+    
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.handlers = [DeferredQueueHandler(log_queue)]
+    root.setLevel(level)
+    for existing in [f for f in wire_logger.filters if isinstance(f, SampleFilter)]:
+        wire_logger.removeFilter(existing)
+    wire_logger.addFilter(SampleFilter(sample_every))
+    
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    return listener
+
+# Fuente del servidor MCP y su build precompilado, relativos a este script y no al CWD
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+SERVER_SOURCE_PATH = os.path.join(PROJECT_DIR, "mcp-server-standalone.ts")
+# Fuentes que el build compila junto al servidor (sus imports de packages/core)
+SERVER_SOURCE_DIRS = [os.path.join(PROJECT_DIR, "packages", "core", "src")]
+COMPILED_SERVER_PATH = os.path.join(PROJECT_DIR, "dist-server", "mcp-server-standalone.js")
+
+# Directorios de datos compartidos con el servidor MCP (BS_DATA_ROOT)
+DATA_ROOT = ".data"
+CRAWLED_DIR = os.path.join(DATA_ROOT, "crawled")
+JOBS_DB_PATH = os.path.join(DATA_ROOT, "jobs.sqlite")
+LLM_CACHE_PATH = os.path.join(DATA_ROOT, "llm-cache.sqlite")
+# Tamaño a partir del cual se cierra un segmento del almacenamiento empaquetado
+PACKED_SEGMENT_BYTES = 256 * 1024 * 1024
+# User-Agent de las peticiones propias (robots.txt y sitemaps)
+CRAWLER_USER_AGENT = "BrainSlotMCP/1.0"
+
+# Modelo de Ollama usado para chat y análisis
+OLLAMA_MODEL = 'llama3.1:8b'
+
+# Prefijo fijo de todas las conversaciones: no debe cambiar entre turnos para que
+# Ollama pueda reutilizar su caché de prompt
+SYSTEM_PROMPT = (
+    "Eres el asistente del sistema BrainSlot. Respondes en el idioma del usuario y te basas "
+    "en el contenido crawleado que se te proporciona cuando está disponible. Si la información "
+    "no aparece en ese contenido, dilo claramente."
+)
+
+# Reglas por defecto para bs.ingest_url
+DEFAULT_INGEST_RULES = {
+    "extractMarkdown": True,
+    "wordThreshold": 50,
+    "respectRobots": True
+}
+
+# Las herramientas de crawling devuelven el contenido por referencia (contentRef): la
+# página no viaja por stdio y se lee del fichero solo cuando hace falta
+CONTENT_MODE = "reference"
+
+# Campos de los resultados de crawling que cambian en cada crawl aunque la página no cambie:
+# no entran en la clave de caché (el resto de campos de cualquier herramienta sí)
+VOLATILE_RESULT_FIELDS = ('jobId', 'timestamp', 'files', 'contentRef', 'previousVersion', 'unchangedSince',
+                          'changed', 'changes')
+# Líneas de los resultados de crawling en texto que cambian aunque la página no cambie
+VOLATILE_RESULT_LINE = re.compile(r'^\s*• (?:Timestamp|Contenido|Metadatos|Directorio|Cambios):.*\n?', re.M)
+
+# Límite de línea del StreamReader de stdout (una respuesta JSON-RPC por línea)
+MCP_STREAM_LIMIT = 64 * 1024 * 1024
+
+def parse_tool_payload(response: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Extrae el objeto JSON que devuelven las herramientas BrainSlot en content[0].text"""
+    if not response or not isinstance(response.get("result"), dict):
+        return None
+    content = response["result"].get("content", [])
+    if not content or not isinstance(content, list) or not isinstance(content[0], dict):
+        return None
+    try:
+        payload = json.loads(content[0].get("text", ""))
+    except (json.JSONDecodeError, TypeError):
+        return None
+    # Solo objetos: un JSON válido pero de otro tipo ([1, 2], "texto") no es un resultado
+    return payload if isinstance(payload, dict) else None
+
+def read_mapped_text(path: str) -> str:
+    """Lee un fichero de texto mapeado en memoria, sin buffers de lectura intermedios"""
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return ""
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return str(mapped, 'utf-8', errors='replace')
+
+def payload_content(payload: Dict[str, Any], artifact_index: 'CrawlArtifactIndex' = None) -> Optional[str]:
+    """
+    Contenido de un resultado de crawling: inline (fullContent/extractedContent) o vía contentRef
+    
+    Con artifact_index, un contentRef cuyo fichero ya se empaquetó (--pack-crawled) se lee
+    de su segmento: un re-crawl sin cambios apunta a la versión anterior.
+    """
+    for field in ('fullContent', 'extractedContent'):
+        if isinstance(payload.get(field), str):
+            return payload[field]
+    
+    content_ref = payload.get('contentRef')
+    if not isinstance(content_ref, dict) or not content_ref.get('path'):
+        return None
+    path = os.path.realpath(content_ref['path'])
+    if not path.startswith(os.path.realpath(DATA_ROOT) + os.sep):
+        logger.warning(f"⚠️ contentRef fuera de {DATA_ROOT}, ignorado: {content_ref['path']}")
+        return None
+    try:
+        if artifact_index is not None:
+            return artifact_index.read_content(content_ref['path'])
+        return read_mapped_text(path)
+    except (OSError, ValueError, RuntimeError) as e:
+        logger.warning(f"⚠️ No se pudo leer el contenido referenciado {path}: {e}")
+        return None
+
+def normalize_url(url: str) -> str:
+    """Normaliza una URL: host en minúsculas, sin fragmento ni puerto por defecto y query ordenada"""
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    port = parts.port
+    netloc = host if port is None or (scheme, port) in (('http', 80), ('https', 443)) else f"{host}:{port}"
+    path = parts.path or '/'
+    if len(path) > 1:
+        path = path.rstrip('/') or '/'
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, netloc, path, query, ''))
+
+def resolve_mcp_command(use_compiled: bool = True) -> List[str]:
+    """
+    Elige cómo lanzar el servidor MCP
+    
+    Usa el build JS precompilado (pnpm build:server) si existe y es posterior a todos
+    los fuentes TypeScript que compila; si no, recurre a tsx, que transpila en cada arranque.
+    """
+    if use_compiled and os.path.exists(COMPILED_SERVER_PATH):
+        newest_path, newest_mtime = newest_server_source()
+        if os.path.getmtime(COMPILED_SERVER_PATH) >= newest_mtime:
+            return ["node", COMPILED_SERVER_PATH]
+        logger.warning(f"⚠️ {COMPILED_SERVER_PATH} es más antiguo que {newest_path}, usando tsx (ejecuta pnpm build:server)")
+    return ["npx", "tsx", SERVER_SOURCE_PATH]
+
+def newest_server_source() -> tuple:
+    """(ruta, mtime) del fuente TypeScript del servidor modificado más recientemente"""
+    newest = (SERVER_SOURCE_PATH, os.path.getmtime(SERVER_SOURCE_PATH))
+    for source_dir in SERVER_SOURCE_DIRS:
+        for directory, _, files in os.walk(source_dir):
+            for name in files:
+                if name.endswith('.ts'):
+                    path = os.path.join(directory, name)
+                    mtime = os.path.getmtime(path)
+                    if mtime > newest[1]:
+                        newest = (path, mtime)
+    return newest
+
+def describe_changes(payload: Dict[str, Any]) -> str:
+    """Resumen legible de changed/changes de un re-crawl ('' en el primer crawl de la URL)"""
+    if payload.get("changed") is False:
+        return f"sin cambios desde {payload.get('unchangedSince', 'el último crawl')}"
+    changes = payload.get("changes")
+    if not changes:
+        return ""
+    sections = ', '.join(changes.get("changedSections") or [])
+    return (f"{changes.get('addedChunks', 0)} fragmentos nuevos, {changes.get('removedChunks', 0)} eliminados"
+            + (f" ({sections})" if sections else ""))
+
+def cache_fingerprint(message: Dict[str, Any]) -> Dict[str, Any]:
+    """Mensaje reducido a lo que determina la respuesta: sin identificadores, fechas ni rutas de cada crawl"""
+    content = message.get('content') or ''
+    if message.get('role') == 'tool':
+        try:
+            payload = json.loads(content)
+        except json.JSONDecodeError:
+            payload = None
+        if isinstance(payload, dict):
+            content = {field: value for field, value in payload.items() if field not in VOLATILE_RESULT_FIELDS}
+            if 'jobId' in payload:
+                content.pop('message', None)  # En los crawls solo repite la ruta del fichero guardado
+    else:
+        content = VOLATILE_RESULT_LINE.sub('', content)
+    return {'role': message.get('role'), 'content': content, 'tool_calls': message.get('tool_calls')}
+
+def print_tools(tools: List[Dict[str, Any]]):
+    """Muestra por consola las herramientas MCP disponibles"""
+    print(f"✅ {len(tools)} herramientas MCP disponibles:")
+    for tool in tools:
+        print(f"   • {tool.get('name', 'Unknown')}: {tool.get('description', 'No description')}")
+
+# Buckets de los histogramas (segundos y bytes)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864)
+RATE_BUCKETS = (1, 2, 5, 10, 20, 30, 50, 75, 100, 150, 200)
+
+class Metrics:
+    """
+    Registro de métricas en memoria (counters, gauges, histogramas) exportable en
+    el formato de texto de Prometheus
+    
+    Sin dependencias y sin locks: todas las actualizaciones ocurren en el event loop.
+    """
+    def __init__(self, prefix: str = "brainslot"):
+        self.prefix = prefix
+        # nombre → {"type", "help", "buckets", "series": {labels: valor | [buckets..., suma, cuenta]}}
+        self.metrics: Dict[str, Dict[str, Any]] = {}
+    
+    def _series(self, kind: str, name: str, help_text: str, buckets: tuple = None) -> Dict[tuple, Any]:
+        metric = self.metrics.get(name)
+        if metric is None:
+            metric = self.metrics[name] = {"type": kind, "help": help_text, "buckets": buckets, "series": {}}
+        return metric["series"]
+    
+    def inc(self, name: str, value: float = 1.0, help_text: str = "", **labels):
+        series = self._series("counter", name, help_text)
+        key = tuple(sorted(labels.items()))
+        series[key] = series.get(key, 0.0) + value
+    
+    def gauge_add(self, name: str, delta: float, help_text: str = "", **labels):
+        series = self._series("gauge", name, help_text)
+        key = tuple(sorted(labels.items()))
+        series[key] = series.get(key, 0.0) + delta
+    
+    def observe(self, name: str, value: float, buckets: tuple = LATENCY_BUCKETS, help_text: str = "", **labels):
+        series = self._series("histogram", name, help_text, buckets)
+        key = tuple(sorted(labels.items()))
+        state = series.get(key)
+        if state is None:
+            # Cuentas no acumuladas por bucket (+Inf al final), suma y total
+            state = series[key] = [0] * (len(buckets) + 1) + [0.0, 0]
+        index = next((i for i, bound in enumerate(buckets) if value <= bound), len(buckets))
+        state[index] += 1
+        state[-2] += value
+        state[-1] += 1
+    
+    @staticmethod
+    def _labels(pairs) -> str:
+        if not pairs:
+            return ""
+        def escape(value) -> str:
+            return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        return "{" + ",".join(f'{key}="{escape(value)}"' for key, value in pairs) + "}"
+    
+    def render(self) -> str:
+        """Exposición en formato de texto de Prometheus (version 0.0.4)"""
+        lines = []
+        for name, metric in sorted(self.metrics.items()):
+            full_name = f"{self.prefix}_{name}"
+            lines.append(f"# HELP {full_name} {metric['help']}")
+            lines.append(f"# TYPE {full_name} {metric['type']}")
+            for labels, value in metric["series"].items():
+                if metric["type"] != "histogram":
+                    lines.append(f"{full_name}{self._labels(labels)} {value}")
+                    continue
+                cumulative = 0
+                for bound, count in zip([*metric["buckets"], "+Inf"], value[:-2]):
+                    cumulative += count
+                    lines.append(f"{full_name}_bucket{self._labels((*labels, ('le', bound)))} {cumulative}")
+                lines.append(f"{full_name}_sum{self._labels(labels)} {value[-2]}")
+                lines.append(f"{full_name}_count{self._labels(labels)} {value[-1]}")
+        return "\n".join(lines) + "\n"
+    
+    async def serve(self, port: int, host: str = "127.0.0.1") -> asyncio.AbstractServer:
+        """Expone /metrics por HTTP en el propio event loop"""
+        async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+            try:
+                request_line = await reader.readline()
+                while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    pass  # Cabeceras
+                path = request_line.split()[1] if len(request_line.split()) > 1 else b"/"
+                if path.split(b"?")[0] == b"/metrics":
+                    status, content_type, body = "200 OK", "text/plain; version=0.0.4; charset=utf-8", self.render().encode()
+                else:
+                    status, content_type, body = "404 Not Found", "text/plain", b"not found\n"
+                writer.write(f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+                             f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body)
+                await writer.drain()
+            except (ConnectionError, asyncio.IncompleteReadError):
+                pass
+            finally:
+                writer.close()
+        
+        server = await asyncio.start_server(handle, host, port)
+        logger.info(f"📈 Métricas Prometheus en http://{host}:{port}/metrics")
+        return server
+
+class Tracing:
+    """
+    Spans de OpenTelemetry opcionales
+    
+    Desactivado por defecto (span() no hace nada). enable() requiere opentelemetry-sdk;
+    exporta por OTLP si opentelemetry-exporter-otlp está instalado y si no, por consola.
+    """
+    def __init__(self):
+        self.tracer = None
+    
+    def enable(self, service_name: str = "brainslot-mcp") -> bool:
+        try:
+            from opentelemetry import trace
+            from opentelemetry.sdk.resources import Resource
+            from opentelemetry.sdk.trace import TracerProvider
+            from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+        except ImportError:
+            logger.warning("⚠️ OpenTelemetry no instalado (pip install opentelemetry-sdk), trazas desactivadas")
+            return False
+        try:
+            from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+            exporter = OTLPSpanExporter()
+        except ImportError:
+            exporter = ConsoleSpanExporter()
+        
+        provider = TracerProvider(resource=Resource.create({"service.name": service_name}))
+        provider.add_span_processor(BatchSpanProcessor(exporter))
+        trace.set_tracer_provider(provider)
+        self.tracer = trace.get_tracer("brainslot-mcp")
+        logger.info(f"🔭 Trazas OpenTelemetry activadas ({type(exporter).__name__})")
+        return True
+    
+    def span(self, name: str, **attributes):
+        if self.tracer is None:
+            return contextlib.nullcontext()
+        return self.tracer.start_as_current_span(name, attributes=attributes)
+
+METRICS = Metrics()
+TRACING = Tracing()
+
+def backoff_delay(attempt: int, base: float = 0.5, cap: float = 10.0) -> float:
+    """Espera antes del reintento attempt (0, 1, ...): backoff exponencial con jitter completo"""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+class AdaptiveTimeouts:
+    """
+    Presupuesto de latencia de tools/call por herramienta a partir del p95 observado
+    
+    Hasta reunir min_samples respuestas se usa default; después factor × p95,
+    acotado a [minimum, maximum]. Solo cuentan las llamadas que terminan bien: un
+    sitio que siempre agota el tiempo no alarga el presupuesto de los demás.
+    """
+    def __init__(self, default: float = 90.0, minimum: float = 30.0, maximum: float = 300.0,
+                 factor: float = 2.0, window: int = 200, min_samples: int = 10):
+        self.default = default
+        self.minimum = minimum
+        self.maximum = maximum
+        self.factor = factor
+        self.window = window
+        self.min_samples = min_samples
+        self.samples: Dict[str, deque] = {}
+    
+    def observe(self, tool_name: str, elapsed: float):
+        self.samples.setdefault(tool_name, deque(maxlen=self.window)).append(elapsed)
+    
+    def p95(self, tool_name: str) -> Optional[float]:
+        samples = sorted(self.samples.get(tool_name, ()))
+        if len(samples) < self.min_samples:
+            return None
+        return samples[min(len(samples) - 1, math.ceil(0.95 * len(samples)) - 1)]
+    
+    def timeout_for(self, tool_name: str) -> float:
+        p95 = self.p95(tool_name)
+        if p95 is None:
+            return self.default
+        return min(self.maximum, max(self.minimum, self.factor * p95))
+
+class CircuitBreaker:
+    """
+    Circuit breaker de un proceso MCP
+    
+    closed → open tras failure_threshold fallos seguidos (timeouts, desconexiones);
+    pasado reset_timeout admite una única llamada de prueba (half_open): si va bien
+    se cierra, si falla vuelve a abrirse.
+    """
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.probe_in_flight = False
+    
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at < self.reset_timeout:
+            return "open"
+        return "half_open"
+    
+    def available(self) -> bool:
+        """True si allow() aceptaría una llamada (sin reservar la de prueba)"""
+        state = self.state
+        return state == "closed" or (state == "half_open" and not self.probe_in_flight)
+    
+    def allow(self) -> bool:
+        """Reserva una llamada; en half_open solo se deja pasar la de prueba"""
+        if not self.available():
+            return False
+        if self.state == "half_open":
+            self.probe_in_flight = True
+        return True
+    
+    def record_success(self):
+        if self.opened_at is not None:
+            logger.info("✅ Circuito MCP cerrado de nuevo")
+        self.failures = 0
+        self.opened_at = None
+        self.probe_in_flight = False
+    
+    def abandon(self):
+        """La llamada reservada terminó sin veredicto (cancelada): libera la de prueba sin contar fallo"""
+        self.probe_in_flight = False
+    
+    def record_failure(self):
+        self.failures += 1
+        if self.probe_in_flight or self.failures >= self.failure_threshold:
+            if self.opened_at is None or self.probe_in_flight:
+                logger.warning(f"⚡ Circuito MCP abierto tras {self.failures} fallos seguidos")
+            self.opened_at = time.monotonic()
+        self.probe_in_flight = False
 
 class MCPToolExecutor:
-    def __init__(self, mcp_command: List[str], mcp_env: Dict[str, str] = None):
+    # Nivel de cada línea de stderr según los marcadores de los diagnósticos del servidor
+    STDERR_LEVELS = (('❌', logging.ERROR), ('⚠️', logging.WARNING), ('WARNING', logging.WARNING))
+    # Últimas líneas de stderr que se conservan para diagnosticar caídas
+    STDERR_TAIL_LINES = 200
+    
+    def __init__(self, mcp_command: List[str], mcp_env: Dict[str, str] = None, verbose: bool = True,
+                 timeouts: AdaptiveTimeouts = None, max_retries: int = 2):
         self.mcp_command = mcp_command
         self.mcp_env = mcp_env or {}
+        self.verbose = verbose
+        self.timeouts = timeouts or AdaptiveTimeouts()
+        self.max_retries = max_retries
+        self.breaker = CircuitBreaker()
         self.mcp_process = None
         self.request_id = 1
         self.initialized = False
+        # Solicitudes en vuelo indexadas por ID JSON-RPC
+        self.pending_requests: Dict[int, asyncio.Future] = {}
+        self.reader_task = None
+        self.stderr_task = None
+        self.write_lock = asyncio.Lock()
+        self.stopping = False
+        # Diagnósticos del servidor (stderr): últimas líneas y recuento por nivel
+        self.stderr_tail = deque(maxlen=self.STDERR_TAIL_LINES)
+        self.stderr_counts: Counter = Counter()
+        self.stdout_noise_lines = 0
+
+    def _next_request_id(self) -> int:
+        """Reserva un ID JSON-RPC único para una nueva solicitud"""
+        request_id = self.request_id
+        self.request_id += 1
+        return request_id
         
-    async def start_mcp_server(self):
-        """Inicia el servidor MCP"""
+    async def start_mcp_server(self, startup_timeout: float = 60.0):
+        """Inicia el servidor MCP y vuelve en cuanto responde a initialize"""
+        with TRACING.span("mcp start", **{"mcp.command": ' '.join(self.mcp_command)}):
+            return await self._start(startup_timeout)
+    
+    async def _start(self, startup_timeout: float):
         logger.info(f"Iniciando servidor MCP con comando: {' '.join(self.mcp_command)}")
         env = {**os.environ, **self.mcp_env}
         logger.debug(f"Variables de entorno: {self.mcp_env}")
+        timings: Dict[str, float] = {}
+        started = time.monotonic()
         
         try:
             self.mcp_process = await asyncio.create_subprocess_exec(
@@ -48,44 +589,22 @@ class MCPToolExecutor:
                 stdin=asyncio.subprocess.PIPE,
                 stdout=asyncio.subprocess.PIPE,
                 stderr=asyncio.subprocess.PIPE,
-                env=env
+                env=env,
+                limit=MCP_STREAM_LIMIT
             )
+            timings['spawn'] = time.monotonic() - started
             logger.info("✅ Proceso MCP iniciado exitosamente")
             
-            # Esperar un poco para que el servidor se inicialice
-            await asyncio.sleep(2)
-            
-            # Leer líneas de stderr hasta encontrar el mensaje de listo
-            ready_found = False
-            max_attempts = 10
-            attempts = 0
-            
-            while not ready_found and attempts < max_attempts:
-                try:
-                    # Leer línea de stderr con timeout
-                    stderr_line = await asyncio.wait_for(
-                        self.mcp_process.stderr.readline(), 
-                        timeout=2.0
-                    )
-                    if stderr_line:
-                        line_text = stderr_line.decode().strip()
-                        logger.debug(f"MCP stderr: {line_text}")
-                        if "Servidor listo" in line_text or "ready" in line_text:
-                            ready_found = True
-                            logger.info("🎯 Servidor MCP listo para conexiones")
-                            break
-                except asyncio.TimeoutError:
-                    logger.debug(f"Timeout esperando mensaje de servidor listo (intento {attempts + 1})")
-                    attempts += 1
-                    
-            if not ready_found:
-                logger.warning("No se detectó mensaje de servidor listo, continuando...")
+            # Lector de fondo que despacha cada respuesta a su solicitud
+            self.reader_task = asyncio.create_task(self._read_responses())
+            self.stderr_task = asyncio.create_task(self._drain_stderr())
             
-            # Enviar inicialización
+            # No hace falta esperar un mensaje de "listo": la solicitud queda en el pipe
+            # hasta que el transporte stdio la lea, y su respuesta es la señal de arranque
             logger.info("📤 Enviando solicitud de inicialización")
             init_request = {
                 "jsonrpc": "2.0",
-                "id": self.request_id,
+                "id": self._next_request_id(),
                 "method": "initialize",
                 "params": {
                     "protocolVersion": "2025-06-18",
@@ -94,11 +613,13 @@ class MCPToolExecutor:
                 }
             }
             
-            init_response = await self._send_request(init_request)
-            self.request_id += 1
+            phase_started = time.monotonic()
+            init_response = await self._send_request(init_request, timeout=startup_timeout)
+            timings['initialize'] = time.monotonic() - phase_started
             
             if init_response and not init_response.get("error"):
                 logger.info("✅ Inicialización MCP exitosa")
+                await self._send_notification("notifications/initialized")
                 self.initialized = True
             else:
                 logger.error(f"❌ Error en inicialización: {init_response}")
@@ -108,22 +629,27 @@ class MCPToolExecutor:
             logger.info("📋 Solicitando lista de herramientas")
             tools_request = {
                 "jsonrpc": "2.0",
-                "id": self.request_id,
+                "id": self._next_request_id(),
                 "method": "tools/list",
                 "params": {}
             }
             
+            phase_started = time.monotonic()
             tools_response = await self._send_request(tools_request)
-            self.request_id += 1
+            timings['tools/list'] = time.monotonic() - phase_started
+            timings['total'] = time.monotonic() - started
+            logger.info("⏱️ Arranque MCP: " + ", ".join(f"{phase} {elapsed * 1000:.0f} ms" for phase, elapsed in timings.items()))
+            for phase, elapsed in timings.items():
+                METRICS.observe('mcp_startup_seconds', elapsed, help_text="Duración de las fases de arranque del servidor MCP",
+                                phase=phase)
             
             if tools_response and "result" in tools_response:
                 tools = tools_response["result"].get("tools", [])
                 logger.info(f"✅ {len(tools)} herramientas MCP disponibles")
                 for tool in tools:
                     logger.info(f"   • {tool.get('name', 'Unknown')}: {tool.get('description', 'No description')}")
-                print(f"✅ {len(tools)} herramientas MCP disponibles:")
-                for tool in tools:
-                    print(f"   • {tool.get('name', 'Unknown')}: {tool.get('description', 'No description')}")
+                if self.verbose:
+                    print_tools(tools)
             else:
                 logger.error(f"❌ Error obteniendo herramientas: {tools_response}")
             
@@ -133,109 +659,272 @@ class MCPToolExecutor:
             logger.error(f"❌ Error iniciando servidor MCP: {e}")
             raise
     
-    async def _send_request(self, request: Dict[str, Any]) -> Dict[str, Any]:
-        """Envía una solicitud al servidor MCP y espera respuesta"""
+    async def _send_request(self, request: Dict[str, Any], timeout: float = None) -> Dict[str, Any]:
+        """Envía una solicitud al servidor MCP y espera su respuesta"""
         if not self.mcp_process:
             raise Exception("Servidor MCP no iniciado")
         
-        logger.debug(f"📤 Enviando solicitud MCP: {json.dumps(request, indent=2)}")
+        request_id = request.get('id')
+        wire_logger.debug("📤 Enviando solicitud MCP: %s", LazyJSON(request))
         
-        # Enviar solicitud
-        request_str = json.dumps(request) + '\n'
-        self.mcp_process.stdin.write(request_str.encode())
-        await self.mcp_process.stdin.drain()
-        logger.debug("✅ Solicitud enviada")
+        method = request.get('method', '')
+        started = time.monotonic()
+        outcome = 'error'
+        METRICS.gauge_add('mcp_requests_in_flight', 1, "Solicitudes JSON-RPC esperando respuesta")
         
-        # Leer respuestas hasta encontrar una válida
-        max_attempts = 20  # Para inicialización y herramientas
-        attempts = 0
+        # Registrar el futuro antes de escribir para no perder respuestas rápidas
+        future = asyncio.get_running_loop().create_future()
+        self.pending_requests[request_id] = future
         
-        while attempts < max_attempts:
+        with TRACING.span(f"mcp {method}", **{"rpc.system": "jsonrpc", "rpc.method": method}):
             try:
-                # Timeout dinámico: corto para inicialización, largo para crawling
-                timeout = 90.0 if request.get('method') == 'tools/call' else 5.0
-                response_line = await asyncio.wait_for(
-                    self.mcp_process.stdout.readline(),
-                    timeout=timeout
-                )
+                request_bytes = (json.dumps(request) + '\n').encode()
+                METRICS.observe('mcp_request_bytes', len(request_bytes), SIZE_BUCKETS,
+                                "Tamaño de las solicitudes JSON-RPC", method=method)
+                async with self.write_lock:
+                    self.mcp_process.stdin.write(request_bytes)
+                    await self.mcp_process.stdin.drain()
+                wire_logger.debug("✅ Solicitud %s enviada", request_id)
                 
-                if not response_line:
-                    logger.warning("No se recibió respuesta del servidor MCP")
-                    attempts += 1
+                # Timeout dinámico: corto para inicialización, largo para crawling
+                if timeout is None:
+                    timeout = 90.0 if method == 'tools/call' else 30.0
+                response = await asyncio.wait_for(future, timeout=timeout)
+                outcome = 'error' if response.get('error') else 'ok'
+                wire_logger.info("✅ Respuesta MCP recibida para ID %s", request_id)
+                wire_logger.debug("📋 Respuesta: %s", LazyJSON(response))
+                return response
+            except asyncio.TimeoutError:
+                outcome = 'timeout'
+                logger.info(f"⏱️ Sin respuesta para ID {request_id} en {timeout:.1f} s, cancelando")
+                await self._cancel_request(request, f"Timeout de {timeout:.1f} s en el cliente")
+                return {"error": {"code": -1, "message": "Timeout esperando respuesta MCP", "retryable": True}}
+            except asyncio.CancelledError:
+                # El llamador abandonó la solicitud: que el servidor deje de trabajar en ella
+                outcome = 'cancelled'
+                await self._cancel_request(request, "Solicitud cancelada por el cliente")
+                raise
+            except (BrokenPipeError, ConnectionResetError) as e:
+                outcome = 'disconnected'
+                logger.error(f"❌ Conexión con el servidor MCP perdida: {e}")
+                return {"error": {"code": -1, "message": f"Conexión MCP perdida: {e}", "retryable": True}}
+            finally:
+                self.pending_requests.pop(request_id, None)
+                METRICS.gauge_add('mcp_requests_in_flight', -1)
+                METRICS.observe('mcp_request_duration_seconds', time.monotonic() - started,
+                                help_text="Latencia de las solicitudes JSON-RPC", method=method)
+                METRICS.inc('mcp_requests_total', help_text="Solicitudes JSON-RPC por resultado",
+                            method=method, outcome=outcome)
+    
+    async def _cancel_request(self, request: Dict[str, Any], reason: str):
+        """Envía notifications/cancelled (initialize no se puede cancelar según MCP)"""
+        if request.get('method') == 'initialize' or not self.is_alive():
+            return
+        try:
+            await self._send_notification("notifications/cancelled", {"requestId": request['id'], "reason": reason})
+        except (BrokenPipeError, ConnectionResetError) as e:
+            logger.debug(f"No se pudo enviar la cancelación de {request['id']}: {e}")
+    
+    async def _send_notification(self, method: str, params: Dict[str, Any] = None):
+        """Envía una notificación JSON-RPC (sin ID ni respuesta)"""
+        notification = {"jsonrpc": "2.0", "method": method}
+        if params is not None:
+            notification["params"] = params
+        async with self.write_lock:
+            self.mcp_process.stdin.write((json.dumps(notification) + '\n').encode())
+            await self.mcp_process.stdin.drain()
+    
+    async def _drain_stderr(self):
+        """
+        Vacía stderr de forma continua para que el pipe no bloquee al servidor
+        
+        Cada línea se clasifica por nivel y se reenvía al logger OllamaMCP.server; las
+        últimas se conservan en stderr_tail para explicar una caída del proceso.
+        """
+        server_logger = logging.getLogger('OllamaMCP.server')
+        try:
+            while True:
+                stderr_line = await self.mcp_process.stderr.readline()
+                if not stderr_line:
+                    break
+                text = stderr_line.decode(errors='replace').rstrip()
+                if not text:
                     continue
+                level = next((lvl for marker, lvl in self.STDERR_LEVELS if marker in text), logging.DEBUG)
+                self.stderr_counts[logging.getLevelName(level)] += 1
+                self.stderr_tail.append((time.time(), logging.getLevelName(level), text))
+                server_logger.log(level, "MCP stderr: %s", text)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.debug(f"Error leyendo stderr MCP: {e}")
+    
+    def recent_stderr(self, lines: int = 10) -> List[str]:
+        """Últimas líneas de diagnóstico del servidor"""
+        return [text for _, _, text in list(self.stderr_tail)[-lines:]]
+    
+    async def _read_responses(self):
+        """Lee stdout de forma continua y despacha cada respuesta a su futuro por ID"""
+        stdout = self.mcp_process.stdout
+        try:
+            while True:
+                try:
+                    response_line = await stdout.readline()
+                except ValueError as e:
+                    # Línea mayor que MCP_STREAM_LIMIT: el StreamReader la descarta y sigue
+                    logger.error(f"❌ Respuesta MCP descartada por superar {MCP_STREAM_LIMIT} bytes: {e}")
+                    continue
+                METRICS.observe('mcp_response_bytes', len(response_line), SIZE_BUCKETS,
+                                "Tamaño de las líneas recibidas del servidor MCP")
+                if not response_line:
+                    if self.stopping:
+                        logger.debug("stdout del servidor MCP cerrado")
+                    else:
+                        tail = "\n".join(self.recent_stderr())
+                        logger.warning("No se recibió respuesta del servidor MCP (stdout cerrado)"
+                                       + (f". Últimas líneas de stderr:\n{tail}" if tail else ""))
+                    break
                 
-                line_text = response_line.decode().strip()
-                logger.debug(f"📥 Línea recibida: {line_text[:200]}...")
+                wire_logger.debug("📥 Línea recibida: %r...", response_line[:200])
                 
-                # Saltar líneas que no son JSON-RPC
-                if not line_text.startswith('{'):
-                    logger.debug("Saltando línea no-JSON")
-                    attempts += 1
+                # stdout es solo para JSON-RPC; el ruido indica un diagnóstico mal dirigido
+                # (json.loads acepta los bytes sin decodificar)
+                if not response_line.lstrip().startswith(b'{'):
+                    self.stdout_noise_lines += 1
+                    if self.stdout_noise_lines == 1:
+                        logger.warning(f"⚠️ Línea no JSON-RPC en stdout del servidor MCP (debería ir a stderr): {response_line[:200]!r}")
+                    else:
+                        logger.debug("Saltando línea no-JSON")
                     continue
                 
                 try:
-                    response = json.loads(line_text)
-                    
-                    # Verificar que es una respuesta a nuestra solicitud
-                    if response.get('id') == request.get('id'):
-                        logger.info(f"✅ Respuesta MCP recibida para ID {request.get('id')}")
-                        logger.debug(f"📋 Respuesta: {json.dumps(response, indent=2)}")
-                        return response
-                    else:
-                        logger.debug(f"Respuesta para ID diferente: {response.get('id')} vs {request.get('id')}")
-                        attempts += 1
-                        continue
-                        
+                    response = json.loads(response_line)
                 except json.JSONDecodeError as e:
                     logger.debug(f"Error JSON en línea: {e}")
-                    attempts += 1
                     continue
-                    
-            except asyncio.TimeoutError:
-                logger.debug(f"Timeout esperando respuesta (intento {attempts + 1})")
-                attempts += 1
-                continue
-        
-        logger.debug(f"Timeout en comunicación después de {max_attempts} intentos")
-        return {"error": {"code": -1, "message": "Timeout esperando respuesta MCP"}}
+                
+                future = self.pending_requests.get(response.get('id'))
+                if future is None:
+                    logger.debug(f"Respuesta sin solicitud pendiente: ID {response.get('id')}")
+                    continue
+                if not future.done():
+                    future.set_result(response)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"❌ Error leyendo respuestas MCP: {e}")
+        finally:
+            # Liberar a quien siga esperando: el proceso ya no responderá
+            for future in self.pending_requests.values():
+                if not future.done():
+                    future.set_result({"error": {"code": -1, "message": "Servidor MCP desconectado", "retryable": True}})
     
-    async def execute_tool(self, tool_name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
-        """Ejecuta una herramienta MCP"""
+    async def execute_tool(self, tool_name: str, arguments: Dict[str, Any], timeout: float = None,
+                           retries: int = None) -> Dict[str, Any]:
+        """
+        Ejecuta una herramienta MCP
+        
+        - timeout: por defecto, el presupuesto adaptativo de la herramienta (AdaptiveTimeouts)
+        - retries: reintentos con backoff para errores transitorios (timeout, desconexión);
+          por defecto max_retries
+        - El circuit breaker rechaza la llamada sin esperar si el proceso viene fallando
+        """
         if not self.initialized:
             logger.error("❌ MCP no inicializado, no se puede ejecutar herramienta")
             return {"error": {"code": -1, "message": "MCP no inicializado"}}
+        
+        wire_logger.info("🔧 Ejecutando herramienta MCP: %s %s", tool_name, LazyJSON(arguments))
+        if self.verbose:
+            print(f"🔧 Ejecutando herramienta MCP: {tool_name}")
+            print(f"📝 Argumentos: {json.dumps(arguments, indent=2, ensure_ascii=False)}")
+        
+        started = time.monotonic()
+        with TRACING.span("mcp tool", **{"mcp.tool": tool_name}):
+            response = await self._execute_with_retries(tool_name, arguments, timeout, retries)
+        METRICS.observe('mcp_tool_duration_seconds', time.monotonic() - started,
+                        help_text="Duración de tools/call por herramienta, reintentos incluidos",
+                        tool=tool_name, outcome='error' if response.get("error") else 'ok')
+        
+        if response.get("error"):
+            logger.debug(f"Respuesta MCP con error: {response['error']}")
+        else:
+            wire_logger.info("✅ Herramienta %s ejecutada", tool_name)
+        return response
+    
+    async def _execute_with_retries(self, tool_name: str, arguments: Dict[str, Any], timeout: float = None,
+                                    retries: int = None) -> Dict[str, Any]:
+        attempts = 1 + (self.max_retries if retries is None else retries)
+        for attempt in range(attempts):
+            if not self.breaker.allow():
+                logger.warning(f"⚡ Circuito abierto, {tool_name} rechazada sin llamar al servidor MCP")
+                METRICS.inc('mcp_circuit_rejections_total', help_text="Llamadas rechazadas por circuito abierto")
+                return {"error": {"code": -1, "message": "Circuito abierto: servidor MCP degradado", "retryable": True}}
+            
+            try:
+                response = await self._call_tool(tool_name, arguments, timeout)
+            except BaseException:
+                # Una prueba half_open cancelada no puede dejar el worker rechazando llamadas para siempre
+                self.breaker.abandon()
+                raise
+            error = response.get("error")
+            if not (error and error.get("retryable")):
+                self.breaker.record_success()
+                return response
             
+            self.breaker.record_failure()
+            if attempt + 1 >= attempts or not self.is_alive():
+                return response
+            delay = backoff_delay(attempt)
+            logger.warning(f"🔁 {tool_name}: {error['message']}; reintento {attempt + 1}/{attempts - 1} en {delay:.1f} s")
+            METRICS.inc('mcp_tool_retries_total', help_text="Reintentos de tools/call", tool=tool_name)
+            await asyncio.sleep(delay)
+        return response
+    
+    async def _call_tool(self, tool_name: str, arguments: Dict[str, Any], timeout: float = None) -> Dict[str, Any]:
+        """Un único tools/call; las respuestas correctas alimentan el presupuesto adaptativo"""
         request = {
             "jsonrpc": "2.0",
-            "id": self.request_id,
+            "id": self._next_request_id(),
             "method": "tools/call",
             "params": {
                 "name": tool_name,
                 "arguments": arguments
             }
         }
-        
-        logger.info(f"🔧 Ejecutando herramienta MCP: {tool_name}")
-        logger.info(f"📝 Argumentos: {json.dumps(arguments, indent=2)}")
-        print(f"🔧 Ejecutando herramienta MCP: {tool_name}")
-        print(f"📝 Argumentos: {json.dumps(arguments, indent=2)}")
-        
-        response = await self._send_request(request)
-        self.request_id += 1
-        
-        if response.get("error"):
-            logger.debug(f"Respuesta MCP con timeout: {response['error']}")
-        else:
-            logger.info("✅ Herramienta ejecutada exitosamente")
-        
+        started = time.monotonic()
+        response = await self._send_request(request, timeout=timeout or self.timeouts.timeout_for(tool_name))
+        if not response.get("error"):
+            self.timeouts.observe(tool_name, time.monotonic() - started)
         return response
     
+    @property
+    def in_flight(self) -> int:
+        """Número de solicitudes pendientes de respuesta"""
+        return len(self.pending_requests)
+    
+    def is_alive(self) -> bool:
+        """Indica si el proceso MCP sigue en ejecución"""
+        return self.mcp_process is not None and self.mcp_process.returncode is None
+    
+    async def ping(self, timeout: float = 5.0) -> bool:
+        """Comprueba que el servidor MCP responde (método ping del protocolo)"""
+        if not self.is_alive():
+            return False
+        response = await self._send_request({
+            "jsonrpc": "2.0",
+            "id": self._next_request_id(),
+            "method": "ping"
+        }, timeout=timeout)
+        return not response.get("error")
+    
     async def stop(self):
         """Detiene el servidor MCP"""
         logger.info("🛑 Deteniendo servidor MCP...")
+        self.stopping = True
         if self.mcp_process:
             try:
-                self.mcp_process.terminate()
+                if self.mcp_process.returncode is None:
+                    self.mcp_process.terminate()
                 await asyncio.wait_for(self.mcp_process.wait(), timeout=5.0)
                 logger.info("✅ Servidor MCP detenido correctamente")
             except asyncio.TimeoutError:
@@ -245,43 +934,1773 @@ class MCPToolExecutor:
             except Exception as e:
                 logger.error(f"❌ Error deteniendo servidor: {e}")
             finally:
+                for task in (self.reader_task, self.stderr_task):
+                    if task:
+                        task.cancel()
+                        try:
+                            await task
+                        except asyncio.CancelledError:
+                            pass
+                self.reader_task = self.stderr_task = None
                 self.mcp_process = None
                 self.initialized = False
+                self.stopping = False
+
+class MCPExecutorPool:
+    """
+    Pool de procesos servidor MCP con la misma interfaz que MCPToolExecutor
+    
+    - Envía cada tools/call al worker con menos solicitudes en vuelo
+    - Sustituye workers caídos o que no responden al ping
+    - Crece con la carga hasta max_workers y libera workers ociosos hasta min_workers
+    """
+    def __init__(self, mcp_command: List[str], mcp_env: Dict[str, str] = None,
+                 min_workers: int = 2, max_workers: int = None,
+                 health_interval: float = 15.0, scale_up_load: int = 2, idle_timeout: float = 60.0,
+                 max_retries: int = 2):
+        self.mcp_command = mcp_command
+        self.mcp_env = mcp_env or {}
+        self.min_workers = max(1, min_workers)
+        self.max_workers = max(self.min_workers, max_workers or self.min_workers)
+        self.health_interval = health_interval
+        self.scale_up_load = scale_up_load
+        self.idle_timeout = idle_timeout
+        self.max_retries = max_retries
+        # Presupuestos de latencia compartidos: todos los workers ejecutan las mismas herramientas
+        self.timeouts = AdaptiveTimeouts()
+        self.workers: List[MCPToolExecutor] = []
+        self.last_used: Dict[MCPToolExecutor, float] = {}
+        # Llamadas asignadas a cada worker (se cuentan al elegir, antes de enviar)
+        self.load: Dict[MCPToolExecutor, int] = {}
+        self.tools_response = None
+        self.initialized = False
+        self.health_task = None
+        self.scaling_task = None
+    
+    @property
+    def in_flight(self) -> int:
+        """Llamadas en curso sumando todos los workers"""
+        return sum(self.load.values())
+    
+    async def _spawn_worker(self) -> Optional[MCPToolExecutor]:
+        """Arranca un nuevo proceso MCP y lo añade al pool si se inicializa"""
+        worker = MCPToolExecutor(self.mcp_command, self.mcp_env, verbose=False, timeouts=self.timeouts)
+        try:
+            tools_response = await worker.start_mcp_server()
+        except Exception as e:
+            logger.error(f"❌ Error arrancando worker MCP: {e}")
+            tools_response = None
+        
+        if not worker.initialized:
+            await worker.stop()
+            return None
+        
+        if self.tools_response is None and tools_response and "result" in tools_response:
+            self.tools_response = tools_response
+        self.workers.append(worker)
+        self.last_used[worker] = time.monotonic()
+        self.load[worker] = 0
+        logger.info(f"➕ Worker MCP añadido al pool ({len(self.workers)}/{self.max_workers})")
+        return worker
+    
+    async def _retire_worker(self, worker: MCPToolExecutor):
+        """Saca un worker del pool y detiene su proceso"""
+        if worker in self.workers:
+            self.workers.remove(worker)
+        self.last_used.pop(worker, None)
+        self.load.pop(worker, None)
+        await worker.stop()
+    
+    async def start_mcp_server(self):
+        """Arranca min_workers procesos MCP en paralelo"""
+        logger.info(f"🚀 Iniciando pool MCP con {self.min_workers} workers (máximo {self.max_workers})")
+        await asyncio.gather(*[self._spawn_worker() for _ in range(self.min_workers)])
+        
+        if not self.workers:
+            logger.error("❌ Ningún worker MCP pudo inicializarse")
+            return None
+        
+        self.initialized = True
+        self.health_task = asyncio.create_task(self._health_loop())
+        if self.tools_response:
+            print_tools(self.tools_response["result"].get("tools", []))
+        return self.tools_response
+    
+    def _least_busy(self, exclude: Iterable[MCPToolExecutor] = ()) -> Optional[MCPToolExecutor]:
+        """Worker vivo con menos carga, saltando los de circuito abierto y los de exclude"""
+        candidates = [
+            worker for worker in self.workers
+            if worker.initialized and worker.is_alive() and worker.breaker.available() and worker not in exclude
+        ]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda worker: self.load.get(worker, 0))
+    
+    def _maybe_scale_up(self):
+        """Lanza un worker extra en segundo plano si todos están cargados"""
+        if len(self.workers) >= self.max_workers:
+            return
+        if self.scaling_task and not self.scaling_task.done():
+            return
+        if self.workers and min(self.load.get(worker, 0) for worker in self.workers) < self.scale_up_load:
+            return
+        logger.info(f"📈 Carga alta en el pool ({self.in_flight} en vuelo), añadiendo worker")
+        self.scaling_task = asyncio.create_task(self._spawn_worker())
+    
+    async def execute_tool(self, tool_name: str, arguments: Dict[str, Any], timeout: float = None,
+                           retries: int = None) -> Dict[str, Any]:
+        """Ejecuta una herramienta MCP en el worker menos ocupado; cada reintento va a otro worker si lo hay"""
+        if not self.initialized:
+            logger.error("❌ Pool MCP no inicializado, no se puede ejecutar herramienta")
+            return {"error": {"code": -1, "message": "MCP no inicializado"}}
+        
+        attempts = 1 + (self.max_retries if retries is None else retries)
+        failed: List[MCPToolExecutor] = []
+        for attempt in range(attempts):
+            worker = self._least_busy(exclude=failed) or self._least_busy()
+            if worker is None:
+                return {"error": {"code": -1, "message": "No hay workers MCP disponibles", "retryable": True}}
+            
+            self.load[worker] = self.load.get(worker, 0) + 1
+            self.last_used[worker] = time.monotonic()
+            self._maybe_scale_up()
+            try:
+                response = await worker.execute_tool(tool_name, arguments, timeout=timeout, retries=0)
+            finally:
+                if worker in self.load:
+                    self.load[worker] -= 1
+                    self.last_used[worker] = time.monotonic()
+            
+            error = response.get("error")
+            if not (error and error.get("retryable")) or attempt + 1 >= attempts:
+                return response
+            failed.append(worker)
+            METRICS.inc('mcp_tool_retries_total', help_text="Reintentos de tools/call", tool=tool_name)
+            delay = backoff_delay(attempt)
+            logger.warning(f"🔁 {tool_name}: {error['message']}; reintento {attempt + 1}/{attempts - 1} en otro worker en {delay:.1f} s")
+            await asyncio.sleep(delay)
+        return response
+    
+    async def _check_worker(self, worker: MCPToolExecutor) -> bool:
+        if not worker.is_alive():
+            logger.warning("⚠️ Worker MCP caído")
+            return False
+        if not await worker.ping():
+            logger.warning("⚠️ Worker MCP no responde al ping")
+            return False
+        return True
+    
+    async def _health_loop(self):
+        """Revisa periódicamente la salud y el tamaño del pool"""
+        while True:
+            await asyncio.sleep(self.health_interval)
+            try:
+                workers = list(self.workers)
+                health = await asyncio.gather(*[self._check_worker(worker) for worker in workers])
+                for worker, healthy in zip(workers, health):
+                    if not healthy:
+                        logger.warning("🔄 Sustituyendo worker MCP no saludable")
+                        await self._retire_worker(worker)
+                
+                # Liberar un worker ocioso por ciclo por encima del mínimo
+                now = time.monotonic()
+                if len(self.workers) > self.min_workers:
+                    for worker in self.workers:
+                        if self.load.get(worker, 0) == 0 and now - self.last_used.get(worker, now) > self.idle_timeout:
+                            logger.info(f"📉 Liberando worker MCP ocioso ({len(self.workers) - 1} restantes)")
+                            await self._retire_worker(worker)
+                            break
+                
+                missing = self.min_workers - len(self.workers)
+                if missing > 0:
+                    await asyncio.gather(*[self._spawn_worker() for _ in range(missing)])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Error en health check del pool MCP: {e}")
+    
+    async def stop(self):
+        """Detiene todos los workers del pool"""
+        logger.info(f"🛑 Deteniendo pool MCP ({len(self.workers)} workers)...")
+        for task in (self.health_task, self.scaling_task):
+            if task and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self.health_task = self.scaling_task = None
+        await asyncio.gather(*[self._retire_worker(worker) for worker in list(self.workers)])
+        self.initialized = False
+
+class DomainThrottle:
+    """Cortesía por dominio: crawls simultáneos limitados y separación mínima entre inicios"""
+    def __init__(self, per_domain_limit: int = 1, delay: float = 1.0):
+        self.per_domain_limit = max(1, per_domain_limit)
+        self.delay = delay
+        self.slots: Dict[str, asyncio.Semaphore] = {}
+        self.next_start: Dict[str, float] = {}
+    
+    @contextlib.asynccontextmanager
+    async def slot(self, url: str):
+        domain = urlparse(url).hostname or url
+        async with self.slots.setdefault(domain, asyncio.Semaphore(self.per_domain_limit)):
+            # Reservar el siguiente hueco del dominio sin ceder el control entre lectura y escritura
+            now = time.monotonic()
+            start_at = max(now, self.next_start.get(domain, 0.0))
+            self.next_start[domain] = start_at + self.delay
+            if start_at > now:
+                await asyncio.sleep(start_at - now)
+            yield
+
+async def iterate_results(workers: List[asyncio.Task], results: asyncio.Queue) -> AsyncIterator[Any]:
+    """Emite lo que los workers dejan en results hasta que terminan todos; al salir los cancela"""
+    finished = asyncio.ensure_future(asyncio.gather(*workers))
+    try:
+        while not (finished.done() and results.empty()):
+            getter = asyncio.ensure_future(results.get())
+            await asyncio.wait([getter, finished], return_when=asyncio.FIRST_COMPLETED)
+            if getter.done():
+                yield getter.result()
+            else:
+                getter.cancel()
+        finished.result()  # Propaga errores de los workers
+    finally:
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, finished, return_exceptions=True)
+
+class CrawlFrontier:
+    """
+    Frontera de URLs para el crawl recursivo de un sitio
+    
+    Cola FIFO (primero las páginas más cercanas a la raíz) con deduplicación de URLs
+    normalizadas mediante huellas de 64 bits, límites de profundidad y de páginas,
+    filtro de hosts, de extensiones que no son páginas y de robots.txt.
+    """
+    SKIP_EXTENSIONS = ('.pdf', '.jpg', '.jpeg', '.png', '.gif', '.svg', '.webp', '.ico', '.css', '.js',
+                       '.json', '.xml', '.rss', '.zip', '.gz', '.tar', '.mp3', '.mp4', '.mov', '.avi',
+                       '.woff', '.woff2', '.ttf', '.eot')
+    # Enlaces markdown [texto](url), href="..." y URLs absolutas sueltas
+    LINK_PATTERN = re.compile(r'\]\(\s*<?([^)\s>]+)|href=["\']([^"\']+)|(https?://[^\s)<>\]"\'`]+)')
+    
+    def __init__(self, max_depth: int = 2, max_pages: int = 100, allowed_hosts: Iterable[str] = None):
+        self.max_depth = max_depth
+        self.max_pages = max_pages
+        self.allowed_hosts = {self._site_host(host) for host in allowed_hosts} if allowed_hosts else None
+        self.robots: Dict[str, RobotFileParser] = {}
+        self.seen: set = set()
+        self.queue: deque = deque()
+        self.scheduled = 0
+    
+    @staticmethod
+    def _site_host(host: str) -> str:
+        host = host.lower()
+        return host[4:] if host.startswith('www.') else host
+    
+    @staticmethod
+    def fingerprint(url: str) -> int:
+        return int.from_bytes(hashlib.blake2b(url.encode(), digest_size=8).digest(), 'big')
+    
+    def add(self, url: str, depth: int) -> bool:
+        """Programa una URL; False si ya se vio, no es una página del sitio o se superan los límites"""
+        if depth > self.max_depth or self.scheduled >= self.max_pages:
+            return False
+        try:
+            normalized = normalize_url(url)
+            parts = urlsplit(normalized)
+        except ValueError:
+            return False
+        if parts.scheme not in ('http', 'https') or not parts.hostname:
+            return False
+        if self.allowed_hosts is not None and self._site_host(parts.hostname) not in self.allowed_hosts:
+            return False
+        if parts.path.lower().endswith(self.SKIP_EXTENSIONS):
+            return False
+        
+        key = self.fingerprint(normalized)
+        if key in self.seen:
+            return False
+        self.seen.add(key)
+        # robots.txt por sitio: www.ejemplo.com y ejemplo.com comparten reglas, como en allowed_hosts
+        robots = self.robots.get(self._site_host(parts.hostname))
+        if robots and not robots.can_fetch(CRAWLER_USER_AGENT, normalized):
+            return False
+        self.queue.append((normalized, depth))
+        self.scheduled += 1
+        return True
+    
+    def set_robots(self, host: str, robots: RobotFileParser):
+        self.robots[self._site_host(host)] = robots
+    
+    def pop(self) -> Optional[tuple]:
+        """Siguiente (url, profundidad) o None si no queda ninguna pendiente"""
+        return self.queue.popleft() if self.queue else None
+    
+    @classmethod
+    def extract_links(cls, content: str, base_url: str) -> List[str]:
+        """Enlaces del contenido crawleado resueltos contra la URL de la página"""
+        links = []
+        for match in cls.LINK_PATTERN.finditer(content):
+            link = next(group for group in match.groups() if group)
+            if not link.startswith(('mailto:', 'javascript:', 'tel:', '#')):
+                links.append(urljoin(base_url, link))
+        return list(dict.fromkeys(links))
+
+def fetch_url_bytes(url: str, timeout: float = 10.0, max_bytes: int = 10 * 1024 * 1024) -> Optional[bytes]:
+    """GET sencillo (bloqueante, usar con asyncio.to_thread); None si falla"""
+    try:
+        request = urllib.request.Request(url, headers={'User-Agent': CRAWLER_USER_AGENT})
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            data = response.read(max_bytes)
+    except (OSError, ValueError) as e:
+        logger.debug(f"No se pudo descargar {url}: {e}")
+        return None
+    return gzip.decompress(data) if data[:2] == b'\x1f\x8b' else data
+
+def discover_site(root_url: str, sitemap_limit: int = 1000, max_sitemaps: int = 20,
+                  use_sitemap: bool = True) -> Dict[str, Any]:
+    """
+    robots.txt y URLs de los sitemaps de un sitio (bloqueante, usar con asyncio.to_thread)
+    
+    Los sitemaps se toman de las líneas Sitemap: de robots.txt o, si no hay, de
+    /sitemap.xml; los índices de sitemaps se siguen hasta max_sitemaps ficheros.
+    Sin use_sitemap solo se descarga robots.txt.
+    """
+    parts = urlsplit(root_url)
+    origin = f"{parts.scheme}://{parts.netloc}"
+    robots = None
+    sitemaps = []
+    robots_data = fetch_url_bytes(f"{origin}/robots.txt")
+    if robots_data:
+        lines = robots_data.decode('utf-8', errors='replace').splitlines()
+        robots = RobotFileParser()
+        robots.parse(lines)
+        sitemaps = [line.split(':', 1)[1].strip() for line in lines if line.lower().startswith('sitemap:')]
+    
+    if not use_sitemap:
+        return {"robots": robots, "sitemap": []}
+    pending = deque(sitemaps or [f"{origin}/sitemap.xml"])
+    visited = set()
+    urls = []
+    while pending and len(urls) < sitemap_limit and len(visited) < max_sitemaps:
+        sitemap_url = pending.popleft()
+        if sitemap_url in visited:
+            continue
+        visited.add(sitemap_url)
+        data = fetch_url_bytes(sitemap_url)
+        try:
+            root = ElementTree.fromstring(data) if data else None
+        except ElementTree.ParseError:
+            root = None
+        if root is None:
+            continue
+        is_index = root.tag.endswith('sitemapindex')
+        for element in root.iter():
+            if element.tag.endswith('loc') and element.text:
+                (pending if is_index else urls).append(element.text.strip())
+    return {"robots": robots, "sitemap": urls[:sitemap_limit]}
+
+class CrawlSegmentStore:
+    """
+    Almacenamiento empaquetado de .data/crawled: segmentos append-only + índice SQLite
+    
+    Cada crawl (contenido + metadatos) es un registro comprimido con zstd (zlib si no está
+    instalado zstandard) que se añade al final de crawled/segments/segment-NNNNNN.bss; un
+    segmento se cierra al superar segment_bytes. El índice crawled/packed.sqlite guarda solo
+    las columnas de búsqueda y la posición de cada registro: los metadatos completos viajan
+    dentro del registro. La clave es la ruta original del fichero de contenido, así que las
+    rutas del índice de artefactos siguen siendo válidas después de migrar.
+    
+    Registro: cabecera <4sBIII (magic, códec, tamaño sin comprimir, tamaño comprimido, crc32
+    de los datos comprimidos) seguida de JSON(metadatos) + NUL + contenido, comprimidos.
+    """
+    MAGIC = b'BSR1'
+    HEADER = struct.Struct('<4sBIII')
+    CODEC_ZLIB = 1
+    CODEC_ZSTD = 2
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS records (
+            source_path TEXT PRIMARY KEY,
+            url TEXT NOT NULL,
+            normalized_url TEXT NOT NULL,
+            domain TEXT NOT NULL,
+            crawled_at REAL NOT NULL,
+            title TEXT,
+            size INTEGER NOT NULL,
+            sha256 TEXT NOT NULL,
+            segment INTEGER NOT NULL,
+            position INTEGER NOT NULL,
+            length INTEGER NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_records_url ON records(normalized_url, crawled_at);
+        CREATE INDEX IF NOT EXISTS idx_records_position ON records(segment, position);
+    """
+    
+    def __init__(self, crawled_dir: str = CRAWLED_DIR, segment_bytes: int = PACKED_SEGMENT_BYTES,
+                 level: int = 9):
+        self.crawled_dir = crawled_dir
+        self.segments_dir = os.path.join(crawled_dir, "segments")
+        self.db_path = os.path.join(crawled_dir, "packed.sqlite")
+        self.segment_bytes = segment_bytes
+        self.level = level
+        self.conn: Optional[sqlite3.Connection] = None
+        self._compressor = zstandard.ZstdCompressor(level=level) if zstandard is not None else None
+    
+    def exists(self) -> bool:
+        """Hay contenido empaquetado (sin índice no se crea nada al leer)"""
+        return self.conn is not None or os.path.exists(self.db_path)
+    
+    def _connect(self) -> sqlite3.Connection:
+        if self.conn is None:
+            os.makedirs(self.crawled_dir, exist_ok=True)
+            # Autocommit: las escrituras se serializan con _transaction() (BEGIN IMMEDIATE)
+            self.conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            self.conn.row_factory = sqlite3.Row
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.executescript(self.SCHEMA)
+        return self.conn
+    
+    @contextlib.contextmanager
+    def _transaction(self):
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+    
+    def _segment_path(self, segment: int) -> str:
+        return os.path.join(self.segments_dir, f"segment-{segment:06d}.bss")
+    
+    def _encode(self, metadata: Dict[str, Any], content: bytes) -> bytes:
+        raw = json.dumps(metadata, separators=(',', ':')).encode() + b'\0' + content
+        if self._compressor is not None:
+            codec, data = self.CODEC_ZSTD, self._compressor.compress(raw)
+        else:
+            codec, data = self.CODEC_ZLIB, zlib.compress(raw, min(self.level, 9))
+        return self.HEADER.pack(self.MAGIC, codec, len(raw), len(data), zlib.crc32(data)) + data
+    
+    @classmethod
+    def _decode(cls, record: bytes) -> tuple:
+        """(metadatos, contenido) de un registro; ValueError si está corrupto"""
+        magic, codec, raw_size, data_size, crc = cls.HEADER.unpack_from(record)
+        data = record[cls.HEADER.size:cls.HEADER.size + data_size]
+        if magic != cls.MAGIC or len(data) != data_size or zlib.crc32(data) != crc:
+            raise ValueError("Registro empaquetado corrupto")
+        if codec == cls.CODEC_ZSTD:
+            if zstandard is None:
+                raise RuntimeError("Segmento comprimido con zstd: instala zstandard para leerlo")
+            raw = zstandard.ZstdDecompressor().decompress(data, max_output_size=raw_size)
+        elif codec == cls.CODEC_ZLIB:
+            raw = zlib.decompress(data)
+        else:
+            raise ValueError(f"Códec de segmento desconocido: {codec}")
+        metadata, _, content = raw.partition(b'\0')
+        return json.loads(metadata), str(content, 'utf-8', errors='replace')
+    
+    def _open_tail(self, conn: sqlite3.Connection) -> tuple:
+        """Segmento activo y fichero para añadir; descarta la cola no indexada de escrituras interrumpidas"""
+        row = conn.execute(
+            "SELECT segment, MAX(position + length) AS end FROM records "
+            "WHERE segment = (SELECT MAX(segment) FROM records)"
+        ).fetchone()
+        segment, end = (row["segment"], row["end"]) if row["segment"] is not None else (1, 0)
+        if end >= self.segment_bytes:
+            segment, end = segment + 1, 0
+        os.makedirs(self.segments_dir, exist_ok=True)
+        segment_file = open(self._segment_path(segment), 'a+b')
+        segment_file.truncate(end)
+        segment_file.seek(0, os.SEEK_END)
+        return segment, segment_file
+    
+    def append_many(self, items: Iterable[tuple]) -> int:
+        """
+        Añade (artifact, contenido en bytes, metadatos) al segmento activo
+        
+        artifact necesita content_path, url, crawled_at y title (una fila de CrawlArtifactIndex).
+        Los registros ya empaquetados con el mismo sha256 se omiten. El segmento se sincroniza
+        a disco antes de confirmar el índice: un registro indexado siempre está completo.
+        """
+        with self._transaction() as conn:
+            segment, segment_file = self._open_tail(conn)
+            rows = []
+            try:
+                for artifact, content, metadata in items:
+                    digest = hashlib.sha256(content).hexdigest()
+                    existing = conn.execute("SELECT sha256 FROM records WHERE source_path = ?",
+                                            (artifact["content_path"],)).fetchone()
+                    if existing and existing["sha256"] == digest:
+                        continue
+                    
+                    if segment_file.tell() >= self.segment_bytes:
+                        segment_file.flush()
+                        os.fsync(segment_file.fileno())
+                        segment_file.close()
+                        segment += 1
+                        segment_file = open(self._segment_path(segment), 'w+b')
+                    
+                    record = self._encode(metadata, content)
+                    position = segment_file.tell()
+                    segment_file.write(record)
+                    url = artifact["url"]
+                    rows.append((artifact["content_path"], url, normalize_url(url),
+                                 (urlparse(url).hostname or '').lower(), artifact["crawled_at"],
+                                 artifact.get("title"), len(content), digest, segment, position, len(record)))
+                segment_file.flush()
+                os.fsync(segment_file.fileno())
+            finally:
+                segment_file.close()
+            
+            conn.executemany("INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        return len(rows)
+    
+    def _read_record(self, row: sqlite3.Row) -> tuple:
+        with open(self._segment_path(row["segment"]), 'rb') as segment_file:
+            segment_file.seek(row["position"])
+            return self._decode(segment_file.read(row["length"]))
+    
+    def get(self, source_path: str) -> Optional[Dict[str, Any]]:
+        """Fila del índice de un registro (sin descomprimirlo)"""
+        if not self.exists():
+            return None
+        row = self._connect().execute("SELECT * FROM records WHERE source_path = ?", (source_path,)).fetchone()
+        return dict(row) if row else None
+    
+    def read(self, source_path: str) -> Optional[str]:
+        """Contenido empaquetado de un artefacto, por su ruta original"""
+        row = self.get(source_path)
+        return self._read_record(row)[1] if row else None
+    
+    def read_metadata(self, source_path: str) -> Optional[Dict[str, Any]]:
+        """Metadatos completos (el antiguo *_metadata.json) de un artefacto empaquetado"""
+        row = self.get(source_path)
+        return self._read_record(row)[0] if row else None
+    
+    def latest(self, url: str) -> Optional[Dict[str, Any]]:
+        """Último registro empaquetado de una URL, con su contenido"""
+        if not self.exists():
+            return None
+        row = self._connect().execute(
+            "SELECT * FROM records WHERE normalized_url = ? ORDER BY crawled_at DESC LIMIT 1", (normalize_url(url),)
+        ).fetchone()
+        if row is None:
+            return None
+        metadata, content = self._read_record(row)
+        return {**dict(row), "metadata": metadata, "content": content}
+    
+    def iter_records(self, since: float = 0.0, source_paths: set = None) -> Iterable[Dict[str, Any]]:
+        """
+        Recorre los registros crawleados desde since en orden físico (segmento, posición)
+        
+        Cada segmento se mapea en memoria una sola vez y se lee secuencialmente, sin un
+        open() por página: es la vía rápida para herramientas offline sobre todo el corpus.
+        Con source_paths solo se descomprimen esos registros (el filtro va sobre el índice).
+        """
+        if not self.exists():
+            return
+        rows = self._connect().execute(
+            "SELECT * FROM records WHERE crawled_at >= ? ORDER BY segment, position", (since,)
+        ).fetchall()
+        segment, mapped = None, None
+        try:
+            for row in rows:
+                if source_paths is not None and row["source_path"] not in source_paths:
+                    continue
+                if row["segment"] != segment:
+                    if mapped is not None:
+                        mapped.close()
+                    segment = row["segment"]
+                    with open(self._segment_path(segment), 'rb') as segment_file:
+                        mapped = mmap.mmap(segment_file.fileno(), 0, access=mmap.ACCESS_READ)
+                metadata, content = self._decode(mapped[row["position"]:row["position"] + row["length"]])
+                yield {**dict(row), "metadata": metadata, "content": content}
+        finally:
+            if mapped is not None:
+                mapped.close()
+    
+    def pack_artifacts(self, artifact_index: 'CrawlArtifactIndex', remove_files: bool = True,
+                       batch_size: int = 200) -> Dict[str, int]:
+        """
+        Migra a segmentos los artefactos sueltos de .data/crawled (contenido + *_metadata.json)
+        
+        Es incremental: se puede repetir para empaquetar lo crawleado desde la última vez. Los
+        ficheros se borran solo cuando su registro ya está confirmado en el índice.
+        """
+        if zstandard is None:
+            logger.warning("⚠️ zstandard no está instalado: los segmentos se comprimirán con zlib")
+        artifacts = [artifact for artifact in artifact_index.since(0) if os.path.exists(artifact["content_path"])]
+        stats = {"candidates": len(artifacts), "packed": 0, "removedFiles": 0, "errors": 0}
+        loaded: Dict[str, str] = {}
+        
+        def load(batch: List[Dict[str, Any]]):
+            for artifact in batch:
+                try:
+                    with open(artifact["content_path"], 'rb') as f:
+                        content = f.read()
+                    metadata = {"url": artifact["url"], "title": artifact["title"]}
+                    if artifact["metadata_path"] and os.path.exists(artifact["metadata_path"]):
+                        with open(artifact["metadata_path"], encoding='utf-8') as f:
+                            metadata = json.load(f)
+                except (OSError, json.JSONDecodeError) as e:
+                    logger.warning(f"⚠️ No se pudo empaquetar {artifact['content_path']}: {e}")
+                    stats["errors"] += 1
+                    continue
+                loaded[artifact["content_path"]] = hashlib.sha256(content).hexdigest()
+                yield artifact, content, metadata
+        
+        for start in range(0, len(artifacts), batch_size):
+            batch = artifacts[start:start + batch_size]
+            stats["packed"] += self.append_many(load(batch))
+            if not remove_files:
+                continue
+            for artifact in batch:
+                # Solo se borra lo que está en un segmento con el mismo contenido que se leyó
+                record = self.get(artifact["content_path"])
+                if not record or record["sha256"] != loaded.get(artifact["content_path"]):
+                    continue
+                for path in (artifact["content_path"], artifact["metadata_path"]):
+                    with contextlib.suppress(FileNotFoundError, TypeError):
+                        os.remove(path)
+                        stats["removedFiles"] += 1
+            logger.info(f"📦 Empaquetados {min(start + batch_size, len(artifacts))}/{len(artifacts)} artefactos")
+        return stats
+    
+    def stats(self) -> Dict[str, Any]:
+        """Registros, tamaño original y tamaño en disco de los segmentos"""
+        if not self.exists():
+            return {"records": 0, "contentBytes": 0, "segments": 0, "segmentBytes": 0}
+        row = self._connect().execute(
+            "SELECT COUNT(*) AS records, COALESCE(SUM(size), 0) AS content_bytes, "
+            "COUNT(DISTINCT segment) AS segments FROM records"
+        ).fetchone()
+        segment_bytes = sum(entry.stat().st_size for entry in os.scandir(self.segments_dir)
+                            if entry.name.endswith(".bss")) if os.path.isdir(self.segments_dir) else 0
+        return {"records": row["records"], "contentBytes": row["content_bytes"],
+                "segments": row["segments"], "segmentBytes": segment_bytes}
+    
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+class CrawlArtifactIndex:
+    """
+    Índice SQLite de los artefactos de .data/crawled
+    
+    El servidor MCP añade cada crawl al manifiesto append-only crawled/index.jsonl.
+    sync() incorpora solo las líneas nuevas desde el último offset leído, de modo que
+    buscar el último crawl de una URL o dominio es una consulta indexada y no un glob
+    del directorio. Al crear el índice se importan una vez los *_metadata.json existentes.
+    Los artefactos migrados a segmentos (CrawlSegmentStore) conservan su ruta original como
+    clave: read_content() los lee del fichero suelto o de su segmento.
+    """
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS artifacts (
+            content_path TEXT PRIMARY KEY,
+            url TEXT NOT NULL,
+            normalized_url TEXT NOT NULL,
+            domain TEXT NOT NULL,
+            crawled_at REAL NOT NULL,
+            metadata_path TEXT,
+            size INTEGER,
+            sha256 TEXT,
+            title TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_artifacts_url ON artifacts(normalized_url, crawled_at);
+        CREATE INDEX IF NOT EXISTS idx_artifacts_domain ON artifacts(domain, crawled_at);
+        CREATE TABLE IF NOT EXISTS index_state (key TEXT PRIMARY KEY, value TEXT);
+    """
+    
+    def __init__(self, crawled_dir: str = CRAWLED_DIR):
+        self.crawled_dir = crawled_dir
+        self.manifest_path = os.path.join(crawled_dir, "index.jsonl")
+        self.db_path = os.path.join(crawled_dir, "index.sqlite")
+        self.conn: Optional[sqlite3.Connection] = None
+        self.packed = CrawlSegmentStore(crawled_dir)
+    
+    def _connect(self) -> sqlite3.Connection:
+        if self.conn is None:
+            os.makedirs(self.crawled_dir, exist_ok=True)
+            is_new = not os.path.exists(self.db_path)
+            self.conn = sqlite3.connect(self.db_path)
+            self.conn.row_factory = sqlite3.Row
+            self.conn.executescript(self.SCHEMA)
+            if is_new:
+                self.import_metadata_files()
+        return self.conn
+    
+    @staticmethod
+    def _parse_timestamp(timestamp: str, fallback: float) -> float:
+        try:
+            return datetime.fromisoformat(timestamp.replace('Z', '+00:00')).timestamp()
+        except (AttributeError, ValueError):
+            return fallback
+    
+    def record(self, url: str, content_path: str, metadata_path: str = None, crawled_at: float = None,
+               size: int = None, sha256: str = None, title: str = None):
+        """Añade (o actualiza) un artefacto en el índice"""
+        self._record_many([(url, content_path, metadata_path, crawled_at or time.time(), size, sha256, title)])
+        self.conn.commit()
+    
+    def _record_many(self, rows: List[tuple]):
+        conn = self._connect()
+        conn.executemany(
+            "INSERT OR REPLACE INTO artifacts "
+            "(content_path, url, normalized_url, domain, crawled_at, metadata_path, size, sha256, title) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [
+                (content_path, url, normalize_url(url), (urlparse(url).hostname or '').lower(),
+                 crawled_at, metadata_path, size, sha256, title)
+                for url, content_path, metadata_path, crawled_at, size, sha256, title in rows
+            ]
+        )
+    
+    def sync(self) -> int:
+        """Incorpora las entradas nuevas del manifiesto; devuelve cuántas se añadieron"""
+        conn = self._connect()
+        if not os.path.exists(self.manifest_path):
+            return 0
+        
+        row = conn.execute("SELECT value FROM index_state WHERE key = 'manifest_offset'").fetchone()
+        offset = int(row["value"]) if row else 0
+        manifest_size = os.path.getsize(self.manifest_path)
+        if manifest_size < offset:
+            # Manifiesto truncado o rotado: releerlo entero (INSERT OR REPLACE evita duplicados)
+            offset = 0
+        if manifest_size == offset:
+            return 0
+        
+        with open(self.manifest_path, 'rb') as manifest:
+            manifest.seek(offset)
+            data = manifest.read()
+        # Procesar solo líneas completas: la última puede estar escribiéndose todavía
+        complete = data.rfind(b'\n') + 1
+        
+        rows = []
+        for line in data[:complete].splitlines():
+            try:
+                entry = json.loads(line)
+                rows.append((
+                    entry["url"], entry["contentFile"], entry.get("metadataFile"),
+                    self._parse_timestamp(entry.get("timestamp"), time.time()),
+                    entry.get("size"), entry.get("sha256"), entry.get("title")
+                ))
+            except (json.JSONDecodeError, KeyError) as e:
+                logger.debug(f"Entrada de manifiesto inválida: {e}")
+        
+        if rows:
+            self._record_many(rows)
+        conn.execute(
+            "INSERT OR REPLACE INTO index_state (key, value) VALUES ('manifest_offset', ?)",
+            (str(offset + complete),)
+        )
+        conn.commit()
+        return len(rows)
+    
+    def import_metadata_files(self) -> int:
+        """Importa los artefactos existentes a partir de sus *_metadata.json (migración inicial)"""
+        conn = self._connect()
+        rows = []
+        for directory in (self.crawled_dir, os.path.join(self.crawled_dir, "advanced")):
+            if not os.path.isdir(directory):
+                continue
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if not entry.name.endswith("metadata.json"):
+                        continue
+                    try:
+                        with open(entry.path, encoding='utf-8') as f:
+                            metadata = json.load(f)
+                        content_path = os.path.join(directory, metadata["files"]["content"])
+                        rows.append((
+                            metadata["url"], content_path, entry.path,
+                            self._parse_timestamp(metadata.get("timestamp"), entry.stat().st_mtime),
+                            metadata.get("contentSize"), None, metadata.get("title")
+                        ))
+                    except (OSError, json.JSONDecodeError, KeyError, TypeError) as e:
+                        logger.debug(f"Metadatos no importables {entry.path}: {e}")
+        if rows:
+            self._record_many(rows)
+        conn.commit()
+        logger.info(f"🗂️ Índice de artefactos creado con {len(rows)} crawls existentes")
+        return len(rows)
+    
+    def since(self, crawled_at: float) -> List[Dict[str, Any]]:
+        """Artefactos crawleados a partir de un instante, del más antiguo al más reciente"""
+        self.sync()
+        rows = self.conn.execute(
+            "SELECT * FROM artifacts WHERE crawled_at >= ? ORDER BY crawled_at", (crawled_at,)
+        ).fetchall()
+        return [dict(row) for row in rows]
+    
+    def after(self, row_id: int) -> List[Dict[str, Any]]:
+        """
+        Artefactos registrados después de la fila row_id, en orden de registro
+        
+        El rowid crece con cada INSERT OR REPLACE, así que sirve de cursor aunque el
+        manifiesto traiga los crawls desordenados por crawled_at.
+        """
+        self.sync()
+        rows = self.conn.execute(
+            "SELECT rowid AS row_id, * FROM artifacts WHERE rowid > ? ORDER BY rowid", (row_id,)
+        ).fetchall()
+        return [dict(row) for row in rows]
+    
+    def latest(self, url: str, max_age: float = None) -> Optional[Dict[str, Any]]:
+        """Último artefacto de una URL, opcionalmente no más antiguo que max_age segundos"""
+        return self._latest("normalized_url", normalize_url(url), max_age)
+    
+    def latest_for_domain(self, domain: str, max_age: float = None) -> Optional[Dict[str, Any]]:
+        """Último artefacto de un dominio"""
+        return self._latest("domain", domain.lower(), max_age)
+    
+    def _latest(self, column: str, value: str, max_age: float = None) -> Optional[Dict[str, Any]]:
+        self.sync()
+        min_crawled_at = time.time() - max_age if max_age is not None else 0
+        row = self.conn.execute(
+            f"SELECT * FROM artifacts WHERE {column} = ? AND crawled_at >= ? ORDER BY crawled_at DESC LIMIT 1",
+            (value, min_crawled_at)
+        ).fetchone()
+        return dict(row) if row else None
+    
+    def iter_contents(self, since: float = 0.0, latest_only: bool = True) -> Iterable[Dict[str, Any]]:
+        """
+        Artefactos con su contenido, sueltos o empaquetados (solo la última versión de cada URL)
+        
+        Primero los empaquetados, en orden físico de los segmentos; después los ficheros sueltos.
+        """
+        artifacts = self.since(since)
+        latest = {artifact["normalized_url"]: artifact["content_path"] for artifact in artifacts}
+        wanted = set(latest.values()) if latest_only else {artifact["content_path"] for artifact in artifacts}
+        
+        for record in self.packed.iter_records(since, source_paths=wanted):
+            wanted.discard(record["source_path"])
+            yield {"content_path": record["source_path"], "url": record["url"], "title": record["title"],
+                   "crawled_at": record["crawled_at"], "content": record["content"]}
+        for artifact in artifacts:
+            if artifact["content_path"] not in wanted:
+                continue
+            try:
+                content = read_mapped_text(artifact["content_path"])
+            except FileNotFoundError:
+                continue
+            yield {**artifact, "content": content}
+    
+    def read_content(self, content_path: str) -> Optional[str]:
+        """Contenido de un artefacto: del fichero suelto o, si ya se empaquetó, de su segmento"""
+        try:
+            return read_mapped_text(content_path)
+        except FileNotFoundError:
+            return self.packed.read(content_path)
+    
+    def close(self):
+        self.packed.close()
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+class CrawlJobQueue:
+    """
+    Cola persistente de crawls en SQLite (.data/jobs.sqlite)
+    
+    - Deduplica por URL normalizada y herramienta: no encola una URL pendiente o en curso,
+      ni una completada hace menos de dedup_window segundos
+    - Prioridades: primero la más alta y, a igualdad, la más antigua
+    - Leases: el worker reserva el trabajo durante lease_seconds y lo renueva mientras el
+      crawl sigue en curso; si el proceso muere el lease caduca y otro worker lo retoma
+    - Reintentos con backoff hasta max_attempts; después el trabajo queda en failed
+    
+    Varios procesos pueden compartir la cola: las reservas se hacen en transacciones
+    BEGIN IMMEDIATE sobre una base de datos en modo WAL. Los métodos son bloqueantes y
+    la conexión se protege con un lock, así que pueden llamarse con asyncio.to_thread.
+    """
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            url TEXT NOT NULL,
+            normalized_url TEXT NOT NULL,
+            tool TEXT NOT NULL,
+            arguments TEXT NOT NULL,
+            priority INTEGER NOT NULL DEFAULT 0,
+            status TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            max_attempts INTEGER NOT NULL,
+            available_at REAL NOT NULL,
+            lease_owner TEXT,
+            lease_expires REAL,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL,
+            result TEXT,
+            error TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_jobs_ready ON jobs(status, priority DESC, id);
+        CREATE INDEX IF NOT EXISTS idx_jobs_url ON jobs(normalized_url, tool, updated_at);
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_active_url ON jobs(normalized_url, tool)
+            WHERE status IN ('queued', 'running');
+    """
+    
+    def __init__(self, db_path: str = JOBS_DB_PATH, lease_seconds: float = 60.0, max_attempts: int = 3,
+                 dedup_window: float = 3600.0):
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.dedup_window = dedup_window
+        self.conn: Optional[sqlite3.Connection] = None
+        self.lock = threading.RLock()
+    
+    def _connect(self) -> sqlite3.Connection:
+        if self.conn is None:
+            os.makedirs(os.path.dirname(self.db_path) or '.', exist_ok=True)
+            # Autocommit: las transacciones se abren explícitamente con _transaction()
+            self.conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None,
+                                        check_same_thread=False)
+            self.conn.row_factory = sqlite3.Row
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.executescript(self.SCHEMA)
+        return self.conn
+    
+    @contextlib.contextmanager
+    def _transaction(self):
+        with self.lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+    
+    def enqueue(self, urls: Iterable[str], priority: int = 0, tool: str = "bs.ingest_url",
+                arguments: Dict[str, Any] = None) -> Dict[str, List[int]]:
+        """Encola URLs; devuelve los ids nuevos y los de trabajos existentes que las cubren"""
+        now = time.time()
+        enqueued, duplicates = [], []
+        with self._transaction() as conn:
+            for url in dict.fromkeys(url.strip() for url in urls if url.strip()):
+                normalized = normalize_url(url)
+                existing = conn.execute(
+                    "SELECT id, status FROM jobs WHERE normalized_url = ? AND tool = ? "
+                    "AND (status IN ('queued', 'running') OR (status = 'done' AND updated_at >= ?)) "
+                    "ORDER BY id DESC LIMIT 1",
+                    (normalized, tool, now - self.dedup_window)
+                ).fetchone()
+                if existing:
+                    if existing["status"] == "queued":
+                        conn.execute("UPDATE jobs SET priority = MAX(priority, ?) WHERE id = ?",
+                                     (priority, existing["id"]))
+                    duplicates.append(existing["id"])
+                    continue
+                cursor = conn.execute(
+                    "INSERT INTO jobs (url, normalized_url, tool, arguments, priority, status, max_attempts, "
+                    "available_at, created_at, updated_at) VALUES (?, ?, ?, ?, ?, 'queued', ?, ?, ?, ?)",
+                    (url, normalized, tool, json.dumps({"url": url, **(arguments or {})}), priority,
+                     self.max_attempts, now, now, now)
+                )
+                enqueued.append(cursor.lastrowid)
+        if enqueued:
+            logger.info(f"📥 {len(enqueued)} trabajos encolados ({len(duplicates)} duplicados omitidos)")
+        return {"enqueued": enqueued, "duplicates": duplicates}
+    
+    def lease(self, owner: str, limit: int = 1) -> List[Dict[str, Any]]:
+        """Reserva hasta limit trabajos listos, incluidos los de leases caducados (procesos caídos)"""
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', lease_owner = NULL, updated_at = ?, "
+                "error = 'Lease caducado en el último intento' "
+                "WHERE status = 'running' AND lease_expires < ? AND attempts >= max_attempts",
+                (now, now)
+            )
+            rows = conn.execute(
+                "SELECT * FROM jobs WHERE (status = 'queued' AND available_at <= ?) "
+                "OR (status = 'running' AND lease_expires < ?) ORDER BY priority DESC, id LIMIT ?",
+                (now, now, limit)
+            ).fetchall()
+            for row in rows:
+                if row["status"] == "running":
+                    logger.warning(f"♻️ Retomando trabajo {row['id']} ({row['url']}): lease de {row['lease_owner']} caducado")
+                conn.execute(
+                    "UPDATE jobs SET status = 'running', attempts = attempts + 1, lease_owner = ?, "
+                    "lease_expires = ?, updated_at = ? WHERE id = ?",
+                    (owner, now + self.lease_seconds, now, row["id"])
+                )
+        return [{**dict(row), "attempts": row["attempts"] + 1, "arguments": json.loads(row["arguments"])}
+                for row in rows]
+    
+    def renew(self, owner: str) -> int:
+        """Prolonga los leases de todos los trabajos en curso de owner"""
+        with self._transaction() as conn:
+            return conn.execute(
+                "UPDATE jobs SET lease_expires = ? WHERE lease_owner = ? AND status = 'running'",
+                (time.time() + self.lease_seconds, owner)
+            ).rowcount
+    
+    def complete(self, job_id: int, owner: str, result: Dict[str, Any]) -> bool:
+        """Marca el trabajo como terminado; False si el lease ya no pertenece a owner"""
+        with self._transaction() as conn:
+            return conn.execute(
+                "UPDATE jobs SET status = 'done', lease_owner = NULL, lease_expires = NULL, updated_at = ?, "
+                "result = ?, error = NULL WHERE id = ? AND lease_owner = ? AND status = 'running'",
+                (time.time(), json.dumps(result, ensure_ascii=False), job_id, owner)
+            ).rowcount == 1
+    
+    def fail(self, job_id: int, owner: str, error: str, retryable: bool = True) -> str:
+        """Registra un fallo: vuelve a la cola con backoff o queda en failed; devuelve el nuevo estado"""
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute("SELECT attempts, max_attempts FROM jobs WHERE id = ? AND lease_owner = ?",
+                               (job_id, owner)).fetchone()
+            if row is None:
+                return "lost"
+            status = "queued" if retryable and row["attempts"] < row["max_attempts"] else "failed"
+            available_at = now + backoff_delay(row["attempts"], base=5.0, cap=300.0)
+            conn.execute(
+                "UPDATE jobs SET status = ?, lease_owner = NULL, lease_expires = NULL, available_at = ?, "
+                "updated_at = ?, error = ? WHERE id = ?",
+                (status, available_at, now, error, job_id)
+            )
+        return status
+    
+    def release(self, owner: str) -> int:
+        """Devuelve a la cola, sin gastar intento, los trabajos en curso de owner (parada ordenada)"""
+        with self._transaction() as conn:
+            return conn.execute(
+                "UPDATE jobs SET status = 'queued', attempts = MAX(attempts - 1, 0), lease_owner = NULL, "
+                "lease_expires = NULL, updated_at = ? WHERE lease_owner = ? AND status = 'running'",
+                (time.time(), owner)
+            ).rowcount
+    
+    def retry_failed(self) -> int:
+        """
+        Vuelve a encolar los trabajos fallidos con los intentos a cero
+        
+        Solo el fallo más reciente de cada URL, y solo si no hay ya otro trabajo en cola o en
+        curso para ella (idx_jobs_active_url); los fallos así cubiertos pasan a cancelled.
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            requeued = conn.execute(
+                "UPDATE jobs SET status = 'queued', attempts = 0, available_at = ?, updated_at = ? "
+                "WHERE status = 'failed' "
+                "AND id = (SELECT MAX(id) FROM jobs AS other WHERE other.normalized_url = jobs.normalized_url "
+                "          AND other.tool = jobs.tool AND other.status = 'failed') "
+                "AND NOT EXISTS (SELECT 1 FROM jobs AS active WHERE active.normalized_url = jobs.normalized_url "
+                "                AND active.tool = jobs.tool AND active.status IN ('queued', 'running'))",
+                (now, now)
+            ).rowcount
+            conn.execute(
+                "UPDATE jobs SET status = 'cancelled', updated_at = ? WHERE status = 'failed' "
+                "AND EXISTS (SELECT 1 FROM jobs AS active WHERE active.normalized_url = jobs.normalized_url "
+                "            AND active.tool = jobs.tool AND active.status IN ('queued', 'running'))",
+                (now,)
+            )
+            return requeued
+    
+    def cancel(self, job_id: int) -> bool:
+        """Cancela un trabajo que todavía no ha empezado"""
+        with self._transaction() as conn:
+            return conn.execute(
+                "UPDATE jobs SET status = 'cancelled', updated_at = ? WHERE id = ? AND status = 'queued'",
+                (time.time(), job_id)
+            ).rowcount == 1
+    
+    def get(self, job_id: int) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            row = self._connect().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        for field in ("arguments", "result"):
+            job[field] = json.loads(job[field]) if job[field] else None
+        return job
+    
+    def pending(self) -> int:
+        """Trabajos en cola o en curso (en cualquier proceso)"""
+        with self.lock:
+            return self._connect().execute(
+                "SELECT COUNT(*) FROM jobs WHERE status IN ('queued', 'running')"
+            ).fetchone()[0]
+    
+    def status(self) -> Dict[str, Any]:
+        """Recuento por estado y antigüedad del trabajo listo más antiguo"""
+        with self.lock:
+            conn = self._connect()
+            counts = {row["status"]: row["total"] for row in conn.execute(
+                "SELECT status, COUNT(*) AS total FROM jobs GROUP BY status"
+            )}
+            oldest = conn.execute("SELECT MIN(created_at) FROM jobs WHERE status = 'queued'").fetchone()[0]
+        return {
+            "counts": {status: counts.get(status, 0) for status in ("queued", "running", "done", "failed", "cancelled")},
+            "oldestQueuedSeconds": round(time.time() - oldest, 1) if oldest else None
+        }
+    
+    def close(self):
+        with self.lock:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+
+class ContextBuilder:
+    """
+    Selecciona los fragmentos del markdown crawleado más relevantes para una pregunta
+    
+    Divide el contenido en fragmentos por secciones y párrafos, los puntúa con BM25
+    frente a la pregunta y empaqueta los mejores dentro de un presupuesto de tokens,
+    conservando el orden original del documento.
+    """
+    WORD_PATTERN = re.compile(r'\w+', re.UNICODE)
+    URL_PATTERN = re.compile(r'https?://\S+')
+    
+    def __init__(self, token_budget: int = 1500, chunk_chars: int = 800, k1: float = 1.5, b: float = 0.75):
+        self.token_budget = token_budget
+        self.chunk_chars = chunk_chars
+        self.k1 = k1
+        self.b = b
+    
+    @staticmethod
+    def estimate_tokens(text: str) -> int:
+        """Aproximación barata: ~4 caracteres por token"""
+        return max(1, len(text) // 4)
+    
+    def tokenize(self, text: str) -> List[str]:
+        return [word for word in self.WORD_PATTERN.findall(text.lower()) if len(word) > 1]
+    
+    def split(self, content: str) -> List[str]:
+        """Agrupa párrafos en fragmentos de hasta chunk_chars, cortando siempre en cada encabezado"""
+        chunks = []
+        current = ''
+        for block in re.split(r'\n\s*\n', content):
+            block = block.strip()
+            if not block:
+                continue
+            if current and (block.startswith('#') or len(current) + len(block) > self.chunk_chars):
+                chunks.append(current)
+                current = ''
+            # Párrafos enormes: cortar por el último espacio antes del límite
+            while len(block) > self.chunk_chars:
+                cut = block.rfind(' ', 0, self.chunk_chars)
+                cut = cut if cut > 0 else self.chunk_chars
+                chunks.append(block[:cut])
+                block = block[cut:].lstrip()
+            current = f"{current}\n\n{block}" if current else block
+        if current:
+            chunks.append(current)
+        return chunks
+    
+    def score(self, chunks: List[str], query: str) -> List[float]:
+        """Puntuación BM25 de cada fragmento frente a la pregunta"""
+        query_terms = set(self.tokenize(self.URL_PATTERN.sub(' ', query)))
+        documents = [self.tokenize(chunk) for chunk in chunks]
+        if not query_terms or not documents:
+            return [0.0] * len(chunks)
+        
+        avg_length = sum(len(doc) for doc in documents) / len(documents) or 1.0
+        document_frequency = Counter()
+        for doc in documents:
+            document_frequency.update(set(doc) & query_terms)
+        idf = {
+            term: math.log(1 + (len(documents) - freq + 0.5) / (freq + 0.5))
+            for term, freq in document_frequency.items()
+        }
+        
+        scores = []
+        for doc in documents:
+            term_counts = Counter(doc)
+            length_norm = self.k1 * (1 - self.b + self.b * len(doc) / avg_length)
+            scores.append(sum(
+                idf[term] * term_counts[term] * (self.k1 + 1) / (term_counts[term] + length_norm)
+                for term in idf if term in term_counts
+            ))
+        return scores
+    
+    def build(self, content: str, query: str) -> Dict[str, Any]:
+        """
+        Devuelve el contexto a incluir en el prompt
+        
+        Resultado: {"text", "selected", "total", "tokens"}. Si el contenido cabe entero
+        en el presupuesto se devuelve tal cual; si ningún fragmento coincide con la
+        pregunta se conservan los primeros del documento.
+        """
+        chunks = self.split(content)
+        if self.estimate_tokens(content) <= self.token_budget:
+            return {"text": content, "selected": len(chunks), "total": len(chunks),
+                    "tokens": self.estimate_tokens(content)}
+        
+        scores = self.score(chunks, query)
+        ranked = sorted(range(len(chunks)), key=lambda i: (-scores[i], i))
+        
+        selected = []
+        used_tokens = 0
+        for index in ranked:
+            chunk_tokens = self.estimate_tokens(chunks[index])
+            if used_tokens + chunk_tokens > self.token_budget:
+                continue
+            selected.append(index)
+            used_tokens += chunk_tokens
+        selected.sort()
+        
+        parts = []
+        previous = None
+        for index in selected:
+            if previous is not None and index != previous + 1:
+                parts.append('[...]')
+            parts.append(chunks[index])
+            previous = index
+        return {"text": '\n\n'.join(parts), "selected": len(selected), "total": len(chunks),
+                "tokens": used_tokens}
+
+class CorpusSearchIndex:
+    """
+    Índice de búsqueda local sobre todo lo crawleado en .data/crawled
+    
+    - Índice invertido SQLite FTS5 (ranking BM25) por fragmentos de cada página
+    - Opcional: vectores de embeddings de Ollama en un array NumPy memory-mapped,
+      combinados con el ranking textual por reciprocal rank fusion
+    
+    refresh() es incremental: indexa solo los artefactos nuevos del CrawlArtifactIndex
+    (cursor sobre su rowid, no sobre crawled_at) y sustituye los fragmentos de versiones
+    anteriores de la misma URL.
+    """
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS documents (
+            content_path TEXT PRIMARY KEY,
+            normalized_url TEXT NOT NULL,
+            crawled_at REAL NOT NULL,
+            active INTEGER NOT NULL DEFAULT 1
+        );
+        CREATE INDEX IF NOT EXISTS idx_documents_url ON documents(normalized_url, active);
+        CREATE VIRTUAL TABLE IF NOT EXISTS chunks USING fts5(
+            text, url UNINDEXED, title UNINDEXED, content_path UNINDEXED,
+            tokenize = 'unicode61 remove_diacritics 2'
+        );
+        CREATE TABLE IF NOT EXISTS chunk_vectors (chunk_id INTEGER PRIMARY KEY, vector_row INTEGER NOT NULL);
+        CREATE TABLE IF NOT EXISTS index_state (key TEXT PRIMARY KEY, value TEXT);
+    """
+    
+    def __init__(self, artifact_index: CrawlArtifactIndex, ollama_client=None, embedding_model: str = None,
+                 chunk_chars: int = 800):
+        self.artifact_index = artifact_index
+        self.db_path = os.path.join(artifact_index.crawled_dir, "search.sqlite")
+        self.vectors_path = os.path.join(artifact_index.crawled_dir, "search-vectors.f32")
+        self.splitter = ContextBuilder(chunk_chars=chunk_chars)
+        self.ollama_client = ollama_client
+        self.embedding_model = embedding_model if np is not None else None
+        if embedding_model and np is None:
+            logger.warning("⚠️ NumPy no está instalado: búsqueda solo textual (sin vectores)")
+        self.conn: Optional[sqlite3.Connection] = None
+        self.vector_dim: Optional[int] = None
+        self.refresh_lock = asyncio.Lock()
+    
+    def _connect(self) -> sqlite3.Connection:
+        if self.conn is None:
+            os.makedirs(self.artifact_index.crawled_dir, exist_ok=True)
+            self.conn = sqlite3.connect(self.db_path)
+            self.conn.row_factory = sqlite3.Row
+            self.conn.executescript(self.SCHEMA)
+            dim = self._state("vector_dim")
+            self.vector_dim = int(dim) if dim else None
+        return self.conn
+    
+    def _state(self, key: str) -> Optional[str]:
+        row = self.conn.execute("SELECT value FROM index_state WHERE key = ?", (key,)).fetchone()
+        return row["value"] if row else None
+    
+    def _set_state(self, key: str, value: Any):
+        self.conn.execute("INSERT OR REPLACE INTO index_state (key, value) VALUES (?, ?)", (key, str(value)))
+    
+    async def refresh(self) -> int:
+        """Indexa los artefactos nuevos; devuelve cuántas páginas se añadieron"""
+        async with self.refresh_lock:
+            conn = self._connect()
+            cursor_row = int(self._state("artifact_rowid") or 0)
+            retry_from = None
+            added = 0
+            
+            for artifact in self.artifact_index.after(cursor_row):
+                cursor_row = artifact["row_id"]
+                if conn.execute("SELECT 1 FROM documents WHERE content_path = ?",
+                                (artifact["content_path"],)).fetchone():
+                    continue
+                
+                newer = conn.execute(
+                    "SELECT 1 FROM documents WHERE normalized_url = ? AND active = 1 AND crawled_at > ?",
+                    (artifact["normalized_url"], artifact["crawled_at"])
+                ).fetchone()
+                if newer:
+                    conn.execute("INSERT INTO documents VALUES (?, ?, ?, 0)",
+                                 (artifact["content_path"], artifact["normalized_url"], artifact["crawled_at"]))
+                    continue
+                
+                try:
+                    content = self.artifact_index.read_content(artifact["content_path"])
+                except (OSError, ValueError, RuntimeError) as e:
+                    # Error de lectura: el cursor no pasa de aquí y se reintenta en el próximo refresh
+                    if retry_from is None:
+                        retry_from = artifact["row_id"] - 1
+                    logger.debug(f"No se pudo leer {artifact['content_path']}: {e}")
+                    continue
+                if content is None:
+                    continue
+                
+                # Retirar versiones anteriores de la misma URL
+                for old in conn.execute("SELECT content_path FROM documents WHERE normalized_url = ? AND active = 1",
+                                        (artifact["normalized_url"],)).fetchall():
+                    conn.execute("DELETE FROM chunks WHERE content_path = ?", (old["content_path"],))
+                    conn.execute("UPDATE documents SET active = 0 WHERE content_path = ?", (old["content_path"],))
+                
+                chunk_ids = []
+                for chunk in self.splitter.split(content):
+                    cursor = conn.execute(
+                        "INSERT INTO chunks (text, url, title, content_path) VALUES (?, ?, ?, ?)",
+                        (chunk, artifact["url"], artifact["title"], artifact["content_path"])
+                    )
+                    chunk_ids.append((cursor.lastrowid, chunk))
+                conn.execute("INSERT INTO documents VALUES (?, ?, ?, 1)",
+                             (artifact["content_path"], artifact["normalized_url"], artifact["crawled_at"]))
+                
+                if self.embedding_model and chunk_ids:
+                    await self._embed_chunks(chunk_ids)
+                added += 1
+            
+            self._set_state("artifact_rowid", cursor_row if retry_from is None else retry_from)
+            conn.commit()
+            if added:
+                logger.info(f"🔎 Índice de búsqueda actualizado: {added} páginas nuevas")
+            return added
+    
+    async def _embed(self, texts: List[str]):
+        started = time.monotonic()
+        with TRACING.span("ollama embed", **{"gen_ai.system": "ollama", "gen_ai.request.model": self.embedding_model}):
+            response = await self.ollama_client.embed(model=self.embedding_model, input=texts)
+        METRICS.observe('ollama_duration_seconds', time.monotonic() - started, operation='embed')
+        vectors = np.asarray(response["embeddings"], dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+    
+    async def _embed_chunks(self, chunk_ids: List[tuple], batch_size: int = 32):
+        """Añade los vectores normalizados al final del fichero memory-mapped"""
+        for start in range(0, len(chunk_ids), batch_size):
+            batch = chunk_ids[start:start + batch_size]
+            try:
+                vectors = await self._embed([text for _, text in batch])
+            except Exception as e:
+                logger.warning(f"⚠️ Error generando embeddings, se omiten vectores: {e}")
+                return
+            if self.vector_dim is None:
+                self.vector_dim = vectors.shape[1]
+                self._set_state("vector_dim", self.vector_dim)
+            first_row = self._vector_rows()
+            with open(self.vectors_path, 'ab') as f:
+                f.write(vectors.tobytes())
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO chunk_vectors (chunk_id, vector_row) VALUES (?, ?)",
+                [(chunk_id, first_row + offset) for offset, (chunk_id, _) in enumerate(batch)]
+            )
+    
+    def _vector_rows(self) -> int:
+        if not self.vector_dim or not os.path.exists(self.vectors_path):
+            return 0
+        return os.path.getsize(self.vectors_path) // (4 * self.vector_dim)
+    
+    def _text_search(self, query: str, limit: int) -> List[sqlite3.Row]:
+        terms = [term.replace('"', '') for term in self.splitter.tokenize(ContextBuilder.URL_PATTERN.sub(' ', query))]
+        if not terms:
+            return []
+        match = " OR ".join(f'"{term}"' for term in dict.fromkeys(terms))
+        return self.conn.execute(
+            "SELECT rowid AS chunk_id, text, url, title, content_path, bm25(chunks) AS rank "
+            "FROM chunks WHERE chunks MATCH ? ORDER BY rank LIMIT ?",
+            (match, limit)
+        ).fetchall()
+    
+    async def _vector_search(self, query: str, limit: int) -> List[int]:
+        rows = self._vector_rows()
+        if not self.embedding_model or rows == 0:
+            return []
+        vectors = np.memmap(self.vectors_path, dtype=np.float32, mode='r', shape=(rows, self.vector_dim))
+        query_vector = (await self._embed([query]))[0]
+        scores = vectors @ query_vector
+        top_rows = np.argsort(-scores)[:limit * 4]
+        if len(top_rows) == 0:
+            return []
+        placeholders = ",".join("?" * len(top_rows))
+        # Solo vectores de fragmentos vigentes (los de versiones retiradas ya no están en chunks)
+        found = self.conn.execute(
+            f"SELECT v.chunk_id, v.vector_row FROM chunk_vectors v JOIN chunks c ON c.rowid = v.chunk_id "
+            f"WHERE v.vector_row IN ({placeholders})",
+            [int(row) for row in top_rows]
+        ).fetchall()
+        chunk_by_row = {row["vector_row"]: row["chunk_id"] for row in found}
+        return [chunk_by_row[int(row)] for row in top_rows if int(row) in chunk_by_row][:limit]
+    
+    async def search(self, query: str, limit: int = 5) -> List[Dict[str, Any]]:
+        """Busca los fragmentos más relevantes del corpus local"""
+        await self.refresh()
+        text_hits = self._text_search(query, limit * 4)
+        vector_hits = await self._vector_search(query, limit * 4) if self.embedding_model else []
+        
+        # Reciprocal rank fusion de ambos rankings (k=60)
+        fused: Dict[int, float] = {}
+        for ranking in ([row["chunk_id"] for row in text_hits], vector_hits):
+            for position, chunk_id in enumerate(ranking):
+                fused[chunk_id] = fused.get(chunk_id, 0.0) + 1.0 / (60 + position)
+        
+        rows = {row["chunk_id"]: row for row in text_hits}
+        missing = [chunk_id for chunk_id in fused if chunk_id not in rows]
+        if missing:
+            placeholders = ",".join("?" * len(missing))
+            for row in self.conn.execute(
+                f"SELECT rowid AS chunk_id, text, url, title, content_path FROM chunks WHERE rowid IN ({placeholders})",
+                missing
+            ):
+                rows[row["chunk_id"]] = row
+        
+        results = []
+        for chunk_id in sorted(fused, key=fused.get, reverse=True)[:limit]:
+            row = rows[chunk_id]
+            results.append({
+                "url": row["url"],
+                "title": row["title"],
+                "text": row["text"],
+                "contentFile": row["content_path"],
+                "score": round(fused[chunk_id], 5)
+            })
+        return results
+    
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+# Herramientas que resuelve la propia sesión sin pasar por el servidor MCP
+LOCAL_TOOLS = [
+    {
+        "name": "bs.search",
+        "description": "Busca en el contenido ya crawleado (.data/crawled) sin volver a crawlear",
+        "inputSchema": {
+            "type": "object",
+            "properties": {
+                "query": {"type": "string", "description": "Texto a buscar"},
+                "limit": {"type": "number", "default": 5, "description": "Número máximo de fragmentos"}
+            },
+            "required": ["query"]
+        }
+    }
+]
+
+class LLMResponseCache:
+    """
+    Caché de respuestas de Ollama con coalescencia de peticiones idénticas
+    
+    - Memoria: LRU de max_entries respuestas que caducan a los ttl segundos
+    - Disco (opcional): SQLite en .data/llm-cache.sqlite con el mismo TTL y como máximo
+      max_disk_entries filas; sobrevive a reinicios y se comparte entre procesos
+    - Coalescencia: si una respuesta con la misma clave ya se está generando, las demás
+      peticiones esperan a esa generación en lugar de lanzar otra; si la generación falla,
+      la siguiente petición en espera la repite
+    """
+    DISK_SCHEMA = """
+        CREATE TABLE IF NOT EXISTS responses (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL,
+            expires_at REAL NOT NULL,
+            last_used REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_responses_last_used ON responses(last_used);
+    """
+    
+    def __init__(self, max_entries: int = 256, ttl: float = 3600.0, disk_path: str = None,
+                 max_disk_entries: int = 10000):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.disk_path = disk_path
+        self.max_disk_entries = max_disk_entries
+        self.entries: OrderedDict = OrderedDict()  # clave -> (caduca, respuesta)
+        self.in_flight: Dict[str, asyncio.Future] = {}
+        self.conn: Optional[sqlite3.Connection] = None
+        # get_or_generate usa el disco desde hilos (asyncio.to_thread): una conexión serializada
+        self.lock = threading.RLock()
+    
+    @staticmethod
+    def make_key(**parts) -> str:
+        return hashlib.sha256(json.dumps(parts, sort_keys=True, ensure_ascii=False).encode()).hexdigest()
+    
+    def _connect(self) -> sqlite3.Connection:
+        if self.conn is None:
+            os.makedirs(os.path.dirname(self.disk_path) or '.', exist_ok=True)
+            self.conn = sqlite3.connect(self.disk_path, timeout=30, check_same_thread=False)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.executescript(self.DISK_SCHEMA)
+        return self.conn
+    
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        value = self._get_memory(key)
+        if value is not None or not self.disk_path:
+            return value
+        return self._restore(key, self._load(key))
+    
+    def _get_memory(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] > time.time():
+            self.entries.move_to_end(key)
+            return entry[1]
+        del self.entries[key]
+        return None
+    
+    def _load(self, key: str) -> Optional[tuple]:
+        """(respuesta, caduca) vigente en disco; no toca la LRU para poder ir en un hilo"""
+        now = time.time()
+        with self.lock:
+            conn = self._connect()
+            row = conn.execute("SELECT value, expires_at FROM responses WHERE key = ? AND expires_at > ?",
+                               (key, now)).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            conn.commit()
+        return json.loads(row[0]), row[1]
+    
+    def _restore(self, key: str, row: Optional[tuple]) -> Optional[Dict[str, Any]]:
+        """Sube a memoria lo leído del disco"""
+        if row is None:
+            return None
+        self._remember(key, *row)
+        return row[0]
+    
+    def _remember(self, key: str, value: Dict[str, Any], expires_at: float):
+        self.entries[key] = (expires_at, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+    
+    def put(self, key: str, value: Dict[str, Any]):
+        expires_at = time.time() + self.ttl
+        self._remember(key, value, expires_at)
+        if self.disk_path:
+            self._store(key, value, expires_at)
+    
+    def _store(self, key: str, value: Dict[str, Any], expires_at: float):
+        now = time.time()
+        with self.lock:
+            conn = self._connect()
+            conn.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)",
+                         (key, json.dumps(value, ensure_ascii=False), expires_at, now))
+            # Caducadas fuera y, por encima del límite, las menos usadas recientemente
+            conn.execute("DELETE FROM responses WHERE expires_at <= ?", (now,))
+            conn.execute(
+                "DELETE FROM responses WHERE key IN "
+                "(SELECT key FROM responses ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_disk_entries,)
+            )
+            conn.commit()
+    
+    async def get_or_generate(self, key: str, generate: Callable[[], Awaitable[Dict[str, Any]]]) -> tuple:
+        """
+        Respuesta cacheada o generada; devuelve (respuesta, 'hit' | 'coalesced' | 'miss')
+        
+        La LRU se consulta en el bucle; el disco se lee y escribe en un hilo para que
+        una caché compartida y ocupada no frene al resto de conversaciones.
+        """
+        while True:
+            value = self._get_memory(key)
+            if value is None and self.disk_path:
+                value = self._restore(key, await asyncio.to_thread(self._load, key))
+            if value is not None:
+                return value, 'hit'
+            pending = self.in_flight.get(key)
+            if pending is None:
+                break
+            try:
+                return await asyncio.shield(pending), 'coalesced'
+            except Exception:
+                continue  # La generación original falló: la repite quien llegue primero
+        
+        future = asyncio.get_running_loop().create_future()
+        self.in_flight[key] = future
+        try:
+            value = await generate()
+        except BaseException as e:
+            self.in_flight.pop(key, None)
+            future.set_exception(RuntimeError(f"Generación abandonada: {e!r}"))
+            future.exception()  # Marcada como recuperada aunque nadie estuviera esperando
+            raise
+        self.in_flight.pop(key, None)
+        expires_at = time.time() + self.ttl
+        self._remember(key, value, expires_at)
+        future.set_result(value)
+        if self.disk_path:
+            try:
+                await asyncio.to_thread(self._store, key, value, expires_at)
+            except sqlite3.Error as e:
+                # La respuesta ya está generada; perder la copia en disco no es motivo para fallar
+                logger.warning(f"⚠️ No se pudo guardar la respuesta en la caché en disco: {e}")
+        return value, 'miss'
+    
+    def close(self):
+        with self.lock:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+
+class ConversationMemory:
+    """
+    Memoria multi-turno con presupuesto de tokens y prefijo estable
+    
+    Los mensajes se envían siempre como [system, resumen, turnos..., mensaje nuevo], de modo
+    que cada petición extiende la anterior y Ollama reutiliza su caché de prompt. Al superar
+    el presupuesto se retiran de golpe los turnos más antiguos hasta la mitad del presupuesto
+    y se resumen, así el prefijo solo cambia en compactaciones puntuales. El último turno se
+    conserva siempre (recortando su contexto si no cabe) para poder preguntar sobre él.
+    """
+    def __init__(self, system_prompt: str = SYSTEM_PROMPT, token_budget: int = 4096, summarizer=None):
+        self.system_prompt = system_prompt
+        self.token_budget = token_budget
+        self.summarizer = summarizer  # async (resumen_previo, transcripción) -> resumen
+        # Cada turno: [usuario, llamadas a herramientas y resultados..., respuesta final]
+        self.turns: List[List[Dict[str, Any]]] = []
+        self.summary = ''
+    
+    def tokens(self) -> int:
+        return sum(
+            ContextBuilder.estimate_tokens(message.get('content') or '')
+            for turn in self.turns for message in turn
+        )
+    
+    def build(self, user_content: str) -> List[Dict[str, str]]:
+        """Mensajes a enviar para un nuevo turno del usuario"""
+        messages = [{'role': 'system', 'content': self.system_prompt}]
+        if self.summary:
+            messages.append({'role': 'system', 'content': f"Resumen de la conversación anterior:\n{self.summary}"})
+        for turn in self.turns:
+            messages.extend(turn)
+        messages.append({'role': 'user', 'content': user_content})
+        return messages
+    
+    async def add_turn(self, user_content: str, assistant_content: str, tool_messages: List[Dict[str, Any]] = None):
+        """Registra un turno completo y compacta si se supera el presupuesto"""
+        self.turns.append([
+            {'role': 'user', 'content': user_content},
+            *(tool_messages or []),
+            {'role': 'assistant', 'content': assistant_content}
+        ])
+        if self.tokens() > self.token_budget:
+            await self._compact()
+    
+    async def _compact(self):
+        # El turno más reciente nunca se retira: si por sí solo no cabe, se recorta su contexto
+        evicted = []
+        while len(self.turns) > 1 and self.tokens() > self.token_budget // 2:
+            evicted.append(self.turns.pop(0))
+        if self.tokens() > self.token_budget // 2:
+            self._trim_turn(self.turns[-1], self.token_budget // 2)
+        if not evicted:
+            return
+        transcript = "\n".join(
+            f"{message['role']}: {message.get('content') or ''}"
+            for turn in evicted for message in turn if message.get('content')
+        )
+        logger.info(f"🧠 Compactando memoria: {len(evicted)} turnos retirados")
+        
+        if self.summarizer:
+            try:
+                self.summary = await self.summarizer(self.summary, transcript)
+                return
+            except Exception as e:
+                logger.warning(f"⚠️ No se pudo resumir la conversación: {e}")
+        # Sin resumen del LLM: conservar el final de la transcripción dentro de un cuarto del presupuesto
+        max_chars = self.token_budget
+        self.summary = f"{self.summary}\n{transcript}".strip()[-max_chars:]
+    
+    @staticmethod
+    def _trim_turn(turn: List[Dict[str, Any]], max_tokens: int):
+        """
+        Recorta un turno a max_tokens: primero los resultados de herramientas (del más largo
+        al más corto) y después el mensaje de usuario, que en la detección por palabras clave
+        lleva el resultado del crawl. La pregunta inicial y la respuesta se conservan.
+        """
+        excess = sum(ContextBuilder.estimate_tokens(message.get('content') or '') for message in turn) - max_tokens
+        tool_indexes = sorted((i for i, message in enumerate(turn) if message['role'] == 'tool'),
+                              key=lambda i: len(turn[i].get('content') or ''), reverse=True)
+        marker = " …[recortado]"
+        for index in [*tool_indexes, 0]:
+            if excess <= 0:
+                break
+            content = turn[index].get('content') or ''
+            tokens = ContextBuilder.estimate_tokens(content)
+            # La marca también ocupa: sin descontarla el exceso nunca llega a cero y se recorta de más
+            keep_chars = max(0, (tokens - excess) * 4 - len(marker))
+            if keep_chars >= len(content):
+                continue
+            trimmed = content[:keep_chars] + marker
+            turn[index] = {**turn[index], 'content': trimmed}
+            excess -= tokens - ContextBuilder.estimate_tokens(trimmed)
+    
+    def clear(self):
+        self.turns = []
+        self.summary = ''
 
 class OllamaMCPSession:
-    def __init__(self):
+    def __init__(self, workers: int = 1, max_workers: int = None, use_compiled: bool = True,
+                 context_tokens: int = 1500, embedding_model: str = None,
+                 history_tokens: int = 4096, num_ctx: int = 8192, keep_alive: str = '30m',
+                 native_tools: bool = True, max_tool_rounds: int = 4, response_cache_size: int = 256,
+                 response_cache_ttl: float = 3600.0, response_cache_disk: bool = False):
         self.mcp_executor = None
-        self.conversation_history = []
+        self.mcp_tools: List[Dict[str, Any]] = []
+        self.native_tools = native_tools
+        self.max_tool_rounds = max_tool_rounds
+        self.memory = ConversationMemory(token_budget=history_tokens, summarizer=self.summarize_turns)
+        self.num_ctx = num_ctx
+        self.keep_alive = keep_alive
+        self.workers = workers
+        self.max_workers = max(workers, max_workers or workers)
+        self.use_compiled = use_compiled
+        self.artifact_index = CrawlArtifactIndex()
+        self.model = OLLAMA_MODEL
+        self.ollama_client = ollama.AsyncClient() if ollama is not None else None
+        self.context_builder = ContextBuilder(token_budget=context_tokens)
+        self.search_index = CorpusSearchIndex(self.artifact_index, self.ollama_client, embedding_model)
+        # Caché de respuestas compartida por todas las conversaciones (None = desactivada)
+        self.response_cache = None
+        if response_cache_size or response_cache_disk:
+            self.response_cache = LLMResponseCache(response_cache_size, response_cache_ttl,
+                                                   LLM_CACHE_PATH if response_cache_disk else None)
+        # Destino de los eventos del turno (modo servidor); None = imprimir en consola
+        self.emit: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None
         
+    def conversation(self) -> 'OllamaMCPSession':
+        """Sesión para otra conversación: comparte executor, índices y cliente de Ollama, con memoria propia"""
+        child = copy.copy(self)
+        child.memory = ConversationMemory(token_budget=self.memory.token_budget, summarizer=self.summarize_turns)
+        child.emit = None
+        return child
+    
+    async def notify(self, event: Dict[str, Any], text: str = None):
+        """Envía un evento al cliente en modo servidor; en consola imprime su texto"""
+        if self.emit:
+            await self.emit(event)
+        elif text is not None:
+            print(text, end='', flush=True)
+    
     async def start(self):
         """Inicia la sesión Ollama + MCP"""
         logger.info("🚀 Iniciando sesión Ollama + BrainSlot MCP")
         print("🚀 === SESIÓN OLLAMA + BRAINSLOT MCP ===\n")
         
-        # Configurar MCP
-        mcp_command = ["npx", "tsx", "mcp-server-standalone.ts"]
-        mcp_env = {
-            "BS_DATA_ROOT": ".data",
-            "BS_ENABLE_CRAWLER": "true",
-            "BS_CRAWLER_PATH": "./external-mcps/crawler-mcp",
-            "PATH": f"{os.path.expanduser('~')}/.local/bin:{os.environ.get('PATH', '')}"
-        }
-        
-        logger.info(f"Configuración MCP: comando={mcp_command}, env={mcp_env}")
-        self.mcp_executor = MCPToolExecutor(mcp_command, mcp_env)
-        
         try:
-            tools_response = await self.mcp_executor.start_mcp_server()
-            
-            if not tools_response or tools_response.get("error"):
-                logger.error("❌ Fallo en inicialización de MCP, abortando")
-                print("❌ Error: No se pudo inicializar el servidor MCP correctamente")
+            if not await self.start_mcp():
                 return
                 
             print("\n🤖 ¡Ollama listo con capacidades MCP!")
             print("💡 Puedes solicitar crawling de URLs y Ollama usará automáticamente las herramientas MCP")
             print("📝 Ejemplo: 'Crawlea http://southimpact.com y dime qué información encuentras'")
-            print("📋 Comandos: 'exit' o 'quit' para salir\n")
+            print("📋 Comandos: 'exit' o 'quit' para salir, 'reset' para olvidar la conversación\n")
             
             await self.interactive_session()
             
@@ -292,12 +2711,38 @@ class OllamaMCPSession:
             if self.mcp_executor:
                 await self.mcp_executor.stop()
     
+    async def start_mcp(self) -> bool:
+        """Lanza el servidor MCP y obtiene sus herramientas"""
+        # Configurar MCP
+        mcp_command = resolve_mcp_command(self.use_compiled)
+        mcp_env = {
+            "BS_DATA_ROOT": DATA_ROOT,
+            "BS_ENABLE_CRAWLER": "true",
+            "BS_CRAWLER_PATH": "./external-mcps/crawler-mcp",
+            "PATH": f"{os.path.expanduser('~')}/.local/bin:{os.environ.get('PATH', '')}"
+        }
+        
+        logger.info(f"Configuración MCP: comando={mcp_command}, env={mcp_env}")
+        if self.max_workers > 1:
+            self.mcp_executor = MCPExecutorPool(mcp_command, mcp_env, self.workers, self.max_workers)
+        else:
+            self.mcp_executor = MCPToolExecutor(mcp_command, mcp_env)
+        
+        tools_response = await self.mcp_executor.start_mcp_server()
+        
+        if not tools_response or tools_response.get("error"):
+            logger.error("❌ Fallo en inicialización de MCP, abortando")
+            print("❌ Error: No se pudo inicializar el servidor MCP correctamente")
+            return False
+        self.mcp_tools = tools_response.get("result", {}).get("tools", [])
+        return True
+    
     async def interactive_session(self):
         """Sesión interactiva con Ollama"""
         while True:
             try:
-                # Obtener input del usuario
-                user_input = input("👤 Usuario: ").strip()
+                # Obtener input del usuario sin bloquear el event loop (stderr MCP, health checks)
+                user_input = (await asyncio.to_thread(input, "👤 Usuario: ")).strip()
                 
                 if user_input.lower() in ['exit', 'quit', 'salir']:
                     print("👋 ¡Hasta luego!")
@@ -306,15 +2751,42 @@ class OllamaMCPSession:
                 if not user_input:
                     continue
                 
-                # Analizar si necesita herramientas MCP
-                needs_mcp = await self.analyze_user_request(user_input)
+                if user_input.lower() == 'reset':
+                    self.memory.clear()
+                    print("🧹 Conversación olvidada\n")
+                    continue
+                
+                await self.respond(user_input)
                 
-                if needs_mcp:
-                    print("🔍 Detectada solicitud de crawling, ejecutando herramientas MCP...")
-                    mcp_result = await self.execute_mcp_for_request(user_input)
-                    
-                    # Crear prompt enriquecido para Ollama
-                    enhanced_prompt = f"""
+            except (KeyboardInterrupt, EOFError):
+                print("\n👋 ¡Hasta luego!")
+                break
+            except Exception as e:
+                print(f"❌ Error: {e}\n")
+    
+    async def respond(self, user_input: str) -> str:
+        """Un turno completo: tool-calling nativo o, si el modelo no lo soporta, detección por palabras clave"""
+        if self.ollama_client is None:
+            raise RuntimeError("El paquete ollama no está instalado (pip install ollama)")
+        if self.native_tools:
+            try:
+                return await self.answer_with_tools(user_input)
+            except ollama.ResponseError as e:
+                if 'tool' not in str(e).lower():
+                    raise
+                logger.warning(f"⚠️ El modelo no soporta tool-calling nativo, usando detección por palabras clave: {e}")
+                self.native_tools = False
+        
+        # Analizar si necesita herramientas MCP
+        needs_mcp = await self.analyze_user_request(user_input)
+        
+        if needs_mcp:
+            await self.notify({'event': 'tool_call', 'name': 'bs.ingest_url'},
+                              "🔍 Detectada solicitud de crawling, ejecutando herramientas MCP...\n")
+            mcp_result = await self.execute_mcp_for_request(user_input)
+            
+            # Crear prompt enriquecido para Ollama
+            enhanced_prompt = f"""
 Usuario solicita: {user_input}
 
 Resultado del crawling MCP:
@@ -322,29 +2794,264 @@ Resultado del crawling MCP:
 
 Por favor analiza este resultado y proporciona una respuesta útil al usuario sobre la información encontrada en el sitio web.
 """
-                    
-                    # Generar respuesta con Ollama
-                    response = ollama.chat(model='llama3.1:8b', messages=[{
-                        'role': 'user',
-                        'content': enhanced_prompt
-                    }])
-                    
-                    print(f"🤖 Ollama: {response['message']['content']}\n")
-                
-                else:
-                    # Chat normal con Ollama
-                    response = ollama.chat(model='llama3.1:8b', messages=[{
-                        'role': 'user', 
-                        'content': user_input
-                    }])
-                    
-                    print(f"🤖 Ollama: {response['message']['content']}\n")
-                
-            except KeyboardInterrupt:
-                print("\n👋 ¡Hasta luego!")
-                break
+            
+            # Generar respuesta con Ollama
+            reply = await self.stream_chat(self.memory.build(enhanced_prompt))
+            await self.memory.add_turn(enhanced_prompt, reply)
+        
+        else:
+            # Chat normal con Ollama
+            reply = await self.stream_chat(self.memory.build(user_input))
+            await self.memory.add_turn(user_input, reply)
+        return reply
+    
+    async def call_tool(self, tool_name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        """Ejecuta una herramienta local (LOCAL_TOOLS) o del servidor MCP, con respuesta en formato MCP"""
+        if tool_name == "bs.search":
+            try:
+                results = await self.search_index.search(arguments["query"], int(arguments.get("limit", 5)))
             except Exception as e:
-                print(f"❌ Error: {e}\n")
+                logger.error(f"❌ Error en bs.search: {e}")
+                return {"error": {"code": -1, "message": str(e)}}
+            payload = {"query": arguments["query"], "results": results, "source": "local-corpus"}
+            return {"result": {"content": [{"type": "text", "text": json.dumps(payload, ensure_ascii=False)}]}}
+        return await self.mcp_executor.execute_tool(tool_name, arguments)
+    
+    async def search_local_corpus(self, user_input: str, limit: int = 5) -> Optional[str]:
+        """Responde desde el corpus local: devuelve los fragmentos encontrados formateados o None"""
+        payload = parse_tool_payload(await self.call_tool("bs.search", {"query": user_input, "limit": limit}))
+        if not payload or not payload.get("results"):
+            return None
+        
+        logger.info(f"🔎 {len(payload['results'])} fragmentos encontrados en el corpus local")
+        sections = [
+            f"🔗 {hit['url']} ({hit.get('title') or 'sin título'})\n{hit['text']}"
+            for hit in payload["results"]
+        ]
+        return "📚 Información encontrada en páginas ya crawleadas:\n\n" + "\n\n---\n\n".join(sections)
+    
+    async def stream_chat(self, messages: List[Dict[str, Any]]) -> str:
+        """Genera la respuesta de Ollama en streaming, mostrando los tokens según llegan"""
+        return (await self.stream_response(messages))['content']
+    
+    async def stream_response(self, messages: List[Dict[str, Any]], tools: List[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Respuesta en streaming; devuelve el texto y las llamadas a herramientas que pida el modelo"""
+        if self.response_cache is None:
+            return await self._generate_response(messages, tools)
+        
+        response, outcome = await self.response_cache.get_or_generate(
+            self.response_cache_key(messages, tools), lambda: self._generate_response(messages, tools)
+        )
+        METRICS.inc('llm_cache_requests_total', 1, "Peticiones de respuesta a Ollama según la caché", result=outcome)
+        if outcome == 'miss':
+            return response
+        
+        logger.info(f"💾 Respuesta de Ollama servida desde caché ({outcome})")
+        if response['content']:
+            if not self.emit:
+                print("🤖 Ollama: ", end='', flush=True)
+            await self.notify({'event': 'token', 'content': response['content']}, response['content'] + "\n\n")
+        return copy.deepcopy(response)
+    
+    def response_cache_key(self, messages: List[Dict[str, Any]], tools: List[Dict[str, Any]] = None) -> str:
+        """Clave de caché: modelo y opciones, herramientas ofrecidas y hash del prompt con el contenido crawleado"""
+        return LLMResponseCache.make_key(
+            model=self.model,
+            options=self.ollama_options(),
+            tools=sorted(tool['function']['name'] for tool in tools or []),
+            messages=[cache_fingerprint(message) for message in messages]
+        )
+    
+    async def _generate_response(self, messages: List[Dict[str, Any]], tools: List[Dict[str, Any]] = None) -> Dict[str, Any]:
+        started = time.monotonic()
+        first_token_at = None
+        chunks = []
+        tool_calls = []
+        final = {}
+        extra = {'tools': tools} if tools else {}
+        
+        with TRACING.span("ollama chat", **{"gen_ai.system": "ollama", "gen_ai.request.model": self.model}):
+            async for part in await self.ollama_client.chat(model=self.model, messages=messages, stream=True,
+                                                            options=self.ollama_options(), keep_alive=self.keep_alive,
+                                                            **extra):
+                if part.get('done'):
+                    final = part
+                message = part['message']
+                token = message.get('content') or ''
+                if token:
+                    if first_token_at is None:
+                        first_token_at = time.monotonic()
+                        if not self.emit:
+                            print("🤖 Ollama: ", end='', flush=True)
+                    chunks.append(token)
+                    await self.notify({'event': 'token', 'content': token}, token)
+                for call in message.get('tool_calls') or []:
+                    tool_calls.append({'function': {
+                        'name': call['function']['name'],
+                        'arguments': dict(call['function'].get('arguments') or {})
+                    }})
+        if chunks and not self.emit:
+            print("\n")
+        
+        elapsed = time.monotonic() - started
+        ttft = (first_token_at - started) if first_token_at else elapsed
+        logger.info(f"⏱️ Ollama: primer token en {ttft * 1000:.0f} ms, respuesta completa en {elapsed:.1f} s")
+        self.record_ollama_metrics('chat_stream', elapsed, final, ttft=ttft,
+                                   streamed_tokens=len(chunks), generation_time=elapsed - ttft)
+        return {'content': ''.join(chunks), 'tool_calls': tool_calls}
+    
+    @staticmethod
+    def record_ollama_metrics(operation: str, elapsed: float, final: Dict[str, Any] = None, ttft: float = None,
+                              streamed_tokens: int = 0, generation_time: float = 0.0):
+        """Latencia, TTFT y tokens/s de una llamada a Ollama (contadores de la respuesta final si los hay)"""
+        final = final or {}
+        METRICS.observe('ollama_duration_seconds', elapsed, help_text="Duración de las llamadas a Ollama",
+                        operation=operation)
+        if ttft is not None:
+            METRICS.observe('ollama_time_to_first_token_seconds', ttft, help_text="Tiempo hasta el primer token")
+        
+        prompt_tokens = final.get('prompt_eval_count') or 0
+        completion_tokens = final.get('eval_count') or streamed_tokens
+        METRICS.inc('ollama_tokens_total', prompt_tokens, "Tokens procesados por Ollama", kind='prompt')
+        METRICS.inc('ollama_tokens_total', completion_tokens, kind='completion')
+        
+        eval_seconds = (final.get('eval_duration') or 0) / 1e9 or generation_time
+        if completion_tokens and eval_seconds > 0:
+            METRICS.observe('ollama_tokens_per_second', completion_tokens / eval_seconds, RATE_BUCKETS,
+                            "Velocidad de generación", operation=operation)
+    
+    def ollama_tools(self) -> List[Dict[str, Any]]:
+        """Herramientas de tools/list (más las locales) en el formato tools= de Ollama"""
+        return [
+            {
+                'type': 'function',
+                'function': {
+                    'name': tool['name'],
+                    'description': tool.get('description', ''),
+                    'parameters': tool.get('inputSchema') or {'type': 'object', 'properties': {}}
+                }
+            }
+            for tool in [*self.mcp_tools, *LOCAL_TOOLS]
+        ]
+    
+    async def answer_with_tools(self, user_input: str) -> str:
+        """
+        Turno con tool-calling nativo: el modelo decide qué herramientas usar
+        
+        Las llamadas de una misma ronda son independientes y se ejecutan en paralelo; sus
+        resultados vuelven al modelo hasta que responde sin pedir más herramientas.
+        """
+        messages = self.memory.build(user_input)
+        tools = self.ollama_tools()
+        exchange = []
+        
+        for _ in range(self.max_tool_rounds):
+            response = await self.stream_response(messages, tools)
+            if not response['tool_calls']:
+                await self.memory.add_turn(user_input, response['content'], exchange)
+                return response['content']
+            
+            names = ', '.join(call['function']['name'] for call in response['tool_calls'])
+            logger.info(f"🧰 El modelo solicita {len(response['tool_calls'])} herramientas: {names}")
+            for call in response['tool_calls']:
+                await self.notify({'event': 'tool_call', 'name': call['function']['name'],
+                                   'arguments': call['function']['arguments']})
+            # Un fallo en una llamada no debe tumbar las demás: el modelo recibe el error como resultado
+            results = await asyncio.gather(*[
+                self._run_tool_call(call, user_input) for call in response['tool_calls']
+            ], return_exceptions=True)
+            round_messages = [
+                {'role': 'assistant', 'content': response['content'], 'tool_calls': response['tool_calls']},
+                *({'role': 'tool', 'content': self._tool_error_for_llm(call['function']['name'], result)
+                   if isinstance(result, BaseException) else result}
+                  for call, result in zip(response['tool_calls'], results))
+            ]
+            messages.extend(round_messages)
+            exchange.extend(round_messages)
+        
+        # Límite de rondas alcanzado: pedir la respuesta final sin herramientas
+        response = await self.stream_response(messages)
+        await self.memory.add_turn(user_input, response['content'], exchange)
+        return response['content']
+    
+    async def _run_tool_call(self, call: Dict[str, Any], user_input: str) -> str:
+        """Ejecuta una llamada pedida por el modelo y devuelve el resultado como texto para el prompt"""
+        name = call['function']['name']
+        arguments = dict(call['function']['arguments'])
+        known_tools = {tool['name'] for tool in [*self.mcp_tools, *LOCAL_TOOLS]}
+        if name not in known_tools:
+            return json.dumps({'tool': name, 'error': f"Herramienta desconocida: {name}"}, ensure_ascii=False)
+        if name == 'bs.ingest_url':
+            arguments.setdefault('rules', DEFAULT_INGEST_RULES)
+        if name in ('bs.ingest_url', 'bs.advanced_crawl'):
+            arguments.setdefault('contentMode', CONTENT_MODE)
+        
+        try:
+            response = await self.call_tool(name, arguments)
+        except Exception as e:
+            logger.error(f"❌ Error ejecutando {name}: {e}")
+            response = {"error": {"code": -1, "message": str(e)}}
+        try:
+            return self._tool_result_for_llm(name, arguments, response, user_input)
+        except Exception as e:
+            return self._tool_error_for_llm(name, e)
+    
+    @staticmethod
+    def _tool_error_for_llm(name: str, error: BaseException) -> str:
+        logger.error(f"❌ Error procesando el resultado de {name}: {error}")
+        return json.dumps({'tool': name, 'error': str(error) or type(error).__name__}, ensure_ascii=False)
+    
+    def _tool_result_for_llm(self, name: str, arguments: Dict[str, Any], response: Dict[str, Any],
+                             user_input: str) -> str:
+        """Resultado compacto de una herramienta: el contenido crawleado se reduce a lo relevante"""
+        if not isinstance(response, dict):
+            return json.dumps({'tool': name, 'error': "Respuesta JSON-RPC inválida"}, ensure_ascii=False)
+        if response.get("error"):
+            # El crawl puede haber terminado aunque la respuesta no llegara a tiempo
+            crawled_files = self.check_crawled_files_for_url(arguments['url']) if arguments.get('url') else None
+            if not crawled_files:
+                error = response["error"]
+                message = error.get("message", "Error desconocido") if isinstance(error, dict) else str(error)
+                return json.dumps({'tool': name, 'error': message}, ensure_ascii=False)
+            payload = {'url': arguments['url'], 'status': 'completed',
+                       'fullContent': self.artifact_index.read_content(crawled_files['content_file']) or ''}
+        else:
+            payload = parse_tool_payload(response)
+            if payload is None:
+                result = response.get("result")
+                content = result.get("content") if isinstance(result, dict) else None
+                first = content[0] if isinstance(content, list) and content else None
+                text = first.get("text") if isinstance(first, dict) else None
+                return self.context_builder.build(text if isinstance(text, str) else "", user_input)['text']
+        
+        content = payload_content(payload, self.artifact_index)
+        for field in ('contentPreview', 'fullContent', 'extractedContent', 'contentRef'):
+            payload.pop(field, None)
+        if content is not None:
+            payload['relevantContent'] = self.context_builder.build(content, user_input)['text']
+        return json.dumps(payload, ensure_ascii=False)
+    
+    def ollama_options(self) -> Dict[str, Any]:
+        """Opciones de modelo comunes a todas las llamadas (mismo num_ctx = caché reutilizable)"""
+        return {'num_ctx': self.num_ctx} if self.num_ctx else {}
+    
+    async def summarize_turns(self, previous_summary: str, transcript: str) -> str:
+        """Resume turnos antiguos de la conversación con el propio modelo"""
+        prompt = f"""Resume en menos de 150 palabras los hechos y datos importantes de esta conversación,
+incluyendo URLs consultadas y conclusiones. Integra el resumen previo si existe.
+
+Resumen previo:
+{previous_summary or '(ninguno)'}
+
+Conversación:
+{transcript}
+"""
+        started = time.monotonic()
+        with TRACING.span("ollama chat", **{"gen_ai.system": "ollama", "gen_ai.request.model": self.model}):
+            response = await self.ollama_client.chat(model=self.model, messages=[{'role': 'user', 'content': prompt}],
+                                                     options=self.ollama_options(), keep_alive=self.keep_alive)
+        self.record_ollama_metrics('summarize', time.monotonic() - started, response)
+        return response['message']['content'].strip()
     
     async def analyze_user_request(self, user_input: str) -> bool:
         """Analiza si la solicitud del usuario requiere herramientas MCP"""
@@ -356,7 +3063,6 @@ Por favor analiza este resultado y proporciona una respuesta útil al usuario so
         logger.info(f"🔍 Analizando solicitud para MCP: {user_input[:100]}...")
         
         # Extraer URL de la solicitud
-        import re
         url_pattern = r'https?://[^\s]+'
         urls = re.findall(url_pattern, user_input)
         
@@ -371,8 +3077,9 @@ Por favor analiza este resultado y proporciona una respuesta útil al usuario so
             logger.info(f"🔗 URLs encontradas: {urls}")
         
         if not urls:
-            logger.warning("⚠️ No se encontraron URLs en la solicitud")
-            return "No se encontró URL para crawlear en la solicitud."
+            logger.warning("⚠️ No se encontraron URLs en la solicitud, buscando en el corpus local")
+            local_result = await self.search_local_corpus(user_input)
+            return local_result or "No se encontró URL para crawlear en la solicitud."
         
         url = urls[0]  # Usar la primera URL encontrada
         logger.info(f"🎯 Usando URL: {url}")
@@ -382,14 +3089,11 @@ Por favor analiza este resultado y proporciona una respuesta útil al usuario so
             logger.info("🕷️ Ejecutando bs.ingest_url...")
             result = await self.mcp_executor.execute_tool("bs.ingest_url", {
                 "url": url,
-                "rules": {
-                    "extractMarkdown": True,
-                    "wordThreshold": 50,
-                    "respectRobots": True
-                }
+                "rules": DEFAULT_INGEST_RULES,
+                "contentMode": CONTENT_MODE
             })
             
-            logger.debug(f"📋 Resultado MCP completo: {json.dumps(result, indent=2)}")
+            logger.debug("📋 Resultado MCP completo: %s", LazyJSON(result, indent=2))
             
             if result and result.get("error"):
                 error_msg = result["error"].get("message", "Error desconocido")
@@ -435,7 +3139,13 @@ El contenido se ha extraído y guardado correctamente."""
    • Metadatos: {parsed_result['files'].get('metadataFile', 'N/A')}
    • Directorio: {parsed_result['files'].get('outputDirectory', '.data/crawled/')}"""
                             
-                            full_content = parsed_result.get('fullContent', parsed_result.get('contentPreview', 'No content'))
+                            change_info = describe_changes(parsed_result)
+                            if change_info:
+                                change_info = f"\n   • Cambios: {change_info}"
+                            
+                            full_content = payload_content(parsed_result, self.artifact_index) or parsed_result.get('contentPreview', 'No content')
+                            context = self.context_builder.build(full_content, user_input)
+                            logger.info(f"🧩 Contexto: {context['selected']}/{context['total']} fragmentos, ~{context['tokens']} tokens")
                             
                             return f"""✅ Crawling completado exitosamente para {url}
 
@@ -444,10 +3154,10 @@ El contenido se ha extraído y guardado correctamente."""
    • Título: {parsed_result.get('title', 'N/A')}
    • Tamaño: {parsed_result.get('contentSize', 0):,} bytes
    • Estado: {parsed_result.get('status', 'completed')}
-   • Timestamp: {parsed_result.get('timestamp', 'N/A')}{files_info}
+   • Timestamp: {parsed_result.get('timestamp', 'N/A')}{change_info}{files_info}
 
-📄 Contenido extraído:
-{full_content[:1000]}{'...' if len(full_content) > 1000 else ''}
+📄 Contenido relevante ({context['selected']} de {context['total']} fragmentos):
+{context['text']}
 
 El sitio web ha sido crawleado exitosamente y la información está disponible."""
                         except json.JSONDecodeError as e:
@@ -523,58 +3233,830 @@ El sitio web ha sido crawleado exitosamente a pesar del timeout en la comunicaci
             return f"Error durante el crawling de {url}: {e}"
 
 
+    async def crawl_urls(self, urls: Iterable[str], concurrency: int = 4,
+                         per_domain_limit: int = 1, domain_delay: float = 1.0,
+                         rules: Dict[str, Any] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Crawlea muchas URLs con bs.ingest_url y emite cada resultado en cuanto termina
+        
+        - concurrency: crawls simultáneos en total
+        - per_domain_limit: crawls simultáneos por dominio
+        - domain_delay: segundos mínimos entre inicios de crawl al mismo dominio
+        """
+        pending_urls = list(dict.fromkeys(url.strip() for url in urls if url.strip()))
+        if not pending_urls:
+            return
+        
+        rules = {**DEFAULT_INGEST_RULES, **(rules or {})}
+        url_queue: asyncio.Queue = asyncio.Queue()
+        for url in pending_urls:
+            url_queue.put_nowait(url)
+        results: asyncio.Queue = asyncio.Queue()
+        throttle = DomainThrottle(per_domain_limit, domain_delay)
+        
+        logger.info(f"🕷️ Crawl batch de {len(pending_urls)} URLs (concurrencia={concurrency}, por dominio={per_domain_limit})")
+        
+        async def crawl_one(url: str) -> Dict[str, Any]:
+            async with throttle.slot(url):
+                started = time.monotonic()
+                try:
+                    response = await self.mcp_executor.execute_tool("bs.ingest_url", {
+                        "url": url, "rules": rules, "contentMode": CONTENT_MODE
+                    })
+                except Exception as e:
+                    logger.error(f"❌ Error crawleando {url}: {e}")
+                    response = {"error": {"code": -1, "message": str(e)}}
+            return self._summarize_ingest(url, response, time.monotonic() - started)
+        
+        async def worker():
+            while True:
+                try:
+                    url = url_queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                await results.put(await crawl_one(url))
+        
+        # iterate_results termina cuando acaban los workers y propaga sus errores (no se queda esperando)
+        workers = [asyncio.create_task(worker()) for _ in range(max(1, min(concurrency, len(pending_urls))))]
+        async with contextlib.aclosing(iterate_results(workers, results)) as stream:
+            async for result in stream:
+                yield result
+    
+    async def crawl_site(self, seeds: Iterable[str], max_depth: int = 2, max_pages: int = 100,
+                         concurrency: int = 4, per_domain_limit: int = 2, domain_delay: float = 0.5,
+                         use_sitemap: bool = True, same_site: bool = True) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Crawl recursivo con bs.advanced_crawl: sigue los enlaces de cada página crawleada
+        
+        - Frontera con deduplicación y límites de profundidad y páginas (CrawlFrontier)
+        - Siembra con los sitemaps del sitio (profundidad 1) y respeta robots.txt
+        - same_site: solo enlaces a los hosts de las semillas
+        - concurrency / per_domain_limit / domain_delay: como en crawl_urls
+        """
+        seeds = list(dict.fromkeys(seed.strip() for seed in seeds if seed.strip()))
+        if not seeds:
+            return
+        
+        frontier = CrawlFrontier(max_depth, max_pages,
+                                 [urlparse(seed).hostname or '' for seed in seeds] if same_site else None)
+        # robots.txt se respeta siempre; use_sitemap solo decide si se siembra con los sitemaps
+        for seed in seeds:
+            hints = await asyncio.to_thread(discover_site, seed, max_pages, use_sitemap=use_sitemap)
+            if hints["robots"]:
+                frontier.set_robots(urlparse(seed).hostname or '', hints["robots"])
+            if hints["sitemap"]:
+                logger.info(f"🗺️ Sitemap de {urlparse(seed).hostname}: {len(hints['sitemap'])} URLs")
+            frontier.add(seed, 0)
+            for url in hints["sitemap"]:
+                frontier.add(url, 1)
+        
+        throttle = DomainThrottle(per_domain_limit, domain_delay)
+        results: asyncio.Queue = asyncio.Queue()
+        changed = asyncio.Event()
+        active = 0
+        logger.info(f"🕸️ Crawl de sitio desde {len(seeds)} semillas (profundidad={max_depth}, páginas={max_pages})")
+        
+        async def crawl_page(url: str, depth: int) -> Dict[str, Any]:
+            async with throttle.slot(url):
+                started = time.monotonic()
+                try:
+                    response = await self.mcp_executor.execute_tool("bs.advanced_crawl", {
+                        "url": url, "extractMarkdown": True, "contentMode": CONTENT_MODE
+                    })
+                except Exception as e:
+                    logger.error(f"❌ Error crawleando {url}: {e}")
+                    response = {"error": {"code": -1, "message": str(e)}}
+            summary = self._summarize_ingest(url, response, time.monotonic() - started)
+            summary["depth"] = depth
+            
+            payload = parse_tool_payload(response) if not response.get("error") else None
+            content = payload_content(payload, self.artifact_index) if payload else None
+            if content and depth < max_depth:
+                links = frontier.extract_links(content, url)
+                summary["linksFound"] = len(links)
+                summary["linksQueued"] = sum(frontier.add(link, depth + 1) for link in links)
+            return summary
+        
+        async def worker():
+            nonlocal active
+            while True:
+                item = frontier.pop()
+                if item is None:
+                    if not active:
+                        changed.set()  # Despierta a los demás para que también terminen
+                        return
+                    changed.clear()
+                    await changed.wait()
+                    continue
+                active += 1
+                try:
+                    await results.put(await crawl_page(*item))
+                finally:
+                    active -= 1
+                    changed.set()
+        
+        workers = [asyncio.create_task(worker()) for _ in range(max(1, concurrency))]
+        # aclosing: si el consumidor deja de iterar, los workers se cancelan en el acto
+        async with contextlib.aclosing(iterate_results(workers, results)) as stream:
+            async for result in stream:
+                yield result
+    
+    def _summarize_ingest(self, url: str, response: Dict[str, Any], elapsed: float) -> Dict[str, Any]:
+        """Resume la respuesta de bs.ingest_url en un registro compacto"""
+        summary = {"url": url, "status": "error", "elapsed_s": round(elapsed, 3)}
+        if response.get("error"):
+            error = response["error"]
+            summary["error"] = error.get("message", "Error desconocido") if isinstance(error, dict) else str(error)
+            return summary
+        
+        payload = parse_tool_payload(response)
+        if payload is None:
+            summary["error"] = "Respuesta MCP sin contenido JSON"
+        elif payload.get("error"):
+            summary["error"] = payload["error"]
+        else:
+            files = payload.get("files") if isinstance(payload.get("files"), dict) else {}
+            summary.update({
+                "status": payload.get("status", "completed"),
+                "title": payload.get("title"),
+                "contentSize": payload.get("contentSize", 0),
+                "contentFile": files.get("contentFile")
+            })
+            if "changed" in payload:
+                summary["changed"] = payload["changed"]
+            if isinstance(payload.get("changes"), dict):
+                summary["changes"] = {key: payload["changes"].get(key)
+                                      for key in ("addedChunks", "removedChunks", "changedSections")}
+        return summary
+
     def check_crawled_files_for_url(self, url: str) -> dict:
         """Verifica si se generaron archivos de crawling para una URL específica"""
-        import os
-        import glob
-        from urllib.parse import urlparse
-        
         try:
-            # Extraer dominio de la URL
-            domain = urlparse(url).hostname.replace('.', '_')
-            
-            # Buscar archivos recientes para este dominio
-            crawled_dir = ".data/crawled"
-            if not os.path.exists(crawled_dir):
+            # Crawls recientes (últimos 5 minutos para dar más margen)
+            artifact = self.artifact_index.latest(url, max_age=300)
+            if not artifact:
+                logger.debug(f"No se encontraron archivos recientes para {url}")
                 return None
             
-            # Buscar archivos de contenido recientes (últimos 5 minutos para dar más margen)
-            import time
-            current_time = time.time()
-            
-            content_files = glob.glob(f"{crawled_dir}/{domain}_*_content.md")
-            logger.debug(f"Archivos encontrados para {domain}: {content_files}")
-            
-            for content_file in content_files:
-                file_time = os.path.getmtime(content_file)
-                time_diff = current_time - file_time
-                logger.debug(f"Archivo: {content_file}, tiempo: {time_diff} segundos")
-                
-                if time_diff < 300:  # 5 minutos
-                    # Archivo reciente encontrado
-                    metadata_file = content_file.replace('_content.md', '_metadata.json')
-                    
-                    file_size = os.path.getsize(content_file)
-                    timestamp = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(file_time))
-                    
-                    logger.info(f"✅ Archivo de crawling encontrado: {content_file} ({file_size} bytes)")
-                    
-                    return {
-                        'content_file': content_file,
-                        'metadata_file': metadata_file if os.path.exists(metadata_file) else None,
-                        'file_size': file_size,
-                        'timestamp': timestamp,
-                        'domain': domain
-                    }
+            content_file = artifact['content_path']
+            metadata_file = artifact['metadata_path']
+            file_size = artifact['size'] if artifact['size'] is not None else os.path.getsize(content_file)
+            logger.info(f"✅ Archivo de crawling encontrado: {content_file} ({file_size} bytes)")
             
-            logger.debug(f"No se encontraron archivos recientes para {domain}")
-            return None
+            return {
+                'content_file': content_file,
+                'metadata_file': metadata_file if metadata_file and os.path.exists(metadata_file) else None,
+                'file_size': file_size,
+                'timestamp': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(artifact['crawled_at'])),
+                'domain': artifact['domain'].replace('.', '_')
+            }
             
         except Exception as e:
             logger.debug(f"Error verificando archivos: {e}")
             return None
 
-async def start_brainslot_system():
+class CrawlJobWorker:
+    """
+    Procesa la CrawlJobQueue con el executor MCP de una sesión
+    
+    Hasta concurrency trabajos a la vez con cortesía por dominio. Una tarea renueva los
+    leases de este proceso cada tercio de lease_seconds; al parar, los trabajos en curso
+    vuelven a la cola sin gastar intento. Las llamadas a la cola (SQLite, que puede esperar
+    al lock de otro proceso) se hacen en un hilo para no bloquear el bucle de eventos.
+    """
+    def __init__(self, session: 'OllamaMCPSession', queue: CrawlJobQueue, concurrency: int = 4,
+                 per_domain_limit: int = 1, domain_delay: float = 1.0, poll_interval: float = 1.0):
+        self.session = session
+        self.queue = queue
+        self.concurrency = max(1, concurrency)
+        self.throttle = DomainThrottle(per_domain_limit, domain_delay)
+        self.poll_interval = poll_interval
+    
+    async def run(self, until_empty: bool = False) -> AsyncIterator[Dict[str, Any]]:
+        """Emite el resumen de cada trabajo terminado; con until_empty para cuando no queda ninguno"""
+        # Cada ejecución tiene su propio owner: sus leases no se confunden con los de otra
+        owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        results: asyncio.Queue = asyncio.Queue()
+        
+        async def worker():
+            while True:
+                jobs = await asyncio.to_thread(self.queue.lease, owner)
+                if not jobs:
+                    if until_empty and not await asyncio.to_thread(self.queue.pending):
+                        return
+                    await asyncio.sleep(self.poll_interval)
+                    continue
+                await results.put(await self._process(jobs[0], owner))
+        
+        async def renew_leases():
+            while True:
+                await asyncio.sleep(self.queue.lease_seconds / 3)
+                try:
+                    await asyncio.to_thread(self.queue.renew, owner)
+                except sqlite3.Error as e:
+                    # Se reintenta en la siguiente ronda, antes de que caduque el lease
+                    logger.warning(f"⚠️ No se pudieron renovar los leases: {e}")
+        
+        renewer = asyncio.create_task(renew_leases())
+        try:
+            workers = [asyncio.create_task(worker()) for _ in range(self.concurrency)]
+            async with contextlib.aclosing(iterate_results(workers, results)) as stream:
+                async for result in stream:
+                    yield result
+        finally:
+            renewer.cancel()
+            await asyncio.gather(renewer, return_exceptions=True)
+            # En un hilo como el resto de la cola; si nos vuelven a cancelar, el hilo termina la liberación igualmente
+            released = await asyncio.to_thread(self.queue.release, owner)
+            if released:
+                logger.info(f"↩️ {released} trabajos en curso devueltos a la cola")
+    
+    async def _process(self, job: Dict[str, Any], owner: str) -> Dict[str, Any]:
+        started = time.monotonic()
+        async with self.throttle.slot(job["url"]):
+            try:
+                response = await self.session.mcp_executor.execute_tool(job["tool"], job["arguments"])
+            except Exception as e:
+                logger.error(f"❌ Error en el trabajo {job['id']} ({job['url']}): {e}")
+                response = {"error": {"code": -1, "message": str(e)}}
+        summary = self.session._summarize_ingest(job["url"], response, time.monotonic() - started)
+        summary.update(jobId=job["id"], attempt=job["attempts"])
+        
+        if summary["status"] != "error":
+            await asyncio.to_thread(self.queue.complete, job["id"], owner, summary)
+        else:
+            # Los fallos de transporte (timeout, servidor caído) se reintentan; los del sitio no
+            summary["jobStatus"] = await asyncio.to_thread(self.queue.fail, job["id"], owner, summary["error"],
+                                                           retryable=bool(response.get("error")))
+        return summary
+
+class CorpusAnalyzer:
+    """
+    Análisis offline del corpus crawleado con Ollama: resúmenes o extracción estructurada
+    
+    Cadena acotada de etapas: artefactos (sueltos o empaquetados) → cola de páginas →
+    workers que trocean cada página y lanzan sus prompts con como mucho concurrency
+    llamadas a Ollama a la vez → cola de resultados. Las colas tienen tamaño máximo: leer
+    el corpus nunca se adelanta más de unas pocas páginas a la inferencia.
+    
+    Cada página se identifica por tarea, modelo, URL y sha256 de su contenido. El fichero de
+    salida JSONL hace de checkpoint: al reanudar se omiten las páginas ya completadas, y
+    un re-crawl sin cambios tampoco se vuelve a analizar.
+    """
+    PROMPTS = {
+        "summary": (
+            "Resume en menos de 120 palabras este fragmento de una página web, conservando los datos "
+            "concretos (nombres, cifras, fechas, precios):\n\n{text}"
+        ),
+        "summary_combine": (
+            "Combina estos resúmenes parciales de {url} en un único resumen de menos de 200 palabras, "
+            "sin repetir información:\n\n{text}"
+        ),
+        "extract": (
+            "Extrae de este fragmento de una página web un objeto JSON con las claves \"organizaciones\", "
+            "\"personas\", \"eventos\", \"precios\" y \"contacto\", cada una con una lista de cadenas (vacía si "
+            "no aparece nada). Responde solo con el JSON.\n\n{text}"
+        )
+    }
+    # Los prompts por fragmento no llevan la URL: un fragmento repetido en muchas páginas
+    # (menús, pies) tiene la misma clave en la caché de respuestas y se genera una vez
+    EXTRACT_FIELDS = ("organizaciones", "personas", "eventos", "precios", "contacto")
+    
+    def __init__(self, session: 'OllamaMCPSession', task: str = "summary", concurrency: int = 2,
+                 part_chars: int = 6000, max_parts: int = 8):
+        if task not in ("summary", "extract"):
+            raise ValueError(f"Tarea de análisis desconocida: {task}")
+        self.session = session
+        self.task = task
+        self.concurrency = max(1, concurrency)
+        self.part_chars = part_chars
+        self.max_parts = max_parts
+        self.splitter = ContextBuilder(chunk_chars=part_chars)
+        self.inference = asyncio.Semaphore(self.concurrency)
+    
+    def record_key(self, url: str, content: str) -> str:
+        return LLMResponseCache.make_key(task=self.task, model=self.session.model, url=normalize_url(url),
+                                         content=hashlib.sha256(content.encode()).hexdigest())
+    
+    @staticmethod
+    def completed_keys(output_path: str) -> set:
+        """Claves ya completadas en la salida; recorta una última línea a medio escribir"""
+        if not os.path.exists(output_path):
+            return set()
+        with open(output_path, 'rb+') as output:
+            data = output.read()
+            complete = data.rfind(b'\n') + 1
+            if complete < len(data):
+                output.truncate(complete)
+        keys = set()
+        for line in data[:complete].splitlines():
+            with contextlib.suppress(json.JSONDecodeError):
+                result = json.loads(line)
+                if result.get("status") == "completed":
+                    keys.add(result["key"])
+        return keys
+    
+    def parts(self, content: str) -> List[str]:
+        """Fragmentos de hasta part_chars (agrupando secciones cortas), como mucho max_parts"""
+        parts = []
+        for chunk in self.splitter.split(content):
+            if parts and len(parts[-1]) + len(chunk) + 2 <= self.part_chars:
+                parts[-1] = f"{parts[-1]}\n\n{chunk}"
+            else:
+                parts.append(chunk)
+        return parts
+    
+    async def _generate(self, prompt: str, json_format: bool = False) -> str:
+        options = self.session.ollama_options()
+        extra = {'format': 'json'} if json_format else {}
+        
+        async def generate() -> Dict[str, Any]:
+            async with self.inference:
+                started = time.monotonic()
+                with TRACING.span("ollama chat", **{"gen_ai.system": "ollama", "gen_ai.request.model": self.session.model}):
+                    response = await self.session.ollama_client.chat(
+                        model=self.session.model, messages=[{'role': 'user', 'content': prompt}],
+                        options=options, keep_alive=self.session.keep_alive, **extra
+                    )
+                self.session.record_ollama_metrics('analyze', time.monotonic() - started, response)
+                return {'content': response['message']['content'].strip()}
+        
+        # Fragmentos idénticos entre páginas (menús, pies) se generan una sola vez
+        cache = self.session.response_cache
+        if cache is None:
+            return (await generate())['content']
+        key = LLMResponseCache.make_key(model=self.session.model, options=options, task=self.task,
+                                        json_format=json_format, prompt=prompt)
+        return (await cache.get_or_generate(key, generate))[0]['content']
+    
+    def _merge_extractions(self, outputs: List[str]) -> Dict[str, List[str]]:
+        merged = {field: [] for field in self.EXTRACT_FIELDS}
+        for output in outputs:
+            try:
+                data = json.loads(output)
+            except json.JSONDecodeError:
+                logger.debug(f"Extracción no JSON descartada: {output[:200]}")
+                continue
+            if not isinstance(data, dict):
+                continue
+            for field in self.EXTRACT_FIELDS:
+                values = data.get(field) or []
+                for value in values if isinstance(values, list) else [values]:
+                    value = str(value).strip()
+                    if value and value not in merged[field]:
+                        merged[field].append(value)
+        return merged
+    
+    async def analyze(self, record: Dict[str, Any]) -> Dict[str, Any]:
+        """Analiza una página: un prompt por fragmento (en paralelo) y, si hay varios, su combinación"""
+        started = time.monotonic()
+        parts = self.parts(record["content"])
+        result = {
+            "key": record["key"], "url": record["url"], "title": record.get("title"),
+            "contentPath": record["content_path"], "crawledAt": record["crawled_at"],
+            "task": self.task, "model": self.session.model,
+            "parts": min(len(parts), self.max_parts), "truncated": len(parts) > self.max_parts
+        }
+        parts = parts[:self.max_parts]
+        try:
+            outputs = await asyncio.gather(*[
+                self._generate(self.PROMPTS[self.task].format(text=part),
+                               json_format=self.task == "extract")
+                for part in parts
+            ])
+            if self.task == "extract":
+                result["data"] = self._merge_extractions(outputs)
+            elif len(outputs) > 1:
+                result["summary"] = await self._generate(
+                    self.PROMPTS["summary_combine"].format(url=record["url"], text="\n\n".join(outputs))
+                )
+            else:
+                result["summary"] = outputs[0] if outputs else ""
+            result["status"] = "completed"
+        except Exception as e:
+            logger.error(f"❌ Error analizando {record['url']}: {e}")
+            result.update(status="error", error=str(e))
+        result["elapsed_s"] = round(time.monotonic() - started, 2)
+        return result
+    
+    async def records(self, skip: set = frozenset(), limit: int = None) -> AsyncIterator[Dict[str, Any]]:
+        """Páginas del corpus (última versión de cada URL) que faltan por analizar"""
+        emitted = 0
+        for record in self.session.artifact_index.iter_contents():
+            if limit is not None and emitted >= limit:
+                return
+            record["key"] = self.record_key(record["url"], record["content"])
+            if record["key"] in skip or not record["content"].strip():
+                continue
+            emitted += 1
+            yield record
+            await asyncio.sleep(0)  # Lecturas síncronas: ceder el bucle entre páginas
+    
+    async def run(self, skip: set = frozenset(), limit: int = None) -> AsyncIterator[Dict[str, Any]]:
+        """Emite el resultado de cada página en cuanto termina"""
+        pages: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        results: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        
+        async def produce():
+            async with contextlib.aclosing(self.records(skip, limit)) as source:
+                async for record in source:
+                    await pages.put(record)
+            for _ in range(self.concurrency):
+                await pages.put(None)
+        
+        async def worker():
+            while (record := await pages.get()) is not None:
+                await results.put(await self.analyze(record))
+        
+        workers = [asyncio.create_task(produce()), *(asyncio.create_task(worker()) for _ in range(self.concurrency))]
+        async with contextlib.aclosing(iterate_results(workers, results)) as stream:
+            async for result in stream:
+                yield result
+
+class BrainSlotServer:
+    """
+    Modo servidor: HTTP sobre asyncio para muchas conversaciones y crawls a la vez
+    
+    Todas las conversaciones comparten el executor MCP (o el pool) de la sesión base y
+    cada una tiene su propia memoria. Las respuestas se emiten en streaming como NDJSON
+    (un evento JSON por línea, chunked) y cada evento espera a que el cliente lo consuma,
+    de modo que un cliente lento frena su propio stream de Ollama y no acumula memoria.
+    
+    - POST /chat {"message": "...", "session": "id opcional"} → session, tool_call, token..., done
+    - POST /crawl {"urls": [...], "concurrency": 4} → un evento result por URL y done
+    - DELETE /sessions/<id> olvida una conversación
+    - POST /jobs {"urls": [...], "priority": 0} encola crawls en la CrawlJobQueue (se procesan en segundo plano)
+    - GET /jobs (recuento por estado), GET /jobs/<id>, DELETE /jobs/<id> (cancela si no ha empezado)
+    - GET /health (incluye el estado del procesador de la cola, que se relanza si se cae)
+    
+    Admisión: como mucho max_active turnos/crawls en curso y queue_size esperando; el resto
+    recibe 503 con Retry-After. Cada conversación atiende un turno a la vez (409 si no).
+    Las conexiones abiertas están limitadas a MAX_CONNECTIONS y la petición (línea, cabeceras
+    y cuerpo) debe llegar en READ_TIMEOUT segundos (408 si no). Si el cliente cierra la conexión
+    durante un turno o un crawl, el trabajo se cancela aunque no se esté escribiendo nada.
+    """
+    MAX_BODY_BYTES = 1024 * 1024
+    MAX_CONNECTIONS = 512
+    READ_TIMEOUT = 15.0
+    WRITE_BUFFER_BYTES = 16 * 1024
+    STATUS_TEXT = {200: "OK", 400: "Bad Request", 404: "Not Found", 408: "Request Timeout", 409: "Conflict",
+                   413: "Payload Too Large", 503: "Service Unavailable"}
+    
+    def __init__(self, session: OllamaMCPSession, host: str = "127.0.0.1", port: int = 8765,
+                 max_active: int = 8, queue_size: int = 32, max_sessions: int = 256,
+                 session_ttl: float = 1800.0, max_crawl_urls: int = 1000, max_crawl_concurrency: int = 8,
+                 jobs: CrawlJobQueue = None, job_concurrency: int = 4):
+        self.session = session
+        self.jobs = jobs
+        self.job_concurrency = job_concurrency
+        self.host = host
+        self.port = port
+        self.queue_size = queue_size
+        self.max_sessions = max_sessions
+        self.session_ttl = session_ttl
+        self.max_crawl_urls = max_crawl_urls
+        self.max_crawl_concurrency = max_crawl_concurrency
+        self.slots = asyncio.Semaphore(max_active)
+        self.waiting = 0
+        self.connections = 0
+        self.job_worker = {"state": "stopped", "restarts": 0, "lastError": None}
+        # id → {"id", "session", "lock", "last_used"}, de la menos a la más reciente
+        self.conversations: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.server: Optional[asyncio.AbstractServer] = None
+    
+    async def serve_forever(self):
+        """Arranca MCP y atiende peticiones hasta que se cancele"""
+        if not await self.session.start_mcp():
+            return
+        self.server = await asyncio.start_server(self.handle, self.host, self.port)
+        logger.info(f"🌐 Servidor BrainSlot en http://{self.host}:{self.port} (/chat, /crawl, /jobs, /health)")
+        job_task = asyncio.create_task(self._run_jobs()) if self.jobs else None
+        try:
+            async with self.server:
+                await self.server.serve_forever()
+        finally:
+            if job_task:
+                job_task.cancel()
+                await asyncio.gather(job_task, return_exceptions=True)
+            await self.session.mcp_executor.stop()
+    
+    async def _run_jobs(self):
+        """Procesa la cola en segundo plano; si el worker cae, lo registra y lo relanza con backoff"""
+        failures = 0
+        try:
+            while True:
+                self.job_worker["state"] = "running"
+                started = time.monotonic()
+                try:
+                    worker = CrawlJobWorker(self.session, self.jobs, self.job_concurrency)
+                    async for result in worker.run():
+                        logger.info(f"📦 Trabajo {result['jobId']} {result['url']}: "
+                                    f"{result.get('jobStatus', result['status'])}")
+                    self.job_worker["lastError"] = "El procesador de la cola terminó sin error"
+                except Exception as e:
+                    logger.error(f"❌ El procesador de la cola se ha detenido: {e}", exc_info=True)
+                    self.job_worker["lastError"] = str(e) or type(e).__name__
+                # Un worker que llevaba un rato funcionando reinicia el backoff
+                failures = 0 if time.monotonic() - started > 60 else failures + 1
+                self.job_worker["state"] = "restarting"
+                self.job_worker["restarts"] += 1
+                METRICS.inc('server_job_worker_restarts_total', 1, "Reinicios del procesador de la cola")
+                await asyncio.sleep(backoff_delay(failures, base=1.0, cap=60.0))
+        finally:
+            self.job_worker["state"] = "stopped"
+    
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        if self.connections >= self.MAX_CONNECTIONS:
+            METRICS.inc('server_rejected_total', 1, "Peticiones rechazadas por cola llena")
+            writer.write(b"HTTP/1.1 503 Service Unavailable\r\nRetry-After: 5\r\n"
+                         b"Content-Length: 0\r\nConnection: close\r\n\r\n")
+            writer.close()
+            return
+        self.connections += 1
+        status, route = 400, "invalid"
+        try:
+            request = await self._read_request(reader)
+            if isinstance(request, int):
+                status = await self._send_json(writer, request, {"error": self.STATUS_TEXT[request]})
+                return
+            method, path, body = request
+            route = next((prefix for prefix in ("/sessions/", "/jobs/") if path.startswith(prefix)), path)
+            route = route if route in ("/chat", "/crawl", "/health", "/jobs", "/sessions/", "/jobs/") else "other"
+            if method == "POST" and path == "/chat":
+                status = await self.chat(reader, writer, body)
+            elif method == "POST" and path == "/crawl":
+                status = await self.crawl(reader, writer, body)
+            elif method == "GET" and path == "/health":
+                status = await self._send_json(writer, 200, await self.health())
+            elif method == "DELETE" and route == "/sessions/":
+                found = self.conversations.pop(path[len("/sessions/"):], None) is not None
+                status = await self._send_json(writer, 200 if found else 404, {"deleted": found})
+            elif self.jobs and route in ("/jobs", "/jobs/"):
+                status = await self.job_request(writer, method, path, body)
+            else:
+                status = await self._send_json(writer, 404, {"error": self.STATUS_TEXT[404]})
+        except (ConnectionError, asyncio.IncompleteReadError):
+            status = 499  # Cliente desconectado; la tarea en curso se cancela con la excepción
+        except Exception as e:
+            status = 500
+            logger.error(f"❌ Error atendiendo petición HTTP: {e}", exc_info=True)
+        finally:
+            self.connections -= 1
+            METRICS.inc('server_requests_total', 1, "Peticiones HTTP del modo servidor",
+                        route=route, status=status)
+            writer.close()
+    
+    async def _read_request(self, reader: asyncio.StreamReader):
+        """(método, ruta, cuerpo JSON) o el código de error HTTP"""
+        try:
+            parts, headers = await asyncio.wait_for(self._read_head(reader), self.READ_TIMEOUT)
+            length = int(headers.get('content-length') or 0)
+        except ValueError:
+            return 400  # Línea demasiado larga o Content-Length inválido
+        except asyncio.TimeoutError:
+            return 408
+        if len(parts) < 2:
+            return 400
+        if length > self.MAX_BODY_BYTES:
+            return 413
+        
+        body = {}
+        if length:
+            try:
+                body = json.loads(await asyncio.wait_for(reader.readexactly(length), self.READ_TIMEOUT))
+            except json.JSONDecodeError:
+                return 400
+            except asyncio.TimeoutError:
+                return 408
+        if not isinstance(body, dict):
+            return 400
+        return parts[0].upper(), parts[1].split('?')[0], body
+    
+    @staticmethod
+    async def _read_head(reader: asyncio.StreamReader) -> tuple:
+        parts = (await reader.readline()).decode('latin-1').split()
+        headers = {}
+        while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        return parts, headers
+    
+    @staticmethod
+    async def _until_disconnected(reader: asyncio.StreamReader):
+        """Termina cuando el cliente cierra la conexión; lo que envíe tras la petición se descarta"""
+        try:
+            while not reader.at_eof():
+                await reader.read(4096)
+        except ConnectionError:
+            pass
+    
+    async def _unless_disconnected(self, reader: asyncio.StreamReader, coro):
+        """
+        Ejecuta coro vigilando la conexión: si el cliente se va, lo cancela y lanza ConnectionResetError
+        
+        Sin esto la desconexión solo se detecta al escribir el siguiente evento, y en la fase de
+        herramientas o entre resultados de un crawl pueden pasar minutos sin escribir nada.
+        """
+        work = asyncio.ensure_future(coro)
+        watcher = asyncio.ensure_future(self._until_disconnected(reader))
+        try:
+            await asyncio.wait({work, watcher}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            watcher.cancel()
+            if not work.done():
+                work.cancel()
+                await asyncio.gather(work, return_exceptions=True)
+        if work.cancelled():
+            raise ConnectionResetError("Cliente desconectado")
+        return work.result()
+    
+    async def _send_json(self, writer: asyncio.StreamWriter, status: int, payload: Dict[str, Any],
+                         headers: Dict[str, str] = None) -> int:
+        body = json.dumps(payload, ensure_ascii=False).encode()
+        extra = "".join(f"{name}: {value}\r\n" for name, value in (headers or {}).items())
+        writer.write(f"HTTP/1.1 {status} {self.STATUS_TEXT.get(status, '')}\r\n"
+                     f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n{extra}"
+                     f"Connection: close\r\n\r\n".encode() + body)
+        await writer.drain()
+        return status
+    
+    async def _start_stream(self, writer: asyncio.StreamWriter):
+        # Búfer pequeño: drain() bloquea pronto si el cliente no lee
+        writer.transport.set_write_buffer_limits(high=self.WRITE_BUFFER_BYTES)
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson\r\nCache-Control: no-cache\r\n"
+                     b"Transfer-Encoding: chunked\r\nConnection: close\r\n\r\n")
+    
+    @staticmethod
+    async def _send_event(writer: asyncio.StreamWriter, event: Dict[str, Any]):
+        data = json.dumps(event, ensure_ascii=False).encode() + b"\n"
+        writer.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        await writer.drain()
+    
+    @staticmethod
+    async def _end_stream(writer: asyncio.StreamWriter):
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+    
+    async def _acquire(self) -> bool:
+        """Reserva un hueco de ejecución esperando en la cola; False si la cola está llena"""
+        if self.slots.locked() and self.waiting >= self.queue_size:
+            METRICS.inc('server_rejected_total', 1, "Peticiones rechazadas por cola llena")
+            return False
+        self.waiting += 1
+        try:
+            await self.slots.acquire()
+        finally:
+            self.waiting -= 1
+        return True
+    
+    async def _reject_busy(self, writer: asyncio.StreamWriter) -> int:
+        return await self._send_json(writer, 503, {"error": "Servidor ocupado, reintenta más tarde"},
+                                     {"Retry-After": "5"})
+    
+    def _conversation(self, conversation_id: Optional[str]) -> Dict[str, Any]:
+        """Conversación existente o nueva; expulsa las inactivas y, si sobran, las menos recientes"""
+        now = time.monotonic()
+        for key, conversation in list(self.conversations.items()):
+            if now - conversation["last_used"] > self.session_ttl and not conversation["lock"].locked():
+                del self.conversations[key]
+        
+        conversation = self.conversations.get(conversation_id) if conversation_id else None
+        if conversation is None:
+            conversation_id = conversation_id or uuid.uuid4().hex
+            conversation = self.conversations[conversation_id] = {
+                "id": conversation_id, "session": self.session.conversation(),
+                "lock": asyncio.Lock(), "last_used": now
+            }
+            idle = [key for key, c in self.conversations.items() if not c["lock"].locked() and key != conversation_id]
+            for key in idle[:max(0, len(self.conversations) - self.max_sessions)]:
+                del self.conversations[key]
+        self.conversations.move_to_end(conversation_id)
+        conversation["last_used"] = now
+        return conversation
+    
+    async def chat(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, body: Dict[str, Any]) -> int:
+        message = str(body.get("message") or "").strip()
+        conversation_id = body.get("session")
+        if not message or (conversation_id is not None and (not isinstance(conversation_id, str)
+                                                            or not 0 < len(conversation_id) <= 128)):
+            return await self._send_json(writer, 400, {"error": "Se requiere 'message' (y 'session' válido si se indica)"})
+        
+        conversation = self._conversation(conversation_id)
+        if conversation["lock"].locked():
+            return await self._send_json(writer, 409, {"error": "La conversación ya tiene un turno en curso"})
+        
+        async with conversation["lock"]:
+            if not await self._acquire():
+                return await self._reject_busy(writer)
+            session = conversation["session"]
+            METRICS.gauge_add('server_active_turns', 1, "Turnos y crawls en curso en el modo servidor")
+            try:
+                await self._start_stream(writer)
+                session.emit = lambda event: self._send_event(writer, event)
+                await self._send_event(writer, {"event": "session", "id": conversation["id"]})
+                try:
+                    reply = await self._unless_disconnected(reader, session.respond(message))
+                    await self._send_event(writer, {"event": "done", "content": reply})
+                except (ConnectionError, asyncio.CancelledError):
+                    raise
+                except Exception as e:
+                    logger.error(f"❌ Error en turno de la conversación {conversation['id']}: {e}", exc_info=True)
+                    await self._send_event(writer, {"event": "error", "message": str(e)})
+                await self._end_stream(writer)
+                return 200
+            finally:
+                session.emit = None
+                conversation["last_used"] = time.monotonic()
+                METRICS.gauge_add('server_active_turns', -1)
+                self.slots.release()
+    
+    async def crawl(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, body: Dict[str, Any]) -> int:
+        urls = body.get("urls")
+        urls = [urls] if isinstance(urls, str) else urls
+        if not urls or not isinstance(urls, list) or not all(isinstance(url, str) for url in urls):
+            return await self._send_json(writer, 400, {"error": "Se requiere 'urls' (lista de URLs)"})
+        if len(urls) > self.max_crawl_urls:
+            return await self._send_json(writer, 413, {"error": f"Máximo {self.max_crawl_urls} URLs por petición"})
+        try:
+            concurrency = max(1, min(int(body.get("concurrency", 4)), self.max_crawl_concurrency))
+            per_domain = max(1, int(body.get("per_domain", 1)))
+            domain_delay = max(0.0, float(body.get("domain_delay", 1.0)))
+        except (TypeError, ValueError):
+            return await self._send_json(writer, 400, {"error": "Parámetros de crawl inválidos"})
+        rules = body.get("rules") if isinstance(body.get("rules"), dict) else None
+        
+        if not await self._acquire():
+            return await self._reject_busy(writer)
+        METRICS.gauge_add('server_active_turns', 1, "Turnos y crawls en curso en el modo servidor")
+        
+        async def stream_results() -> tuple:
+            completed = failed = 0
+            # Si el cliente se desconecta, cerrar el generador cancela los crawls pendientes
+            async with contextlib.aclosing(self.session.crawl_urls(urls, concurrency, per_domain, domain_delay,
+                                                                   rules)) as results:
+                async for result in results:
+                    if result["status"] == "error":
+                        failed += 1
+                    else:
+                        completed += 1
+                    await self._send_event(writer, {"event": "result", **result})
+            return completed, failed
+        
+        try:
+            await self._start_stream(writer)
+            completed, failed = await self._unless_disconnected(reader, stream_results())
+            await self._send_event(writer, {"event": "done", "completed": completed, "failed": failed})
+            await self._end_stream(writer)
+            return 200
+        finally:
+            METRICS.gauge_add('server_active_turns', -1)
+            self.slots.release()
+    
+    async def job_request(self, writer: asyncio.StreamWriter, method: str, path: str, body: Dict[str, Any]) -> int:
+        if path == "/jobs":
+            if method == "GET":
+                return await self._send_json(writer, 200, await asyncio.to_thread(self.jobs.status))
+            urls = body.get("urls")
+            urls = [urls] if isinstance(urls, str) else urls
+            if method != "POST" or not urls or not isinstance(urls, list) or not all(isinstance(url, str) for url in urls):
+                return await self._send_json(writer, 400, {"error": "Se requiere POST con 'urls' (lista de URLs)"})
+            try:
+                priority = int(body.get("priority", 0))
+            except (TypeError, ValueError):
+                return await self._send_json(writer, 400, {"error": "'priority' debe ser un entero"})
+            rules = body.get("rules") or {}
+            if not isinstance(rules, dict):
+                return await self._send_json(writer, 400, {"error": "'rules' debe ser un objeto"})
+            arguments = {"rules": {**DEFAULT_INGEST_RULES, **rules}, "contentMode": CONTENT_MODE}
+            queued = await asyncio.to_thread(self.jobs.enqueue, urls, priority, arguments=arguments)
+            return await self._send_json(writer, 200, queued)
+        
+        job_id = path[len("/jobs/"):]
+        if not job_id.isdigit():
+            return await self._send_json(writer, 404, {"error": self.STATUS_TEXT[404]})
+        if method == "DELETE":
+            cancelled = await asyncio.to_thread(self.jobs.cancel, int(job_id))
+            return await self._send_json(writer, 200 if cancelled else 409, {"cancelled": cancelled})
+        job = await asyncio.to_thread(self.jobs.get, int(job_id))
+        return await self._send_json(writer, 200 if job else 404, job or {"error": self.STATUS_TEXT[404]})
+    
+    async def health(self) -> Dict[str, Any]:
+        executor = self.session.mcp_executor
+        workers = getattr(executor, 'workers', [executor] if executor else [])
+        alive = sum(1 for worker in workers if worker.is_alive())
+        jobs_ok = not self.jobs or self.job_worker["state"] == "running"
+        return {
+            "status": "ok" if alive and jobs_ok else "degraded",
+            "mcpWorkers": alive,
+            "mcpInFlight": executor.in_flight if executor else 0,
+            "conversations": len(self.conversations),
+            "connections": self.connections,
+            "waiting": self.waiting,
+            **({"jobs": (await asyncio.to_thread(self.jobs.status))["counts"], "jobWorker": self.job_worker}
+               if self.jobs else {})
+        }
+
+async def start_brainslot_system(**session_options):
     """
     Función única para inicializar el sistema BrainSlot MCP
     
@@ -593,12 +4075,315 @@ async def start_brainslot_system():
     print("📁 Archivos de crawling se guardan en: .data/crawled/")
     print()
     
-    session = OllamaMCPSession()
+    session = OllamaMCPSession(**session_options)
     await session.start()
 
+async def start_batch_crawl(urls: List[str], concurrency: int = 4, per_domain_limit: int = 1,
+                            domain_delay: float = 1.0, output_path: str = None, site: Dict[str, Any] = None,
+                            **session_options):
+    """
+    Modo batch no interactivo: crawlea una lista de URLs con bs.ingest_url
+    
+    Con site (opciones de crawl_site) las URLs son raíces de sitios que se crawlean
+    recursivamente con bs.advanced_crawl.
+    
+    Uso:
+    - python brainslot-mcp-system.py https://a.com https://b.com
+    - python brainslot-mcp-system.py --urls-file urls.txt --concurrency 8 --output resultados.jsonl
+    - python brainslot-mcp-system.py --site https://docs.ejemplo.com --max-depth 3 --max-pages 500
+    """
+    if site is None:
+        print(f"🚀 === CRAWL BATCH BRAINSLOT MCP ({len(urls)} URLs) ===")
+    else:
+        print(f"🚀 === CRAWL DE SITIO BRAINSLOT MCP ({len(urls)} raíces, hasta {site.get('max_pages', 100)} páginas) ===")
+    session = OllamaMCPSession(**session_options)
+    output = open(output_path, 'a', encoding='utf-8') if output_path else None
+    completed = failed = unchanged = 0
+    
+    try:
+        if not await session.start_mcp():
+            return
+        
+        if site is None:
+            results = session.crawl_urls(urls, concurrency, per_domain_limit, domain_delay)
+        else:
+            results = session.crawl_site(urls, concurrency=concurrency, per_domain_limit=per_domain_limit,
+                                         domain_delay=domain_delay, **site)
+        async for result in results:
+            depth = f"[{result['depth']}] " if "depth" in result else ""
+            if result["status"] == "error":
+                failed += 1
+                print(f"❌ {depth}{result['url']}: {result.get('error')}")
+            else:
+                completed += 1
+                unchanged += result.get("changed") is False
+                print(format_crawl_result(result))
+            if output:
+                output.write(json.dumps(result, ensure_ascii=False) + '\n')
+                output.flush()
+        
+        print(f"\n📊 Batch terminado: {completed} completadas ({unchanged} sin cambios), {failed} con error")
+    finally:
+        if output:
+            output.close()
+        if session.mcp_executor:
+            await session.mcp_executor.stop()
+
+async def start_corpus_analysis(task: str = "summary", output_path: str = None, concurrency: int = 2,
+                                limit: int = None, **session_options):
+    """
+    Modo batch offline: analiza con Ollama todo lo crawleado, sin servidor MCP
+    
+    Reanudable: volver a lanzar el mismo comando continúa donde se quedó.
+    
+    Uso:
+    - python brainslot-mcp-system.py --analyze summary
+    - python brainslot-mcp-system.py --analyze extract --analyze-output datos.jsonl --analyze-concurrency 4
+    """
+    output_path = output_path or os.path.join(DATA_ROOT, f"analysis-{task}.jsonl")
+    session = OllamaMCPSession(**session_options)
+    if session.ollama_client is None:
+        print("❌ El análisis necesita el paquete ollama (pip install ollama)")
+        return
+    analyzer = CorpusAnalyzer(session, task, concurrency)
+    done = CorpusAnalyzer.completed_keys(output_path)
+    print(f"🚀 === ANÁLISIS DEL CORPUS ({task}, concurrencia={concurrency}) → {output_path} ===")
+    if done:
+        print(f"↩️ Reanudando: {len(done)} páginas ya analizadas")
+    completed = failed = 0
+    started = time.monotonic()
+    
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    with open(output_path, 'a', encoding='utf-8') as output:
+        try:
+            async with contextlib.aclosing(analyzer.run(done, limit)) as results:
+                async for result in results:
+                    output.write(json.dumps(result, ensure_ascii=False) + '\n')
+                    output.flush()
+                    if result["status"] == "completed":
+                        completed += 1
+                        truncated = ", truncada" if result["truncated"] else ""
+                        print(f"✅ {result['url']} ({result['parts']} fragmentos{truncated}, {result['elapsed_s']}s)")
+                    else:
+                        failed += 1
+                        print(f"❌ {result['url']}: {result.get('error')}")
+        finally:
+            session.artifact_index.close()
+    
+    elapsed = time.monotonic() - started
+    print(f"\n📊 Análisis terminado: {completed} páginas analizadas, {failed} con error en {elapsed:.0f}s"
+          + (" (se reintentarán al relanzar)" if failed else ""))
+
+async def start_server(host: str = "127.0.0.1", port: int = 8765, max_active: int = 8, queue_size: int = 32,
+                       max_sessions: int = 256, job_concurrency: int = 4, **session_options):
+    """
+    Modo servidor sin REPL: atiende conversaciones y crawls concurrentes por HTTP
+    
+    Uso:
+    - python brainslot-mcp-system.py --serve 8765 --workers 2 --max-workers 4
+    - curl -N localhost:8765/chat -d '{"message": "Crawlea https://ejemplo.com"}'
+    """
+    print(f"🚀 === SERVIDOR BRAINSLOT MCP en http://{host}:{port} ===")
+    server = BrainSlotServer(OllamaMCPSession(**session_options), host, port, max_active, queue_size, max_sessions,
+                             jobs=CrawlJobQueue(), job_concurrency=job_concurrency)
+    try:
+        await server.serve_forever()
+    finally:
+        server.jobs.close()
+
+async def start_queued_crawl(urls: List[str], priority: int = 0, concurrency: int = 4, per_domain_limit: int = 1,
+                             domain_delay: float = 1.0, output_path: str = None, **session_options):
+    """
+    Crawl batch a través de la cola persistente (.data/jobs.sqlite)
+    
+    Si se interrumpe, volver a lanzarlo (con o sin URLs) retoma los trabajos pendientes
+    sin repetir los terminados.
+    
+    Uso:
+    - python brainslot-mcp-system.py --queue --urls-file urls.txt --priority 5
+    - python brainslot-mcp-system.py --queue   # reanudar
+    """
+    queue = CrawlJobQueue()
+    if urls:
+        queued = queue.enqueue(urls, priority, arguments={"rules": DEFAULT_INGEST_RULES, "contentMode": CONTENT_MODE})
+        print(f"📥 {len(queued['enqueued'])} URLs encoladas, "
+              f"{len(queued['duplicates'])} ya pendientes o crawleadas recientemente")
+    pending = queue.pending()
+    print(f"🚀 === COLA DE CRAWLS BRAINSLOT MCP ({pending} trabajos pendientes) ===")
+    if not pending:
+        queue.close()
+        return
+    
+    session = OllamaMCPSession(**session_options)
+    output = open(output_path, 'a', encoding='utf-8') if output_path else None
+    try:
+        if not await session.start_mcp():
+            return
+        
+        worker = CrawlJobWorker(session, queue, concurrency, per_domain_limit, domain_delay)
+        async for result in worker.run(until_empty=True):
+            if result["status"] != "error":
+                print(format_crawl_result(result))
+            elif result.get("jobStatus") == "queued":
+                print(f"🔁 {result['url']}: {result.get('error')} (reintento programado)")
+            else:
+                print(f"❌ {result['url']}: {result.get('error')}")
+            if output:
+                output.write(json.dumps(result, ensure_ascii=False) + '\n')
+                output.flush()
+        
+        counts = queue.status()["counts"]
+        print(f"\n📊 Cola terminada: {counts['done']} completados, {counts['failed']} fallidos")
+    finally:
+        if output:
+            output.close()
+        if session.mcp_executor:
+            await session.mcp_executor.stop()
+        queue.close()
+
+def format_crawl_result(result: Dict[str, Any]) -> str:
+    """Línea de consola de un crawl batch terminado sin error"""
+    icon = '♻️' if result.get('changed') is False else '✅'
+    depth = f"[{result['depth']}] " if "depth" in result else ""
+    changes = describe_changes(result)
+    return (f"{icon} {depth}{result['url']} ({result.get('contentSize', 0):,} bytes, {result['elapsed_s']}s)"
+            + (f" · {changes}" if changes else ""))
+
+def load_urls(urls: List[str], urls_file: str = None) -> List[str]:
+    """Combina URLs de la línea de comandos y de un fichero (una por línea, '#' para comentarios)"""
+    collected = list(urls)
+    if urls_file:
+        handle = sys.stdin if urls_file == '-' else open(urls_file, encoding='utf-8')
+        try:
+            for line in handle:
+                line = line.strip()
+                if line and not line.startswith('#'):
+                    collected.append(line)
+        finally:
+            if handle is not sys.stdin:
+                handle.close()
+    return collected
+
+def parse_args(argv: List[str] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Sistema BrainSlot MCP (Ollama + crawling)")
+    parser.add_argument('urls', nargs='*', help="URLs a crawlear en modo batch (sin sesión interactiva)")
+    parser.add_argument('--urls-file', help="Fichero con una URL por línea ('-' para stdin)")
+    parser.add_argument('--concurrency', type=int, default=4, help="Crawls simultáneos en total")
+    parser.add_argument('--per-domain', type=int, default=1, help="Crawls simultáneos por dominio")
+    parser.add_argument('--domain-delay', type=float, default=1.0, help="Segundos entre crawls al mismo dominio")
+    parser.add_argument('--output', help="Fichero JSONL donde añadir los resultados del batch")
+    parser.add_argument('--site', action='store_true',
+                        help="Crawlear recursivamente los sitios de las URLs dadas (bs.advanced_crawl + enlaces)")
+    parser.add_argument('--max-depth', type=int, default=2, help="Profundidad máxima de enlaces con --site")
+    parser.add_argument('--max-pages', type=int, default=100, help="Páginas máximas por crawl con --site")
+    parser.add_argument('--no-sitemap', action='store_true', help="No sembrar la frontera con sitemap.xml (--site)")
+    parser.add_argument('--queue', action='store_true',
+                        help="Procesar las URLs a través de la cola persistente (reanudable); sin URLs, reanudarla")
+    parser.add_argument('--priority', type=int, default=0, help="Prioridad de las URLs encoladas con --queue")
+    parser.add_argument('--retry-failed', action='store_true', help="Volver a encolar los trabajos fallidos (con --queue)")
+    parser.add_argument('--jobs-status', action='store_true', help="Mostrar el estado de la cola persistente y salir")
+    parser.add_argument('--pack-crawled', action='store_true',
+                        help="Migrar .data/crawled a segmentos comprimidos con zstd (incremental) y salir")
+    parser.add_argument('--pack-keep-files', action='store_true',
+                        help="No borrar los ficheros sueltos ya empaquetados (con --pack-crawled)")
+    parser.add_argument('--analyze', choices=['summary', 'extract'],
+                        help="Analizar offline con Ollama todo lo crawleado (resumen o extracción) y salir")
+    parser.add_argument('--analyze-output', help="Fichero JSONL de resultados y checkpoint (--analyze)")
+    parser.add_argument('--analyze-concurrency', type=int, default=2,
+                        help="Llamadas simultáneas a Ollama en --analyze (ajústalo a OLLAMA_NUM_PARALLEL)")
+    parser.add_argument('--analyze-limit', type=int, help="Máximo de páginas a analizar en esta ejecución")
+    parser.add_argument('--serve', type=int, metavar='PUERTO', help="Modo servidor HTTP (sin sesión interactiva)")
+    parser.add_argument('--host', default='127.0.0.1', help="Dirección del modo servidor")
+    parser.add_argument('--max-active', type=int, default=8, help="Turnos y crawls simultáneos en modo servidor")
+    parser.add_argument('--queue-size', type=int, default=32,
+                        help="Peticiones en espera antes de responder 503 en modo servidor")
+    parser.add_argument('--max-sessions', type=int, default=256, help="Conversaciones en memoria en modo servidor")
+    parser.add_argument('--workers', type=int, default=1, help="Procesos servidor MCP a arrancar")
+    parser.add_argument('--max-workers', type=int, help="Máximo de procesos MCP al escalar con la carga")
+    parser.add_argument('--tsx', action='store_true', help="Lanzar el servidor con tsx aunque exista el build JS")
+    parser.add_argument('--context-tokens', type=int, default=1500,
+                        help="Presupuesto de tokens del contenido crawleado en el prompt")
+    parser.add_argument('--history-tokens', type=int, default=4096,
+                        help="Presupuesto de tokens de la memoria de conversación")
+    parser.add_argument('--num-ctx', type=int, default=8192, help="Tamaño de contexto de Ollama (num_ctx)")
+    parser.add_argument('--keep-alive', default='30m', help="Tiempo que Ollama mantiene el modelo cargado")
+    parser.add_argument('--no-native-tools', action='store_true',
+                        help="Detectar crawls por palabras clave en lugar de con tool-calling nativo de Ollama")
+    parser.add_argument('--embedding-model',
+                        help="Modelo de embeddings de Ollama para la búsqueda vectorial local (requiere NumPy)")
+    parser.add_argument('--llm-cache-size', type=int, default=256,
+                        help="Respuestas de Ollama cacheadas en memoria (0 desactiva la caché)")
+    parser.add_argument('--llm-cache-ttl', type=float, default=3600.0, help="Segundos de validez de una respuesta cacheada")
+    parser.add_argument('--llm-cache-disk', action='store_true',
+                        help=f"Guardar también las respuestas cacheadas en disco ({LLM_CACHE_PATH})")
+    parser.add_argument('--log-level', default='INFO', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'])
+    parser.add_argument('--log-file', default=LOG_FILE, help="Fichero de log en JSON lines ('' para desactivarlo)")
+    parser.add_argument('--log-sample', type=int, default=10,
+                        help="Registrar 1 de cada N eventos por mensaje JSON-RPC por debajo de WARNING")
+    parser.add_argument('--metrics-port', type=int,
+                        help="Exponer métricas Prometheus en http://127.0.0.1:PUERTO/metrics")
+    parser.add_argument('--otel', action='store_true',
+                        help="Emitir trazas OpenTelemetry (requiere opentelemetry-sdk; OTLP si está instalado)")
+    return parser.parse_args(argv)
+
 async def main():
     """Función principal - wrapper para compatibilidad"""
-    await start_brainslot_system()
+    args = parse_args()
+    log_listener = setup_logging(getattr(logging, args.log_level), args.log_file or None, args.log_sample)
+    session_options = {
+        "workers": args.workers,
+        "max_workers": args.max_workers,
+        "use_compiled": not args.tsx,
+        "context_tokens": args.context_tokens,
+        "embedding_model": args.embedding_model,
+        "history_tokens": args.history_tokens,
+        "num_ctx": args.num_ctx,
+        "keep_alive": args.keep_alive,
+        "native_tools": not args.no_native_tools,
+        "response_cache_size": args.llm_cache_size,
+        "response_cache_ttl": args.llm_cache_ttl,
+        "response_cache_disk": args.llm_cache_disk
+    }
+    if args.otel:
+        TRACING.enable()
+    metrics_server = await METRICS.serve(args.metrics_port) if args.metrics_port else None
+    
+    try:
+        if args.jobs_status:
+            queue = CrawlJobQueue()
+            print(json.dumps(queue.status(), indent=2))
+            queue.close()
+        elif args.pack_crawled:
+            artifact_index = CrawlArtifactIndex()
+            result = artifact_index.packed.pack_artifacts(artifact_index, remove_files=not args.pack_keep_files)
+            print(json.dumps({**result, **artifact_index.packed.stats()}, indent=2))
+            artifact_index.close()
+        elif args.analyze:
+            await start_corpus_analysis(args.analyze, args.analyze_output, args.analyze_concurrency,
+                                        args.analyze_limit, **session_options)
+        elif args.queue:
+            if args.retry_failed:
+                queue = CrawlJobQueue()
+                print(f"🔁 {queue.retry_failed()} trabajos fallidos encolados de nuevo")
+                queue.close()
+            await start_queued_crawl(load_urls(args.urls, args.urls_file), args.priority, args.concurrency,
+                                     args.per_domain, args.domain_delay, args.output, **session_options)
+        elif args.urls or args.urls_file:
+            urls = load_urls(args.urls, args.urls_file)
+            site = {"max_depth": args.max_depth, "max_pages": args.max_pages,
+                    "use_sitemap": not args.no_sitemap} if args.site else None
+            await start_batch_crawl(urls, args.concurrency, args.per_domain, args.domain_delay, args.output,
+                                    site, **session_options)
+        elif args.serve:
+            await start_server(args.host, args.serve, args.max_active, args.queue_size, args.max_sessions,
+                               args.concurrency, **session_options)
+        else:
+            await start_brainslot_system(**session_options)
+    finally:
+        if metrics_server:
+            metrics_server.close()
+        # Vacía la cola de logs pendientes antes de salir
+        log_listener.stop()
 
 if __name__ == "__main__":
     asyncio.run(main())
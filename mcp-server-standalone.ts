@@ -14,11 +14,24 @@ import {
   ListToolsRequestSchema,
 } from '@modelcontextprotocol/sdk/types.js';
 import { CrawlerMCPService, CrawlerMCPConfig } from './packages/core/src/services/mcp-crawler-service.js';
+import { CrawlCache } from './packages/core/src/services/crawl-cache.js';
+import { ContentVersionStore, type ContentComparison } from './packages/core/src/services/content-versions.js';
+import { createHash } from 'crypto';
+import { basename, dirname, resolve } from 'path';
+import { pathToFileURL } from 'url';
 import type { ServerContext } from './packages/core/src/types.js';
 
+// stdout es exclusivo del protocolo JSON-RPC: cualquier diagnóstico, también el de
+// dependencias que usen console.log, se redirige a stderr
+for (const method of ['log', 'info', 'debug'] as const) {
+  console[method] = console.error.bind(console);
+}
+
 class BrainSlotMCPServer {
   private server: Server;
   private crawlerService: CrawlerMCPService | null = null;
+  private crawlCache: CrawlCache | null = null;
+  private contentVersions: ContentVersionStore | null = null;
   private ctx: ServerContext;
 
   constructor() {
@@ -27,6 +40,13 @@ class BrainSlotMCPServer {
       dataRoot: process.env.BS_DATA_ROOT || '.data'
     };
 
+    if (process.env.BS_CRAWL_CACHE !== 'false') {
+      this.crawlCache = new CrawlCache(this.ctx);
+    }
+    if (process.env.BS_INCREMENTAL !== 'false') {
+      this.contentVersions = new ContentVersionStore(this.ctx);
+    }
+
     this.server = new Server(
       {
         name: 'brainslot-mcp',
@@ -57,13 +77,20 @@ class BrainSlotMCPServer {
                 type: 'string',
                 description: 'URL a ingestar y crawlear'
               },
+              contentMode: {
+                type: 'string',
+                enum: ['inline', 'reference'],
+                default: 'inline',
+                description: "'reference' devuelve la ruta del fichero (contentRef) en lugar de fullContent"
+              },
               rules: {
                 type: 'object',
                 description: 'Reglas de crawling (opcional)',
                 properties: {
                   extractMarkdown: { type: 'boolean', default: true },
                   wordThreshold: { type: 'number', default: 50 },
-                  respectRobots: { type: 'boolean', default: true }
+                  respectRobots: { type: 'boolean', default: true },
+                  useCache: { type: 'boolean', default: true, description: 'Servir desde la caché de crawls si está vigente' }
                 }
               }
             },
@@ -80,7 +107,8 @@ class BrainSlotMCPServer {
               extractMarkdown: { type: 'boolean', default: true },
               wordThreshold: { type: 'number', default: 100 },
               includeScreenshot: { type: 'boolean', default: false },
-              bypassCache: { type: 'boolean', default: true }
+              bypassCache: { type: 'boolean', default: true },
+              contentMode: { type: 'string', enum: ['inline', 'reference'], default: 'inline' }
             },
             required: ['url']
           }
@@ -102,10 +130,17 @@ class BrainSlotMCPServer {
     });
 
     // Handler para ejecutar herramientas
-    this.server.setRequestHandler(CallToolRequestSchema, async (request) => {
+    // extra.signal se aborta cuando el cliente envía notifications/cancelled para esta solicitud
+    this.server.setRequestHandler(CallToolRequestSchema, async (request, extra) => {
       const { name, arguments: args } = request.params;
 
       try {
+        // Aciertos de caché: responder sin arrancar el crawler
+        if (name === 'bs.ingest_url') {
+          const cached = await this.tryCachedIngest(args);
+          if (cached) return cached;
+        }
+
         // Inicializar crawler service si no está disponible
         if (!this.crawlerService && (name.startsWith('bs.ingest_url') || name.startsWith('bs.advanced_crawl') || name.startsWith('bs.convert_currency'))) {
           await this.initializeCrawlerService();
@@ -113,10 +148,10 @@ class BrainSlotMCPServer {
 
         switch (name) {
           case 'bs.ingest_url':
-            return await this.handleIngestUrl(args);
+            return await this.handleIngestUrl(args, extra.signal);
           
           case 'bs.advanced_crawl':
-            return await this.handleAdvancedCrawl(args);
+            return await this.handleAdvancedCrawl(args, extra.signal);
           
           case 'bs.convert_currency':
             return await this.handleConvertCurrency(args);
@@ -146,7 +181,7 @@ class BrainSlotMCPServer {
   private async initializeCrawlerService(): Promise<void> {
     if (this.crawlerService) return;
 
-    console.log('🕷️ [BrainSlot MCP] Inicializando servicio de crawler...');
+    console.error('🕷️ [BrainSlot MCP] Inicializando servicio de crawler...');
     
     const crawlerConfig: CrawlerMCPConfig = {
       command: 'uv',
@@ -163,7 +198,7 @@ class BrainSlotMCPServer {
     
     try {
       const capabilities = await this.crawlerService.start();
-      console.log('✅ [BrainSlot MCP] Crawler service inicializado:', capabilities);
+      console.error('✅ [BrainSlot MCP] Crawler service inicializado:', capabilities);
     } catch (error) {
       console.error('❌ [BrainSlot MCP] Error inicializando crawler:', error);
       this.crawlerService = null;
@@ -171,27 +206,134 @@ class BrainSlotMCPServer {
     }
   }
 
-  private async handleIngestUrl(args: any) {
-    const { url, rules = {} } = args;
+  /** Reglas efectivas de bs.ingest_url (también forman parte de la clave de caché) */
+  private ingestRules(rules: any = {}) {
+    const { useCache, ...crawlRules } = rules;
+    return {
+      extractMarkdown: crawlRules.extractMarkdown ?? true,
+      wordThreshold: crawlRules.wordThreshold ?? 50,
+      respectRobots: crawlRules.respectRobots ?? true,
+      ...crawlRules
+    };
+  }
+
+  private async tryCachedIngest(args: any) {
+    const { url, rules = {}, contentMode } = args ?? {};
+    if (!this.crawlCache || !url || rules.useCache === false) {
+      return null;
+    }
+
+    const hit = await this.crawlCache.lookup(url, this.ingestRules(rules));
+    if (!hit) return null;
+
+    console.error(`🗃️ [BrainSlot MCP] Caché ${hit.revalidated ? 'revalidada' : 'vigente'} para ${url} (${hit.ageSeconds}s)`);
+    const { entry, content } = hit;
+    return this.crawlResult({
+      jobId: `ingest_${Date.now()}`,
+      status: 'completed',
+      source: 'brainslot-cache',
+      url,
+      title: entry.title,
+      contentSize: content.length,
+      featuresUsed: ['crawl-cache'],
+      timestamp: new Date(entry.fetchedAt).toISOString(),
+      contentPreview: content.substring(0, 500) + '...',
+      metadata: entry.crawlerMetadata || {},
+      cache: {
+        hit: true,
+        revalidated: hit.revalidated,
+        ageSeconds: hit.ageSeconds,
+        contentHash: entry.contentHash
+      },
+      files: {
+        contentFile: hit.contentFile,
+        metadataFile: entry.metadataFile,
+        outputDirectory: `${this.ctx.dataRoot}/crawled`
+      },
+      message: `Contenido servido desde caché (${hit.contentFile})`
+    }, 'fullContent', content, hit.contentFile, contentMode);
+  }
+
+  /**
+   * Resultado de un crawl guardado en disco.
+   * - 'inline': el contenido va completo en el JSON (campo contentField)
+   * - 'reference': el JSON solo lleva contentRef (ruta, URI, tamaño) y se añade un
+   *   resource_link; el cliente lee el fichero sin pasar el contenido por stdio
+   */
+  private crawlResult(
+    payload: Record<string, unknown>,
+    contentField: 'fullContent' | 'extractedContent',
+    content: string,
+    contentFile: string,
+    contentMode: string = 'inline'
+  ) {
+    if (contentMode !== 'reference') {
+      return {
+        content: [{ type: 'text', text: JSON.stringify({ ...payload, [contentField]: content }, null, 2) }]
+      };
+    }
+
+    const contentRef = {
+      field: contentField,
+      path: contentFile,
+      uri: pathToFileURL(resolve(contentFile)).href,
+      size: Buffer.byteLength(content, 'utf8'),
+      mimeType: contentFile.endsWith('.html') ? 'text/html' : 'text/markdown'
+    };
+    return {
+      content: [
+        { type: 'text', text: JSON.stringify({ ...payload, contentRef }) },
+        {
+          type: 'resource_link',
+          uri: contentRef.uri,
+          name: basename(contentFile),
+          mimeType: contentRef.mimeType,
+          size: contentRef.size
+        }
+      ]
+    };
+  }
+
+  private async handleIngestUrl(args: any, signal?: AbortSignal) {
+    const { url, rules = {}, contentMode } = args;
     
     if (!this.crawlerService) {
       throw new Error('Servicio de crawler no disponible');
     }
 
-    console.log(`🔧 [BrainSlot MCP] Ingesta URL: ${url}`);
+    console.error(`🔧 [BrainSlot MCP] Ingesta URL: ${url}`);
     
-    const result = await this.crawlerService.crawlUrl(url, {
-      extractMarkdown: rules.extractMarkdown ?? true,
-      wordThreshold: rules.wordThreshold ?? 50,
-      respectRobots: rules.respectRobots ?? true,
-      ...rules
-    });
+    const crawlRules = this.ingestRules(rules);
+    const result = await this.crawlerService.crawlUrl(url, crawlRules, signal);
 
     // Generar información del job
     const jobId = `ingest_${Date.now()}`;
     const timestamp = new Date().toISOString();
     const content = result.markdown || result.content || '';
     const title = result.title || 'Página web crawleada';
+
+    const comparison = await this.compareVersion(url, 'ingest', content);
+    if (!comparison.changed) {
+      if (this.crawlCache && result.success !== false) {
+        this.crawlCache.store(url, crawlRules, content, {
+          title,
+          contentFile: comparison.previous.contentFile,
+          metadataFile: comparison.previous.metadataFile,
+          crawlerMetadata: result.metadata || {}
+        }).catch(error => console.error(`⚠️ [BrainSlot MCP] Error guardando en caché: ${error}`));
+      }
+      return this.unchangedResult(comparison, {
+        jobId,
+        source: 'brainslot-mcp',
+        url,
+        title,
+        contentSize: content.length,
+        featuresUsed: ['crawl4ai', 'markdown-extraction', 'incremental'],
+        timestamp,
+        contentPreview: content.substring(0, 500) + '...',
+        metadata: result.metadata || {}
+      }, 'fullContent', content, contentMode);
+    }
     
     // Crear nombre de archivo basado en URL y timestamp
     const urlDomain = new URL(url).hostname.replace(/[^a-zA-Z0-9]/g, '_');
@@ -228,40 +370,49 @@ class BrainSlotMCPServer {
           content: contentFileName,
           metadata: metadataFileName
         },
-        crawlerMetadata: result.metadata || {}
+        crawlerMetadata: result.metadata || {},
+        ...this.versionInfo(comparison)
       };
       fs.writeFileSync(metadataFilePath, JSON.stringify(metadata, null, 2), 'utf8');
+      this.recordArtifact(fs, { url, title, timestamp, content, contentFilePath, metadataFilePath });
+      await this.contentVersions?.record(url, 'ingest', content, {
+        contentFile: contentFilePath, metadataFile: metadataFilePath, title, timestamp
+      });
+
+      if (this.crawlCache && result.success !== false) {
+        // Sin await: obtener los validadores HTTP no debe retrasar la respuesta.
+        // La caché referencia el artefacto recién escrito en vez de guardar otra copia.
+        this.crawlCache.store(url, crawlRules, content, {
+          title,
+          contentFile: contentFilePath,
+          metadataFile: metadataFilePath,
+          crawlerMetadata: result.metadata || {}
+        }).catch(error => console.error(`⚠️ [BrainSlot MCP] Error guardando en caché: ${error}`));
+      }
       
-      console.log(`📁 [BrainSlot MCP] Archivos guardados:`);
-      console.log(`   📄 Contenido: ${contentFilePath}`);
-      console.log(`   📋 Metadatos: ${metadataFilePath}`);
+      console.error(`📁 [BrainSlot MCP] Archivos guardados:`);
+      console.error(`   📄 Contenido: ${contentFilePath}`);
+      console.error(`   📋 Metadatos: ${metadataFilePath}`);
       
-      return {
-        content: [
-          {
-            type: 'text',
-            text: JSON.stringify({
-              jobId,
-              status: 'completed',
-              source: 'brainslot-mcp',
-              url: url,
-              title,
-              contentSize: content.length,
-              featuresUsed: ['crawl4ai', 'markdown-extraction'],
-              timestamp,
-              contentPreview: content.substring(0, 500) + '...',
-              fullContent: content,
-              metadata: result.metadata || {},
-              files: {
-                contentFile: contentFilePath,
-                metadataFile: metadataFilePath,
-                outputDirectory: outputDir
-              },
-              message: `Contenido crawleado guardado en ${contentFilePath}`
-            }, null, 2)
-          }
-        ]
-      };
+      return this.crawlResult({
+        jobId,
+        status: 'completed',
+        source: 'brainslot-mcp',
+        url: url,
+        title,
+        contentSize: content.length,
+        featuresUsed: ['crawl4ai', 'markdown-extraction'],
+        timestamp,
+        contentPreview: content.substring(0, 500) + '...',
+        metadata: result.metadata || {},
+        ...this.versionInfo(comparison),
+        files: {
+          contentFile: contentFilePath,
+          metadataFile: metadataFilePath,
+          outputDirectory: outputDir
+        },
+        message: `Contenido crawleado guardado en ${contentFilePath}`
+      }, 'fullContent', content, contentFilePath, contentMode);
       
     } catch (error) {
       console.error(`❌ [BrainSlot MCP] Error guardando archivos: ${error}`);
@@ -292,27 +443,124 @@ class BrainSlotMCPServer {
     }
   }
 
-  private async handleAdvancedCrawl(args: any) {
-    const { url, extractMarkdown = true, wordThreshold = 100, includeScreenshot = false, bypassCache = true } = args;
+  /** Compara con la última versión de la URL; sin almacén de versiones todo cuenta como cambio */
+  private async compareVersion(url: string, kind: string, content: string): Promise<ContentComparison> {
+    if (!this.contentVersions) return { changed: true };
+    try {
+      return await this.contentVersions.compare(url, kind, content);
+    } catch (error) {
+      console.error(`⚠️ [BrainSlot MCP] Error comparando versiones de ${url}: ${error}`);
+      return { changed: true };
+    }
+  }
+
+  /** Campos de cambio para la respuesta y los metadatos de un crawl con contenido nuevo */
+  private versionInfo(comparison: ContentComparison) {
+    if (!comparison.changed || !comparison.previous) {
+      return { changed: true };
+    }
+    return {
+      changed: true,
+      previousVersion: {
+        timestamp: comparison.previous.timestamp,
+        contentFile: comparison.previous.contentFile
+      },
+      ...(comparison.changes ? { changes: comparison.changes } : {})
+    };
+  }
+
+  /**
+   * Respuesta de un re-crawl sin cambios: no se escriben ficheros ni se añade al
+   * manifiesto; el resultado apunta a los ficheros de la versión anterior.
+   */
+  private unchangedResult(
+    comparison: Extract<ContentComparison, { changed: false }>,
+    payload: Record<string, unknown>,
+    contentField: 'fullContent' | 'extractedContent',
+    content: string,
+    contentMode?: string
+  ) {
+    const { previous } = comparison;
+    console.error(`♻️ [BrainSlot MCP] Sin cambios desde ${previous.timestamp}: ${payload.url}`);
+    return this.crawlResult({
+      ...payload,
+      status: 'completed',
+      changed: false,
+      unchangedSince: previous.timestamp,
+      files: {
+        contentFile: previous.contentFile,
+        metadataFile: previous.metadataFile,
+        outputDirectory: dirname(previous.contentFile)
+      },
+      message: `Contenido sin cambios desde ${previous.timestamp}; se reutiliza ${previous.contentFile}`
+    }, contentField, content, previous.contentFile, contentMode);
+  }
+
+  /**
+   * Añade el artefacto al manifiesto append-only `crawled/index.jsonl`.
+   * El cliente Python lo incorpora incrementalmente a su índice SQLite.
+   */
+  private recordArtifact(fs: typeof import('fs'), artifact: {
+    url: string;
+    title: string;
+    timestamp: string;
+    content: string;
+    contentFilePath: string;
+    metadataFilePath: string;
+  }) {
+    const manifestPath = `${this.ctx.dataRoot}/crawled/index.jsonl`;
+    const record = {
+      url: artifact.url,
+      title: artifact.title,
+      timestamp: artifact.timestamp,
+      contentFile: artifact.contentFilePath,
+      metadataFile: artifact.metadataFilePath,
+      size: Buffer.byteLength(artifact.content, 'utf8'),
+      sha256: createHash('sha256').update(artifact.content).digest('hex')
+    };
+    try {
+      fs.appendFileSync(manifestPath, JSON.stringify(record) + '\n', 'utf8');
+    } catch (error) {
+      console.error(`⚠️ [BrainSlot MCP] Error actualizando índice de artefactos: ${error}`);
+    }
+  }
+
+  private async handleAdvancedCrawl(args: any, signal?: AbortSignal) {
+    const { url, extractMarkdown = true, wordThreshold = 100, includeScreenshot = false, bypassCache = true, contentMode } = args;
     
     if (!this.crawlerService) {
       throw new Error('Servicio de crawler no disponible');
     }
 
-    console.log(`🕷️ [BrainSlot MCP] Crawling avanzado: ${url}`);
+    console.error(`🕷️ [BrainSlot MCP] Crawling avanzado: ${url}`);
     
     const result = await this.crawlerService.crawlUrl(url, {
       extractMarkdown,
       wordThreshold,
       includeScreenshot,
       bypassCache
-    });
+    }, signal);
 
     // Generar información del job
     const jobId = `advanced_crawl_${Date.now()}`;
     const timestamp = new Date().toISOString();
     const content = result.markdown || result.content || '';
     const title = result.title || 'Crawling avanzado completado';
+
+    const comparison = await this.compareVersion(url, 'advanced', content);
+    if (!comparison.changed) {
+      return this.unchangedResult(comparison, {
+        jobId,
+        source: 'crawl4ai-advanced',
+        url,
+        title,
+        contentSize: content.length,
+        featuresUsed: ['crawl4ai', 'advanced-extraction', 'incremental'],
+        timestamp,
+        metadata: result.metadata || {},
+        options: { extractMarkdown, wordThreshold, includeScreenshot, bypassCache }
+      }, 'extractedContent', content, contentMode);
+    }
     
     // Crear nombre de archivo basado en URL y timestamp
     const urlDomain = new URL(url).hostname.replace(/[^a-zA-Z0-9]/g, '_');
@@ -350,40 +598,38 @@ class BrainSlotMCPServer {
           content: contentFileName,
           metadata: metadataFileName
         },
-        crawlerMetadata: result.metadata || {}
+        crawlerMetadata: result.metadata || {},
+        ...this.versionInfo(comparison)
       };
       fs.writeFileSync(metadataFilePath, JSON.stringify(metadata, null, 2), 'utf8');
+      this.recordArtifact(fs, { url, title, timestamp, content, contentFilePath, metadataFilePath });
+      await this.contentVersions?.record(url, 'advanced', content, {
+        contentFile: contentFilePath, metadataFile: metadataFilePath, title, timestamp
+      });
       
-      console.log(`📁 [BrainSlot MCP] Archivos de crawling avanzado guardados:`);
-      console.log(`   📄 Contenido: ${contentFilePath}`);
-      console.log(`   📋 Metadatos: ${metadataFilePath}`);
+      console.error(`📁 [BrainSlot MCP] Archivos de crawling avanzado guardados:`);
+      console.error(`   📄 Contenido: ${contentFilePath}`);
+      console.error(`   📋 Metadatos: ${metadataFilePath}`);
       
-      return {
-        content: [
-          {
-            type: 'text',
-            text: JSON.stringify({
-              jobId,
-              status: 'completed',
-              source: 'crawl4ai-advanced',
-              url: url,
-              title,
-              contentSize: content.length,
-              featuresUsed: ['crawl4ai', 'advanced-extraction', extractMarkdown ? 'markdown' : 'html'],
-              timestamp,
-              extractedContent: content,
-              metadata: result.metadata || {},
-              options: { extractMarkdown, wordThreshold, includeScreenshot, bypassCache },
-              files: {
-                contentFile: contentFilePath,
-                metadataFile: metadataFilePath,
-                outputDirectory: outputDir
-              },
-              message: `Contenido de crawling avanzado guardado en ${contentFilePath}`
-            }, null, 2)
-          }
-        ]
-      };
+      return this.crawlResult({
+        jobId,
+        status: 'completed',
+        source: 'crawl4ai-advanced',
+        url: url,
+        title,
+        contentSize: content.length,
+        featuresUsed: ['crawl4ai', 'advanced-extraction', extractMarkdown ? 'markdown' : 'html'],
+        timestamp,
+        metadata: result.metadata || {},
+        options: { extractMarkdown, wordThreshold, includeScreenshot, bypassCache },
+        ...this.versionInfo(comparison),
+        files: {
+          contentFile: contentFilePath,
+          metadataFile: metadataFilePath,
+          outputDirectory: outputDir
+        },
+        message: `Contenido de crawling avanzado guardado en ${contentFilePath}`
+      }, 'extractedContent', content, contentFilePath, contentMode);
       
     } catch (error) {
       console.error(`❌ [BrainSlot MCP] Error guardando archivos de crawling avanzado: ${error}`);
@@ -421,7 +667,7 @@ class BrainSlotMCPServer {
       throw new Error('Servicio de crawler no disponible');
     }
 
-    console.log(`💱 [BrainSlot MCP] Conversión de moneda: ${amount} USD`);
+    console.error(`💱 [BrainSlot MCP] Conversión de moneda: ${amount} USD`);
     
     const result = await this.crawlerService.convertCurrency(amount);
 
@@ -447,7 +693,7 @@ class BrainSlotMCPServer {
     };
 
     process.on('SIGINT', async () => {
-      console.log('\n🛑 [BrainSlot MCP] Cerrando servidor...');
+      console.error('\n🛑 [BrainSlot MCP] Cerrando servidor...');
       if (this.crawlerService) {
         await this.crawlerService.stop();
       }
@@ -456,17 +702,17 @@ class BrainSlotMCPServer {
   }
 
   async run() {
-    console.log('🚀 [BrainSlot MCP] Iniciando servidor MCP standalone...');
-    console.log('📋 Herramientas disponibles:');
-    console.log('   • bs.ingest_url - Ingesta URLs con crawl4ai');
-    console.log('   • bs.advanced_crawl - Crawling avanzado');
-    console.log('   • bs.convert_currency - Conversión USD→EUR (demo)');
-    console.log('');
+    console.error('🚀 [BrainSlot MCP] Iniciando servidor MCP standalone...');
+    console.error('📋 Herramientas disponibles:');
+    console.error('   • bs.ingest_url - Ingesta URLs con crawl4ai');
+    console.error('   • bs.advanced_crawl - Crawling avanzado');
+    console.error('   • bs.convert_currency - Conversión USD→EUR (demo)');
+    console.error('');
 
     const transport = new StdioServerTransport();
     await this.server.connect(transport);
     
-    console.log('✅ [BrainSlot MCP] Servidor listo y esperando conexiones');
+    console.error('✅ [BrainSlot MCP] Servidor listo y esperando conexiones');
   }
 }
 
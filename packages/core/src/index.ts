@@ -9,6 +9,8 @@ export * from "./transports/stdio";
 export * from "./transports/http";
 export * from "./spawner";
 export * from "./services/mcp-crawler-service";
+export * from "./services/crawl-cache";
+export * from "./services/content-versions";
 export * from "./simple-crawler-integration";
 
 // App Entrypoint for the General MCP with Crawler Support
@@ -0,0 +1,208 @@
+/**
+ * Versiones de contenido por URL para re-crawls incrementales
+ *
+ * - Hash (sha256) del contenido normalizado: cambios de espacios o saltos de línea no cuentan
+ * - Si la página no ha cambiado, el crawl reutiliza los ficheros de la versión anterior
+ *   (aunque se hayan empaquetado en segmentos: se decide solo por hash)
+ * - Si ha cambiado, se comparan los fragmentos (bloques separados por líneas en blanco)
+ *   para informar de qué secciones se añadieron o desaparecieron
+ */
+
+import { createHash } from 'crypto';
+import { promises as fs } from 'fs';
+import * as path from 'path';
+import type { ServerContext } from '../types.js';
+import { normalizeUrl } from './crawl-cache.js';
+
+export interface ContentVersion {
+  key: string;
+  url: string;
+  contentHash: string;       // sha256 del contenido normalizado
+  contentFile: string;
+  metadataFile?: string;
+  title: string;
+  timestamp: string;         // ISO del crawl que escribió los ficheros
+}
+
+export interface ContentChanges {
+  addedChunks: number;
+  removedChunks: number;
+  unchangedChunks: number;
+  changedSections: string[]; // Encabezados de los fragmentos añadidos
+  addedPreview: string;
+}
+
+export type ContentComparison =
+  | { changed: false; previous: ContentVersion }
+  | { changed: true; previous?: ContentVersion; changes?: ContentChanges };
+
+/** Contenido normalizado: saltos de línea Unix, sin espacios finales ni líneas en blanco repetidas */
+export function normalizeContent(content: string): string {
+  return content
+    .replace(/\r\n?/g, '\n')
+    .split('\n')
+    .map(line => line.trimEnd())
+    .join('\n')
+    .replace(/\n{3,}/g, '\n\n')
+    .trim();
+}
+
+const sha256 = (data: string): string => createHash('sha256').update(data).digest('hex');
+
+function chunksOf(normalized: string): string[] {
+  return normalized.split(/\n\n+/).filter(chunk => chunk.length > 0);
+}
+
+/** Diferencias a nivel de fragmento entre dos versiones normalizadas */
+export function diffChunks(previous: string, current: string): ContentChanges {
+  const previousHashes = new Set(chunksOf(previous).map(sha256));
+  const currentChunks = chunksOf(current);
+  const currentHashes = new Set(currentChunks.map(sha256));
+
+  const added = currentChunks.filter(chunk => !previousHashes.has(sha256(chunk)));
+  let removedChunks = 0;
+  for (const hash of previousHashes) {
+    if (!currentHashes.has(hash)) removedChunks++;
+  }
+
+  const changedSections = [...new Set(
+    added
+      .map(chunk => chunk.split('\n').find(line => line.startsWith('#')))
+      .filter((heading): heading is string => Boolean(heading))
+      .map(heading => heading.replace(/^#+\s*/, ''))
+  )].slice(0, 20);
+
+  return {
+    addedChunks: added.length,
+    removedChunks,
+    unchangedChunks: currentChunks.length - added.length,
+    changedSections,
+    addedPreview: added.join('\n\n').substring(0, 500)
+  };
+}
+
+/**
+ * Índice de versiones como log append-only `crawled/versions.jsonl` (una línea por versión escrita)
+ *
+ * Los procesos del pool de servidores MCP comparten el log: cada uno añade sus versiones
+ * con appendFile (O_APPEND) y, antes de comparar, incorpora las líneas nuevas desde su
+ * último offset, como hace el cliente Python con el manifiesto. La última línea de cada
+ * clave es la versión vigente. Un crawl sin cambios no escribe nada.
+ */
+export class ContentVersionStore {
+  private logPath: string;
+  private legacyPath: string;
+  private versions = new Map<string, ContentVersion>();
+  private offset = 0;
+  private legacyLoaded = false;
+  private syncing: Promise<void> | null = null;
+
+  constructor(private ctx: ServerContext) {
+    this.logPath = path.join(ctx.dataRoot, 'crawled', 'versions.jsonl');
+    this.legacyPath = path.join(ctx.dataRoot, 'crawled', 'versions.json');
+  }
+
+  /** Cada herramienta (ingest, advanced) guarda ficheros distintos: versiones separadas */
+  static keyFor(url: string, kind: string): string {
+    return `${kind}|${normalizeUrl(url)}`;
+  }
+
+  /** Incorpora las versiones añadidas al log (por este u otros procesos) desde la última lectura */
+  private sync(): Promise<void> {
+    if (!this.syncing) {
+      this.syncing = this.readNewLines().finally(() => {
+        this.syncing = null;
+      });
+    }
+    return this.syncing;
+  }
+
+  private async readNewLines(): Promise<void> {
+    if (!this.legacyLoaded) {
+      this.legacyLoaded = true;
+      try {
+        // Índice anterior (JSON completo): se importa una vez; el log tiene prioridad
+        const legacy = JSON.parse(await fs.readFile(this.legacyPath, 'utf8')) as ContentVersion[];
+        for (const version of legacy) this.versions.set(version.key, version);
+      } catch {
+        // Sin índice anterior
+      }
+    }
+
+    let handle: fs.FileHandle;
+    try {
+      handle = await fs.open(this.logPath, 'r');
+    } catch {
+      return; // Sin versiones previas: el próximo crawl de cada URL se guarda completo
+    }
+    try {
+      const { size } = await handle.stat();
+      if (size < this.offset) this.offset = 0; // Log truncado: releerlo entero
+      if (size === this.offset) return;
+
+      const buffer = Buffer.alloc(size - this.offset);
+      await handle.read(buffer, 0, buffer.length, this.offset);
+      // Solo líneas completas: la última puede estar escribiéndose todavía
+      const complete = buffer.lastIndexOf(0x0a) + 1;
+      for (const line of buffer.subarray(0, complete).toString('utf8').split('\n')) {
+        if (!line) continue;
+        try {
+          const version = JSON.parse(line) as ContentVersion;
+          this.versions.set(version.key, version);
+        } catch {
+          console.error(`⚠️ [ContentVersions] Línea inválida en ${this.logPath}`);
+        }
+      }
+      this.offset += complete;
+    } finally {
+      await handle.close();
+    }
+  }
+
+  /**
+   * Compara el contenido recién crawleado con la última versión registrada.
+   * Decide solo por hash: los ficheros de la versión anterior pueden haberse empaquetado
+   * en segmentos (--pack-crawled) y seguir siendo legibles por su ruta original.
+   */
+  async compare(url: string, kind: string, content: string): Promise<ContentComparison> {
+    await this.sync();
+    const previous = this.versions.get(ContentVersionStore.keyFor(url, kind));
+    if (!previous) return { changed: true };
+
+    const normalized = normalizeContent(content);
+    if (sha256(normalized) === previous.contentHash) {
+      return { changed: false, previous };
+    }
+
+    try {
+      const previousContent = await fs.readFile(previous.contentFile, 'utf8');
+      return { changed: true, previous, changes: diffChunks(normalizeContent(previousContent), normalized) };
+    } catch {
+      // Versión anterior empaquetada o borrada: cambio sin detalle por fragmentos
+      return { changed: true, previous };
+    }
+  }
+
+  /** Registra la versión que se acaba de escribir en disco */
+  async record(
+    url: string,
+    kind: string,
+    content: string,
+    info: { contentFile: string; metadataFile?: string; title: string; timestamp: string }
+  ): Promise<void> {
+    const key = ContentVersionStore.keyFor(url, kind);
+    const version: ContentVersion = {
+      key,
+      url,
+      contentHash: sha256(normalizeContent(content)),
+      ...info
+    };
+    this.versions.set(key, version);
+    try {
+      await fs.mkdir(path.dirname(this.logPath), { recursive: true });
+      await fs.appendFile(this.logPath, JSON.stringify(version) + '\n', 'utf8');
+    } catch (error) {
+      console.error(`❌ [ContentVersions] Error registrando versión: ${error}`);
+    }
+  }
+}
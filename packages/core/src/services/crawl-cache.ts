@@ -0,0 +1,370 @@
+/**
+ * Caché persistente de crawls direccionada por contenido
+ *
+ * - Clave: URL normalizada + reglas de crawling
+ * - Si el crawl ya dejó su artefacto en crawled/, la entrada apunta a ese fichero y
+ *   no se guarda otra copia; si no, el contenido se guarda por hash (sha256) y
+ *   páginas idénticas se escriben una sola vez
+ * - TTL configurable con revalidación condicional (ETag / Last-Modified)
+ * - Expulsión LRU cuando el contenido referenciado (objetos y artefactos) supera el máximo
+ * - index.json lo comparten los procesos del pool: cada escritura se combina con la del disco
+ */
+
+import { createHash, randomBytes } from 'crypto';
+import { promises as fs } from 'fs';
+import * as path from 'path';
+import type { ServerContext } from '../types.js';
+
+export interface CrawlCacheConfig {
+  ttlSeconds: number;        // Antigüedad máxima antes de revalidar
+  maxBytes: number;          // Tamaño máximo del contenido referenciado (objects/ y artefactos)
+  revalidateTimeoutMs: number;
+}
+
+export interface CrawlCacheEntry {
+  key: string;
+  url: string;
+  contentHash: string;
+  size: number;
+  title: string;
+  etag?: string;
+  lastModified?: string;
+  fetchedAt: number;         // epoch ms del último crawl o revalidación
+  lastAccess: number;        // epoch ms, para LRU
+  contentFile?: string;      // artefacto de crawled/ (no pertenece a la caché); sin él, objects/
+  metadataFile?: string;
+  crawlerMetadata?: Record<string, unknown>;
+}
+
+export interface CrawlCacheHit {
+  entry: CrawlCacheEntry;
+  content: string;
+  contentFile: string;
+  revalidated: boolean;
+  ageSeconds: number;
+}
+
+export const defaultCrawlCacheConfig = (): CrawlCacheConfig => ({
+  ttlSeconds: Number(process.env.BS_CACHE_TTL_SECONDS ?? 3600),
+  maxBytes: Number(process.env.BS_CACHE_MAX_BYTES ?? 512 * 1024 * 1024),
+  revalidateTimeoutMs: Number(process.env.BS_CACHE_REVALIDATE_TIMEOUT_MS ?? 5000)
+});
+
+/** Normaliza una URL para que variantes equivalentes compartan entrada de caché */
+export function normalizeUrl(rawUrl: string): string {
+  const url = new URL(rawUrl);
+  url.hash = '';
+  url.hostname = url.hostname.toLowerCase();
+  if ((url.protocol === 'http:' && url.port === '80') || (url.protocol === 'https:' && url.port === '443')) {
+    url.port = '';
+  }
+  url.searchParams.sort();
+  if (url.pathname.length > 1 && url.pathname.endsWith('/')) {
+    url.pathname = url.pathname.replace(/\/+$/, '');
+  }
+  return url.toString();
+}
+
+/** JSON con claves ordenadas: las mismas reglas producen siempre la misma clave */
+function stableStringify(value: unknown): string {
+  if (Array.isArray(value)) {
+    return `[${value.map(stableStringify).join(',')}]`;
+  }
+  if (value && typeof value === 'object') {
+    const entries = Object.keys(value as Record<string, unknown>)
+      .sort()
+      .map(key => `${JSON.stringify(key)}:${stableStringify((value as Record<string, unknown>)[key])}`);
+    return `{${entries.join(',')}}`;
+  }
+  return JSON.stringify(value);
+}
+
+const sha256 = (data: string): string => createHash('sha256').update(data).digest('hex');
+
+export class CrawlCache {
+  private root: string;
+  private indexPath: string;
+  private entries = new Map<string, CrawlCacheEntry>();
+  // Claves borradas aquí (expulsión, fichero perdido) → epoch ms, hasta guardarlas en el índice
+  private removed = new Map<string, number>();
+  private loaded = false;
+  private persistQueue: Promise<void> = Promise.resolve();
+  private persistTimer: NodeJS.Timeout | null = null;
+
+  constructor(
+    private ctx: ServerContext,
+    private config: CrawlCacheConfig = defaultCrawlCacheConfig()
+  ) {
+    this.root = path.join(ctx.dataRoot, 'cache');
+    this.indexPath = path.join(this.root, 'index.json');
+  }
+
+  static keyFor(url: string, rules: Record<string, unknown> = {}): string {
+    return sha256(`${normalizeUrl(url)}|${stableStringify(rules)}`);
+  }
+
+  private objectPath(contentHash: string): string {
+    return path.join(this.root, 'objects', contentHash.slice(0, 2), `${contentHash}.md`);
+  }
+
+  private contentPath(entry: CrawlCacheEntry): string {
+    return entry.contentFile ?? this.objectPath(entry.contentHash);
+  }
+
+  private async load(): Promise<void> {
+    if (this.loaded) return;
+    this.loaded = true;
+    try {
+      const raw = await fs.readFile(this.indexPath, 'utf8');
+      for (const entry of JSON.parse(raw) as CrawlCacheEntry[]) {
+        this.entries.set(entry.key, entry);
+      }
+      console.error(`🗃️ [CrawlCache] ${this.entries.size} entradas cargadas`);
+    } catch {
+      // Caché vacía o índice ilegible: se reconstruye con los próximos crawls
+    }
+  }
+
+  private forget(key: string): void {
+    this.entries.delete(key);
+    this.removed.set(key, Date.now());
+  }
+
+  /**
+   * Escribe el índice de forma atómica (tmp + rename) y serializada. Antes lo combina
+   * con el del disco para no pisar lo que hayan guardado otros procesos del pool; cada
+   * proceso usa su propio fichero temporal.
+   */
+  private persist(): Promise<void> {
+    this.persistQueue = this.persistQueue.then(async () => {
+      const startedAt = Date.now();
+      await fs.mkdir(this.root, { recursive: true });
+      await this.mergeFromDisk();
+      await this.evict();
+      const tmpPath = `${this.indexPath}.${process.pid}.${randomBytes(4).toString('hex')}.tmp`;
+      try {
+        await fs.writeFile(tmpPath, JSON.stringify([...this.entries.values()]), 'utf8');
+        await fs.rename(tmpPath, this.indexPath);
+      } catch (error) {
+        await fs.rm(tmpPath, { force: true });
+        throw error;
+      }
+      // Las bajas posteriores a la lectura del disco se aplican en la siguiente escritura
+      for (const [key, removedAt] of this.removed) {
+        if (removedAt < startedAt) this.removed.delete(key);
+      }
+    }).catch(error => {
+      console.error(`❌ [CrawlCache] Error guardando índice: ${error}`);
+    });
+    return this.persistQueue;
+  }
+
+  /**
+   * Incorpora las entradas del índice en disco: por clave gana el crawl más reciente y
+   * se conserva el último acceso de ambos. Una entrada borrada aquí no vuelve salvo que
+   * otro proceso la haya crawleado después.
+   */
+  private async mergeFromDisk(): Promise<void> {
+    let onDisk: CrawlCacheEntry[];
+    try {
+      onDisk = JSON.parse(await fs.readFile(this.indexPath, 'utf8')) as CrawlCacheEntry[];
+    } catch {
+      return;
+    }
+    for (const entry of onDisk) {
+      const local = this.entries.get(entry.key);
+      if (!local) {
+        const removedAt = this.removed.get(entry.key);
+        if (removedAt === undefined || entry.fetchedAt > removedAt) {
+          this.entries.set(entry.key, entry);
+        }
+        continue;
+      }
+      const lastAccess = Math.max(local.lastAccess, entry.lastAccess);
+      if (entry.fetchedAt > local.fetchedAt) {
+        this.entries.set(entry.key, { ...entry, lastAccess });
+      } else {
+        local.lastAccess = lastAccess;
+      }
+    }
+  }
+
+  /** Agrupa las actualizaciones de acceso (LRU) en una sola escritura del índice */
+  private schedulePersist(): void {
+    if (this.persistTimer) return;
+    this.persistTimer = setTimeout(() => {
+      this.persistTimer = null;
+      void this.persist();
+    }, 1000);
+    this.persistTimer.unref();
+  }
+
+  /**
+   * Busca una URL en caché. Si la entrada ha caducado, intenta revalidarla con
+   * una petición condicional; solo devuelve null si hay que volver a crawlear.
+   */
+  async lookup(url: string, rules: Record<string, unknown> = {}): Promise<CrawlCacheHit | null> {
+    await this.load();
+    const key = CrawlCache.keyFor(url, rules);
+    const entry = this.entries.get(key);
+    if (!entry) return null;
+
+    const now = Date.now();
+    let revalidated = false;
+    if (now - entry.fetchedAt > this.config.ttlSeconds * 1000) {
+      if (!(await this.revalidate(entry))) {
+        return null;
+      }
+      entry.fetchedAt = now;
+      revalidated = true;
+    }
+
+    const contentFile = this.contentPath(entry);
+    let content: string;
+    try {
+      content = await fs.readFile(contentFile, 'utf8');
+    } catch {
+      // Objeto o artefacto borrado (o empaquetado en segmentos): descartar la entrada
+      this.forget(key);
+      await this.persist();
+      return null;
+    }
+
+    entry.lastAccess = now;
+    this.schedulePersist();
+    return {
+      entry,
+      content,
+      contentFile,
+      revalidated,
+      ageSeconds: Math.round((now - entry.fetchedAt) / 1000)
+    };
+  }
+
+  /** Petición condicional: true si el servidor confirma que la página no ha cambiado (304) */
+  private async revalidate(entry: CrawlCacheEntry): Promise<boolean> {
+    if (!entry.etag && !entry.lastModified) return false;
+
+    const headers: Record<string, string> = {};
+    if (entry.etag) headers['If-None-Match'] = entry.etag;
+    if (entry.lastModified) headers['If-Modified-Since'] = entry.lastModified;
+
+    try {
+      const response = await fetch(entry.url, {
+        method: 'GET',
+        headers,
+        redirect: 'follow',
+        signal: AbortSignal.timeout(this.config.revalidateTimeoutMs)
+      });
+      await response.body?.cancel();
+      return response.status === 304;
+    } catch (error) {
+      console.error(`⚠️ [CrawlCache] Revalidación fallida para ${entry.url}: ${error}`);
+      return false;
+    }
+  }
+
+  /** Obtiene los validadores HTTP de la página (HEAD) para revalidaciones futuras */
+  private async fetchValidators(url: string): Promise<{ etag?: string; lastModified?: string }> {
+    try {
+      const response = await fetch(url, {
+        method: 'HEAD',
+        redirect: 'follow',
+        signal: AbortSignal.timeout(this.config.revalidateTimeoutMs)
+      });
+      return {
+        etag: response.headers.get('etag') ?? undefined,
+        lastModified: response.headers.get('last-modified') ?? undefined
+      };
+    } catch {
+      return {};
+    }
+  }
+
+  /**
+   * Guarda el resultado de un crawl. Con info.contentFile la entrada referencia ese
+   * artefacto; sin él, el contenido se escribe en objects/ solo si su hash es nuevo.
+   */
+  async store(
+    url: string,
+    rules: Record<string, unknown>,
+    content: string,
+    info: { title: string; contentFile?: string; metadataFile?: string; crawlerMetadata?: Record<string, unknown> }
+  ): Promise<CrawlCacheEntry> {
+    await this.load();
+    const contentHash = sha256(content);
+
+    if (!info.contentFile) {
+      const objectFile = this.objectPath(contentHash);
+      try {
+        await fs.access(objectFile);
+      } catch {
+        await fs.mkdir(path.dirname(objectFile), { recursive: true });
+        await fs.writeFile(objectFile, content, 'utf8');
+      }
+    }
+
+    const now = Date.now();
+    const entry: CrawlCacheEntry = {
+      key: CrawlCache.keyFor(url, rules),
+      url,
+      contentHash,
+      size: Buffer.byteLength(content, 'utf8'),
+      title: info.title,
+      ...(await this.fetchValidators(url)),
+      fetchedAt: now,
+      lastAccess: now,
+      contentFile: info.contentFile,
+      metadataFile: info.metadataFile,
+      crawlerMetadata: info.crawlerMetadata
+    };
+    const replaced = this.entries.get(entry.key);
+    this.entries.set(entry.key, entry);
+    if (replaced && !replaced.contentFile && !this.referencesObject(replaced.contentHash)) {
+      // El objeto de la versión anterior ya no lo usa ninguna entrada
+      await fs.rm(this.objectPath(replaced.contentHash), { force: true });
+    }
+
+    await this.persist();
+    return entry;
+  }
+
+  private referencesObject(contentHash: string): boolean {
+    return [...this.entries.values()].some(entry => !entry.contentFile && entry.contentHash === contentHash);
+  }
+
+  /**
+   * Expulsa las entradas menos usadas hasta quedar por debajo de maxBytes. Cada fichero
+   * cuenta una vez, sea un objeto propio o un artefacto de crawled/; al expulsar solo se
+   * borran los objetos: el artefacto sigue en crawled/, ya sin entrada en la caché.
+   */
+  private async evict(): Promise<void> {
+    const fileSizes = new Map<string, number>();
+    const refCounts = new Map<string, number>();
+    for (const entry of this.entries.values()) {
+      const file = this.contentPath(entry);
+      fileSizes.set(file, entry.size);
+      refCounts.set(file, (refCounts.get(file) ?? 0) + 1);
+    }
+
+    let totalBytes = [...fileSizes.values()].reduce((sum, size) => sum + size, 0);
+    if (totalBytes <= this.config.maxBytes) return;
+
+    const byAccess = [...this.entries.values()].sort((a, b) => a.lastAccess - b.lastAccess);
+    for (const entry of byAccess) {
+      if (totalBytes <= this.config.maxBytes) break;
+      this.forget(entry.key);
+
+      const file = this.contentPath(entry);
+      const remaining = (refCounts.get(file) ?? 1) - 1;
+      refCounts.set(file, remaining);
+      if (remaining === 0) {
+        totalBytes -= fileSizes.get(file) ?? entry.size;
+        if (!entry.contentFile) {
+          await fs.rm(file, { force: true });
+        }
+      }
+    }
+    console.error(`🧹 [CrawlCache] Expulsión LRU: ${this.entries.size} entradas, ${totalBytes} bytes`);
+  }
+}
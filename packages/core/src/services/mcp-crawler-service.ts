@@ -62,10 +62,10 @@ export class CrawlerMCPService {
       throw new Error('Crawler MCP already started');
     }
 
-    console.log(`🕷️ [CrawlerMCP] Iniciando servicio especializado de crawling (Python)`);
-    console.log(`   Command: ${this.config.command} ${this.config.args.join(' ')}`);
-    console.log(`   CWD: ${this.config.cwd}`);
-    console.log(`   EntityId: ${this.ctx.entityId || 'general'}`);
+    console.error(`🕷️ [CrawlerMCP] Iniciando servicio especializado de crawling (Python)`);
+    console.error(`   Command: ${this.config.command} ${this.config.args.join(' ')}`);
+    console.error(`   CWD: ${this.config.cwd}`);
+    console.error(`   EntityId: ${this.ctx.entityId || 'general'}`);
 
     // Configurar variables de entorno específicas para el crawler
     const crawlerEnv = {
@@ -101,7 +101,7 @@ export class CrawlerMCPService {
         } else if (line.trim() && !line.includes('Extrayendo información') && !line.includes('Converting') && !line.includes('[INIT]')) {
           // Log de debug del crawler (filtrar logs de crawl4ai)
           if (!line.includes('WARNING') && !line.includes('warning:')) {
-            console.log(`[CrawlerMCP Debug] ${line}`);
+            console.error(`[CrawlerMCP Debug] ${line}`);
           }
         }
       } catch (error) {
@@ -119,7 +119,7 @@ export class CrawlerMCPService {
     });
 
     this.process.on('exit', (code, signal) => {
-      console.log(`[CrawlerMCP] Process exited with code ${code}, signal ${signal}`);
+      console.error(`[CrawlerMCP] Process exited with code ${code}, signal ${signal}`);
       this.cleanup();
     });
 
@@ -131,15 +131,15 @@ export class CrawlerMCPService {
     // Inicializar el MCP y obtener capabilities
     await this.initialize();
     
-    console.log(`✅ [CrawlerMCP] Servicio iniciado correctamente`);
-    console.log(`   Tools: ${this.capabilities?.tools.join(', ')}`);
-    console.log(`   Features: ${this.capabilities?.features.join(', ')}`);
+    console.error(`✅ [CrawlerMCP] Servicio iniciado correctamente`);
+    console.error(`   Tools: ${this.capabilities?.tools.join(', ')}`);
+    console.error(`   Features: ${this.capabilities?.features.join(', ')}`);
     
     return this.capabilities!;
   }
 
   private async initialize(): Promise<void> {
-    console.log(`📡 [CrawlerMCP] Initializing MCP connection...`);
+    console.error(`📡 [CrawlerMCP] Initializing MCP connection...`);
 
     // Esperar más tiempo para que el proceso se inicialice completamente
     await new Promise(resolve => setTimeout(resolve, 3000));
@@ -161,13 +161,13 @@ export class CrawlerMCPService {
       throw new Error(`MCP initialization failed: ${response.error.message}`);
     }
 
-    console.log(`✅ [CrawlerMCP] MCP initialized successfully`);
+    console.error(`✅ [CrawlerMCP] MCP initialized successfully`);
 
     // Esperar un poco más después de la inicialización
     await new Promise(resolve => setTimeout(resolve, 1000));
 
     // Enviar notificación initialized (requerida por el protocolo MCP)
-    console.log(`📡 [CrawlerMCP] Sending initialized notification...`);
+    console.error(`📡 [CrawlerMCP] Sending initialized notification...`);
     await this.sendNotification('notifications/initialized');
     
     // Esperar un poco más después de la notificación
@@ -175,7 +175,7 @@ export class CrawlerMCPService {
 
     // Skip tools/list since it's not working with this MCP implementation
     // Instead, use known tools from the MCP Python implementation
-    console.log(`⚠️ [CrawlerMCP] Using known tools (tools/list not supported by this MCP)`);
+    console.error(`⚠️ [CrawlerMCP] Using known tools (tools/list not supported by this MCP)`);
     
     this.capabilities = {
       tools: ['extraer_info_web', 'usd_to_eur'], // Known tools from the MCP Python code
@@ -183,24 +183,24 @@ export class CrawlerMCPService {
       features: ['web-crawling', 'crawl4ai', 'markdown-extraction', 'async-processing']
     };
 
-    console.log(`🔧 [CrawlerMCP] Available tools:`, this.capabilities.tools);
+    console.error(`🔧 [CrawlerMCP] Available tools:`, this.capabilities.tools);
     this.initialized = true;
   }
 
-  async crawlUrl(url: string, options: any = {}): Promise<any> {
+  async crawlUrl(url: string, options: any = {}, signal?: AbortSignal): Promise<any> {
     if (!this.initialized) {
       throw new Error('Crawler MCP not initialized');
     }
 
-    console.log(`🕷️ [CrawlerMCP] Crawling URL: ${url}`);
-    console.log(`   Options:`, JSON.stringify(options, null, 2));
+    console.error(`🕷️ [CrawlerMCP] Crawling URL: ${url}`);
+    console.error(`   Options:`, JSON.stringify(options, null, 2));
 
     // Usar la herramienta específica del crawler MCP (Python)
     const result = await this.callTool('extraer_info_web', {
       url
-    });
+    }, signal);
 
-    console.log(`✅ [CrawlerMCP] Crawling completed`);
+    console.error(`✅ [CrawlerMCP] Crawling completed`);
     
     // Adaptar el resultado para que sea compatible con la interfaz esperada
     return {
@@ -239,7 +239,7 @@ export class CrawlerMCPService {
       throw new Error('Crawler MCP not initialized');
     }
 
-    console.log(`💱 [CrawlerMCP] Converting ${amount} USD to EUR`);
+    console.error(`💱 [CrawlerMCP] Converting ${amount} USD to EUR`);
     
     const result = await this.callTool('usd_to_eur', {
       amount
@@ -248,17 +248,17 @@ export class CrawlerMCPService {
     return result;
   }
 
-  async callTool(name: string, arguments_: any): Promise<any> {
+  async callTool(name: string, arguments_: any, signal?: AbortSignal): Promise<any> {
     if (!this.initialized) {
       throw new Error('Crawler MCP not initialized');
     }
 
-    console.log(`🔧 [CrawlerMCP] Calling tool: ${name}`);
+    console.error(`🔧 [CrawlerMCP] Calling tool: ${name}`);
     
     const response = await this.sendRequest('tools/call', {
       name,
       arguments: arguments_
-    });
+    }, signal);
 
     return response.content?.[0]?.text || response;
   }
@@ -278,10 +278,15 @@ export class CrawlerMCPService {
     this.process.stdin.write(notificationStr);
   }
 
-  private async sendRequest(method: string, params?: any): Promise<any> {
+  /**
+   * Envía una solicitud al crawler. Si `signal` se aborta (el cliente canceló la
+   * llamada), la solicitud se rechaza y se propaga notifications/cancelled al crawler.
+   */
+  private async sendRequest(method: string, params?: any, signal?: AbortSignal): Promise<any> {
     if (!this.process?.stdin) {
       throw new Error('Crawler MCP process not running');
     }
+    signal?.throwIfAborted();
 
     const id = this.requestId++;
     const request: MCPRequest = {
@@ -292,12 +297,36 @@ export class CrawlerMCPService {
     };
 
     return new Promise((resolve, reject) => {
+      const onAbort = () => {
+        const pending = this.pendingRequests.get(id);
+        if (!pending) return;
+        clearTimeout(pending.timeout);
+        this.pendingRequests.delete(id);
+        this.sendNotification('notifications/cancelled', {
+          requestId: id,
+          reason: String(signal?.reason ?? 'Cancelado por el cliente')
+        }).catch(() => {});
+        reject(new Error(`Crawler MCP request ${method} cancelled`));
+      };
+
       const timeout = setTimeout(() => {
+        signal?.removeEventListener('abort', onAbort);
         this.pendingRequests.delete(id);
         reject(new Error(`Crawler MCP request ${method} timed out`));
       }, 60000); // Aumentado a 60 segundos para crawling
 
-      this.pendingRequests.set(id, { resolve, reject, timeout });
+      this.pendingRequests.set(id, {
+        resolve: (value: any) => {
+          signal?.removeEventListener('abort', onAbort);
+          resolve(value);
+        },
+        reject: (error: any) => {
+          signal?.removeEventListener('abort', onAbort);
+          reject(error);
+        },
+        timeout
+      });
+      signal?.addEventListener('abort', onAbort, { once: true });
 
       const requestStr = JSON.stringify(request) + '\n';
       this.process!.stdin!.write(requestStr);
@@ -337,13 +366,13 @@ export class CrawlerMCPService {
 
   async stop(): Promise<void> {
     if (this.process) {
-      console.log(`🛑 [CrawlerMCP] Stopping crawler service`);
+      console.error(`🛑 [CrawlerMCP] Stopping crawler service`);
       this.process.kill('SIGTERM');
       
       await new Promise(resolve => setTimeout(resolve, 1000));
       
       if (this.process && !this.process.killed) {
-        console.log(`🔥 [CrawlerMCP] Force killing crawler process`);
+        console.error(`🔥 [CrawlerMCP] Force killing crawler process`);
         this.process.kill('SIGKILL');
       }
     }
@@ -0,0 +1,45 @@
+"""
+Fixtures comunes de los tests del cliente Python
+
+brainslot-mcp-system.py no se puede importar con import normal (el guion del nombre),
+así que se carga por ruta una vez por sesión, como hacen los benchmarks.
+"""
+
+import asyncio
+import importlib.util
+import os
+import sys
+
+import pytest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(TESTS_DIR)
+SYSTEM_MODULE_PATH = os.path.join(REPO_ROOT, "brainslot-mcp-system.py")
+STUB_SERVER_PATH = os.path.join(REPO_ROOT, "benchmarks", "stub_mcp_server.py")
+
+
+@pytest.fixture(scope="session")
+def bs():
+    """Módulo brainslot-mcp-system.py (ollama es opcional: sin él solo falla hablar con el modelo)"""
+    spec = importlib.util.spec_from_file_location("brainslot_mcp_system", SYSTEM_MODULE_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def run():
+    """Ejecuta una corrutina en un bucle nuevo (sin depender de pytest-asyncio)"""
+    return asyncio.run
+
+
+@pytest.fixture
+def stub_command(tmp_path, monkeypatch):
+    """Comando del servidor MCP stub de los benchmarks; las opciones se pasan como --latency-ms=..."""
+    monkeypatch.setenv("BS_DATA_ROOT", str(tmp_path / ".data"))
+
+    def command(**options):
+        return [sys.executable, STUB_SERVER_PATH, "--payload-bytes", "200"] + [
+            f"--{name.replace('_', '-')}={value}" for name, value in options.items()
+        ]
+    return command
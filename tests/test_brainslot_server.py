@@ -0,0 +1,232 @@
+"""BrainSlotServer: rutas HTTP, streaming NDJSON, límites de lectura/conexiones y cancelación al desconectar"""
+
+import asyncio
+import contextlib
+import json
+
+import pytest
+
+
+class FakeConversation:
+    def __init__(self, owner):
+        self.owner = owner
+        self.emit = None
+
+    async def respond(self, message):
+        await self.emit({"event": "tool_call", "name": "bs.ingest_url"})
+        try:
+            await asyncio.sleep(self.owner.delay)
+        except asyncio.CancelledError:
+            self.owner.cancelled.append(message)
+            raise
+        return f"eco: {message}"
+
+
+class FakeSession:
+    """Sustituye a OllamaMCPSession: sin MCP ni Ollama"""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.mcp_executor = None
+        self.cancelled = []
+        self.crawled = []
+
+    def conversation(self):
+        return FakeConversation(self)
+
+    async def crawl_urls(self, urls, concurrency, per_domain, domain_delay, rules):
+        for url in urls:
+            await asyncio.sleep(self.delay)
+            self.crawled.append((url, rules))
+            yield {"url": url, "status": "error" if "down" in url else "completed"}
+
+
+@contextlib.asynccontextmanager
+async def serving(server):
+    tcp = await asyncio.start_server(server.handle, "127.0.0.1", 0)
+    try:
+        yield tcp.sockets[0].getsockname()[1]
+    finally:
+        tcp.close()
+        await tcp.wait_closed()
+
+
+async def request(port, method, path, body=None, raw=None):
+    """(status, payload): el JSON de la respuesta o la lista de eventos si es un stream"""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    if raw is None:
+        data = json.dumps(body).encode() if body is not None else b""
+        raw = f"{method} {path} HTTP/1.1\r\nContent-Length: {len(data)}\r\n\r\n".encode() + data
+    writer.write(raw)
+    response = await reader.read()
+    writer.close()
+
+    head, _, content = response.partition(b"\r\n\r\n")
+    status = int(head.split()[1])
+    if b"Transfer-Encoding: chunked" not in head:
+        return status, json.loads(content) if content else None
+    events = []
+    while True:
+        size, _, content = content.partition(b"\r\n")
+        if int(size, 16) == 0:
+            return status, events
+        events.append(json.loads(content[:int(size, 16)]))
+        content = content[int(size, 16) + 2:]
+
+
+def test_health_and_unknown_routes(bs, run):
+    server = bs.BrainSlotServer(FakeSession())
+
+    async def main():
+        async with serving(server) as port:
+            return (await request(port, "GET", "/health"), await request(port, "GET", "/nada"),
+                    await request(port, "DELETE", "/sessions/x"))
+
+    health, missing, session = run(main())
+    assert health[0] == 200 and health[1]["mcpWorkers"] == 0 and health[1]["status"] == "degraded"
+    assert missing == (404, {"error": "Not Found"})
+    assert session == (404, {"deleted": False})
+
+
+@pytest.mark.parametrize("raw", [
+    b"POST /chat HTTP/1.1\r\nContent-Length: 3\r\n\r\n{x}",
+    b"POST /chat HTTP/1.1\r\nContent-Length: 2\r\n\r\n[]",
+    b"POST /chat HTTP/1.1\r\nContent-Length: abc\r\n\r\n",
+    b"GARBAGE\r\n\r\n",
+])
+def test_malformed_requests_are_400(bs, run, raw):
+    server = bs.BrainSlotServer(FakeSession())
+
+    async def main():
+        async with serving(server) as port:
+            return await request(port, None, None, raw=raw)
+
+    assert run(main()) == (400, {"error": "Bad Request"})
+
+
+def test_slow_request_times_out_with_408(bs, run):
+    server = bs.BrainSlotServer(FakeSession())
+    server.READ_TIMEOUT = 0.2
+
+    async def main():
+        async with serving(server) as port:
+            return await request(port, None, None, raw=b"POST /chat HTTP/1.1\r\n")
+
+    assert run(main()) == (408, {"error": "Request Timeout"})
+
+
+def test_connections_over_the_cap_get_503(bs, run):
+    server = bs.BrainSlotServer(FakeSession())
+    server.MAX_CONNECTIONS = 1
+
+    async def main():
+        async with serving(server) as port:
+            _, idle = await asyncio.open_connection("127.0.0.1", port)
+            await asyncio.sleep(0.05)
+            # Se rechaza sin leer la petición: basta con la línea de estado
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            status_line = await reader.readline()
+            writer.close()
+            idle.close()
+            await asyncio.sleep(0.05)
+            return status_line
+
+    assert run(main()) == b"HTTP/1.1 503 Service Unavailable\r\n"
+
+
+def test_chat_streams_events_and_keeps_the_session(bs, run):
+    server = bs.BrainSlotServer(FakeSession())
+
+    async def main():
+        async with serving(server) as port:
+            first = await request(port, "POST", "/chat", {"message": "hola"})
+            session_id = first[1][0]["id"]
+            second = await request(port, "POST", "/chat", {"message": "otra", "session": session_id})
+            return first, second, session_id
+
+    (status, events), (_, again), session_id = run(main())
+    assert status == 200
+    assert events == [{"event": "session", "id": session_id}, {"event": "tool_call", "name": "bs.ingest_url"},
+                      {"event": "done", "content": "eco: hola"}]
+    assert again[0] == {"event": "session", "id": session_id}
+    assert list(server.conversations) == [session_id]
+
+
+def test_chat_rejects_a_second_turn_in_the_same_session(bs, run):
+    server = bs.BrainSlotServer(FakeSession(delay=0.3))
+
+    async def main():
+        async with serving(server) as port:
+            first = asyncio.create_task(request(port, "POST", "/chat", {"message": "uno", "session": "s"}))
+            await asyncio.sleep(0.1)
+            second = await request(port, "POST", "/chat", {"message": "dos", "session": "s"})
+            return second, await first
+
+    second, first = run(main())
+    assert second[0] == 409
+    assert first[1][-1] == {"event": "done", "content": "eco: uno"}
+
+
+def test_chat_without_message_is_400(bs, run):
+    server = bs.BrainSlotServer(FakeSession())
+
+    async def main():
+        async with serving(server) as port:
+            return await request(port, "POST", "/chat", {"session": "s"})
+
+    assert run(main())[0] == 400
+
+
+def test_disconnect_cancels_the_turn(bs, run):
+    session = FakeSession(delay=5)
+    server = bs.BrainSlotServer(session)
+
+    async def main():
+        async with serving(server) as port:
+            data = json.dumps({"message": "largo"}).encode()
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(f"POST /chat HTTP/1.1\r\nContent-Length: {len(data)}\r\n\r\n".encode() + data)
+            await reader.readline()
+            writer.close()
+            await asyncio.sleep(0.3)
+            return server.connections
+
+    assert run(main()) == 0
+    assert session.cancelled == ["largo"]
+
+
+def test_crawl_streams_one_result_per_url(bs, run):
+    session = FakeSession()
+    server = bs.BrainSlotServer(session)
+
+    async def main():
+        async with serving(server) as port:
+            return await request(port, "POST", "/crawl", {"urls": ["https://a.com/", "https://down.com/"],
+                                                          "rules": {"maxDepth": 1}})
+
+    status, events = run(main())
+    assert status == 200
+    assert [event["url"] for event in events[:-1]] == ["https://a.com/", "https://down.com/"]
+    assert events[-1] == {"event": "done", "completed": 1, "failed": 1}
+    assert session.crawled[0][1] == {"maxDepth": 1}
+
+
+def test_jobs_are_queued_and_validated(bs, run, tmp_path):
+    jobs = bs.CrawlJobQueue(str(tmp_path / "jobs.sqlite"))
+    server = bs.BrainSlotServer(FakeSession(), jobs=jobs)
+
+    async def main():
+        async with serving(server) as port:
+            bad_rules = await request(port, "POST", "/jobs", {"urls": ["https://a.com/"], "rules": ["maxDepth"]})
+            bad_priority = await request(port, "POST", "/jobs", {"urls": ["https://a.com/"], "priority": "alta"})
+            queued = await request(port, "POST", "/jobs", {"urls": ["https://a.com/"], "rules": {"maxDepth": 1}})
+            return bad_rules, bad_priority, queued, await request(port, "GET", "/jobs/999")
+
+    try:
+        bad_rules, bad_priority, queued, missing = run(main())
+    finally:
+        jobs.close()
+    assert bad_rules == (400, {"error": "'rules' debe ser un objeto"})
+    assert bad_priority[0] == 400
+    assert queued[0] == 200
+    assert missing[0] == 404
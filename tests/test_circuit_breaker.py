@@ -0,0 +1,107 @@
+"""CircuitBreaker y AdaptiveTimeouts: estados del circuito, prueba half_open y presupuesto por p95"""
+
+import asyncio
+
+import pytest
+
+
+def open_breaker(bs, reset_timeout=30.0):
+    breaker = bs.CircuitBreaker(failure_threshold=2, reset_timeout=reset_timeout)
+    breaker.record_failure()
+    breaker.record_failure()
+    return breaker
+
+
+def test_opens_after_consecutive_failures(bs):
+    breaker = bs.CircuitBreaker(failure_threshold=3)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == "closed"
+
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+
+def test_half_open_admits_a_single_probe(bs):
+    breaker = open_breaker(bs, reset_timeout=0)
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+    assert not breaker.allow()
+    assert not breaker.available()
+
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.allow() and breaker.allow()
+
+
+def test_failed_probe_reopens_the_circuit(bs):
+    breaker = open_breaker(bs)
+    breaker.opened_at -= breaker.reset_timeout
+    assert breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.probe_in_flight
+
+
+def test_abandoned_probe_lets_the_next_call_probe(bs):
+    breaker = open_breaker(bs, reset_timeout=0)
+    assert breaker.allow()
+    breaker.abandon()
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+
+
+def test_cancelled_half_open_probe_does_not_block_the_executor(bs, run, stub_command):
+    executor = bs.MCPToolExecutor(stub_command(latency_ms=5000), verbose=False)
+    executor.breaker = open_breaker(bs, reset_timeout=0)
+
+    async def main():
+        await executor.start_mcp_server()
+        try:
+            probe = asyncio.create_task(executor.execute_tool("bs.ingest_url", {"url": "https://a.com/"}, retries=0))
+            await asyncio.sleep(0.2)
+            assert executor.breaker.probe_in_flight
+            probe.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await probe
+            assert not executor.breaker.probe_in_flight
+
+            executor.breaker.reset_timeout = 30.0
+            executor.breaker.opened_at -= 30.0
+            assert executor.breaker.available()
+        finally:
+            await executor.stop()
+
+    run(main())
+
+
+def test_adaptive_timeout_follows_the_p95(bs):
+    timeouts = bs.AdaptiveTimeouts(default=90.0, minimum=1.0, maximum=10.0, factor=2.0, min_samples=10)
+    for _ in range(9):
+        timeouts.observe("bs.ingest_url", 2.0)
+    assert timeouts.timeout_for("bs.ingest_url") == 90.0
+
+    timeouts.observe("bs.ingest_url", 3.0)
+    assert timeouts.p95("bs.ingest_url") == 3.0
+    assert timeouts.timeout_for("bs.ingest_url") == 6.0
+    assert timeouts.timeout_for("bs.advanced_crawl") == 90.0
+
+
+def test_adaptive_timeout_is_clamped(bs):
+    timeouts = bs.AdaptiveTimeouts(minimum=1.0, maximum=10.0, min_samples=1)
+    timeouts.observe("fast", 0.01)
+    timeouts.observe("slow", 60.0)
+    assert timeouts.timeout_for("fast") == 1.0
+    assert timeouts.timeout_for("slow") == 10.0
+
+
+def test_adaptive_timeout_keeps_a_sliding_window(bs):
+    timeouts = bs.AdaptiveTimeouts(minimum=0.0, window=5, min_samples=5)
+    for elapsed in (50.0,) * 5 + (1.0,) * 5:
+        timeouts.observe("bs.ingest_url", elapsed)
+    assert timeouts.p95("bs.ingest_url") == 1.0
@@ -0,0 +1,71 @@
+"""ConversationMemory: prefijo estable, compactación con resumen y el último turno siempre presente"""
+
+
+def words(tokens):
+    # estimate_tokens cuenta ~4 caracteres por token
+    return "x" * (tokens * 4)
+
+
+def test_build_keeps_a_stable_prefix(bs, run):
+    memory = bs.ConversationMemory(system_prompt="sistema", token_budget=1000)
+    run(memory.add_turn("hola", "buenas"))
+
+    messages = memory.build("¿qué tal?")
+    assert [message["role"] for message in messages] == ["system", "user", "assistant", "user"]
+    assert messages[:3] == memory.build("otra pregunta")[:3]
+
+
+def test_compaction_summarizes_old_turns(bs, run):
+    received = []
+
+    async def summarizer(previous, transcript):
+        received.append(transcript)
+        return "resumen"
+
+    memory = bs.ConversationMemory(system_prompt="sistema", token_budget=100, summarizer=summarizer)
+    for i in range(4):
+        run(memory.add_turn(f"pregunta {i} {words(40)}", f"respuesta {i}"))
+
+    assert memory.summary == "resumen"
+    assert memory.tokens() <= 100
+    assert memory.turns[-1][0]["content"].startswith("pregunta 3")
+    assert "pregunta 0" in received[0]
+    assert memory.build("nueva")[1] == {"role": "system", "content": "Resumen de la conversación anterior:\nresumen"}
+
+
+def test_summary_falls_back_to_transcript_when_summarizer_fails(bs, run):
+    async def summarizer(previous, transcript):
+        raise RuntimeError("Ollama caído")
+
+    memory = bs.ConversationMemory(token_budget=40, summarizer=summarizer)
+    run(memory.add_turn(f"primera {words(18)}", "uno"))
+    run(memory.add_turn(f"segunda {words(18)}", "dos"))
+
+    # Se conserva el final de la transcripción, acotado al presupuesto
+    assert memory.summary.endswith("assistant: uno")
+    assert len(memory.summary) <= memory.token_budget
+    assert len(memory.turns) == 1
+    assert memory.turns[0][0]["content"].startswith("segunda")
+
+
+def test_newest_turn_is_trimmed_instead_of_evicted(bs, run):
+    memory = bs.ConversationMemory(token_budget=200)
+    tool_result = {"role": "tool", "content": words(1000)}
+    run(memory.add_turn("¿qué dice la página?", "Dice esto.", [tool_result]))
+
+    assert len(memory.turns) == 1
+    turn = memory.turns[0]
+    assert turn[0]["content"] == "¿qué dice la página?"
+    assert turn[-1]["content"] == "Dice esto."
+    assert turn[1]["content"].endswith("…[recortado]")
+    assert memory.tokens() <= 100
+    # El mensaje original del llamante no se modifica
+    assert tool_result["content"] == words(1000)
+
+
+def test_clear_forgets_everything(bs, run):
+    memory = bs.ConversationMemory()
+    run(memory.add_turn("hola", "buenas"))
+    memory.summary = "algo"
+    memory.clear()
+    assert memory.turns == [] and memory.summary == ""
@@ -0,0 +1,61 @@
+"""CrawlFrontier: deduplicación, límites, filtros de host y extensión, robots.txt y enlaces"""
+
+from urllib.robotparser import RobotFileParser
+
+
+def drain(frontier):
+    popped = []
+    while (item := frontier.pop()) is not None:
+        popped.append(item)
+    return popped
+
+
+def test_urls_are_deduplicated_after_normalization(bs):
+    frontier = bs.CrawlFrontier(max_depth=2, max_pages=10)
+    assert frontier.add("https://Example.com/a/?b=2&a=1#top", 0)
+    assert not frontier.add("https://example.com/a?a=1&b=2", 1)
+    assert drain(frontier) == [("https://example.com/a?a=1&b=2", 0)]
+
+
+def test_depth_and_page_limits(bs):
+    frontier = bs.CrawlFrontier(max_depth=1, max_pages=2)
+    assert not frontier.add("https://example.com/deep", 2)
+    assert frontier.add("https://example.com/1", 0)
+    assert frontier.add("https://example.com/2", 1)
+    assert not frontier.add("https://example.com/3", 1)
+    assert [url for url, _ in drain(frontier)] == ["https://example.com/1", "https://example.com/2"]
+
+
+def test_only_pages_of_the_allowed_sites(bs):
+    frontier = bs.CrawlFrontier(allowed_hosts=["www.example.com"])
+    assert frontier.add("https://example.com/", 0)
+    assert frontier.add("https://WWW.example.com/about", 1)
+    assert not frontier.add("https://other.com/", 1)
+    assert not frontier.add("https://example.com/logo.png", 1)
+    assert not frontier.add("mailto:info@example.com", 1)
+    assert not frontier.add("ftp://example.com/file", 1)
+
+
+def test_robots_rules_apply_to_www_and_bare_host(bs):
+    robots = RobotFileParser()
+    robots.parse(["User-agent: *", "Disallow: /private"])
+    frontier = bs.CrawlFrontier()
+    frontier.set_robots("example.com", robots)
+
+    assert not frontier.add("https://www.example.com/private/page", 0)
+    assert not frontier.add("https://example.com/private", 0)
+    assert frontier.add("https://www.example.com/public", 0)
+
+
+def test_extract_links_resolves_relative_urls(bs):
+    content = (
+        "[Inicio](/)\n[Docs](docs/intro.md) <a href=\"../contacto\">contacto</a>\n"
+        "Más en https://other.com/x. [Correo](mailto:a@b.c) [Ancla](#arriba) [Inicio otra vez](/)"
+    )
+    links = bs.CrawlFrontier.extract_links(content, "https://example.com/guia/")
+    assert links == [
+        "https://example.com/",
+        "https://example.com/guia/docs/intro.md",
+        "https://example.com/contacto",
+        "https://other.com/x.",
+    ]
@@ -0,0 +1,150 @@
+"""CrawlJobQueue: deduplicación, prioridades, leases, reintentos y retry_failed"""
+
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+
+@pytest.fixture
+def queue(bs, tmp_path):
+    queue = bs.CrawlJobQueue(str(tmp_path / "jobs.sqlite"), lease_seconds=60, max_attempts=2)
+    yield queue
+    queue.close()
+
+
+def test_enqueue_deduplicates_normalized_urls_and_raises_priority(queue):
+    first = queue.enqueue(["https://Example.com/page/", "https://example.com/page"])
+    assert len(first["enqueued"]) == 1
+    assert first["duplicates"] == first["enqueued"]
+
+    again = queue.enqueue(["https://example.com/page#section"], priority=5)
+    assert again == {"enqueued": [], "duplicates": first["enqueued"]}
+    assert queue.get(first["enqueued"][0])["priority"] == 5
+
+
+def test_lease_takes_highest_priority_then_oldest(queue):
+    low = queue.enqueue(["https://a.com/1"], priority=0)["enqueued"][0]
+    high = queue.enqueue(["https://a.com/2"], priority=9)["enqueued"][0]
+
+    jobs = queue.lease("owner", limit=2)
+    assert [job["id"] for job in jobs] == [high, low]
+    assert all(job["attempts"] == 1 for job in jobs)
+    assert jobs[0]["arguments"]["url"] == "https://a.com/2"
+    assert queue.lease("other") == []
+    assert queue.status()["counts"]["running"] == 2
+
+
+def test_complete_requires_the_lease_owner(queue):
+    job_id = queue.enqueue(["https://a.com/"])["enqueued"][0]
+    queue.lease("owner")
+
+    assert not queue.complete(job_id, "intruder", {"status": "completed"})
+    assert queue.complete(job_id, "owner", {"status": "completed"})
+    job = queue.get(job_id)
+    assert job["status"] == "done"
+    assert job["result"] == {"status": "completed"}
+    # Una URL terminada hace poco no se vuelve a encolar
+    assert queue.enqueue(["https://a.com/"])["duplicates"] == [job_id]
+
+
+def test_fail_retries_with_backoff_until_max_attempts(queue):
+    job_id = queue.enqueue(["https://a.com/"])["enqueued"][0]
+    queue.lease("owner")
+    assert queue.fail(job_id, "owner", "timeout") == "queued"
+    assert queue.get(job_id)["available_at"] >= time.time() - 1
+
+    queue.conn.execute("UPDATE jobs SET available_at = 0 WHERE id = ?", (job_id,))
+    queue.lease("owner")
+    assert queue.fail(job_id, "owner", "timeout") == "failed"
+    assert queue.get(job_id)["error"] == "timeout"
+
+
+def test_non_retryable_failure_fails_immediately(queue):
+    job_id = queue.enqueue(["https://a.com/"])["enqueued"][0]
+    queue.lease("owner")
+    assert queue.fail(job_id, "owner", "404", retryable=False) == "failed"
+    assert queue.fail(job_id, "someone-else", "404") == "lost"
+
+
+def test_expired_lease_is_taken_over(bs, tmp_path):
+    queue = bs.CrawlJobQueue(str(tmp_path / "jobs.sqlite"), lease_seconds=-1, max_attempts=3)
+    try:
+        job_id = queue.enqueue(["https://a.com/"])["enqueued"][0]
+        assert queue.lease("crashed")[0]["id"] == job_id
+        taken = queue.lease("survivor")
+        assert [job["id"] for job in taken] == [job_id]
+        assert taken[0]["attempts"] == 2
+        assert not queue.complete(job_id, "crashed", {})
+    finally:
+        queue.close()
+
+
+def test_release_returns_jobs_without_spending_an_attempt(queue):
+    job_id = queue.enqueue(["https://a.com/"])["enqueued"][0]
+    queue.lease("owner")
+    assert queue.renew("owner") == 1
+    assert queue.release("owner") == 1
+
+    job = queue.get(job_id)
+    assert job["status"] == "queued"
+    assert job["attempts"] == 0
+    assert job["lease_owner"] is None
+
+
+def test_stopping_the_worker_returns_its_running_jobs(bs, queue, run):
+    class SlowExecutor:
+        async def execute_tool(self, tool, arguments):
+            await asyncio.sleep(10)
+
+    job_id = queue.enqueue(["https://a.com/"])["enqueued"][0]
+    worker = bs.CrawlJobWorker(SimpleNamespace(mcp_executor=SlowExecutor()), queue, concurrency=1, domain_delay=0)
+
+    async def main():
+        consumer = asyncio.ensure_future(worker.run().__anext__())
+        await asyncio.sleep(0.2)
+        running = queue.get(job_id)["status"]
+        consumer.cancel()
+        await asyncio.gather(consumer, return_exceptions=True)
+        return running
+
+    assert run(main()) == "running"
+    job = queue.get(job_id)
+    assert job["status"] == "queued" and job["attempts"] == 0 and job["lease_owner"] is None
+
+
+def test_retry_failed_requeues_only_the_latest_failure_per_url(queue):
+    ids = []
+    for _ in range(2):
+        job_id = queue.enqueue(["https://a.com/"])["enqueued"][0]
+        queue.lease("owner")
+        queue.fail(job_id, "owner", "boom", retryable=False)
+        ids.append(job_id)
+
+    # Dos filas failed de la misma URL no pueden pasar ambas a queued (idx_jobs_active_url)
+    assert queue.retry_failed() == 1
+    assert queue.get(ids[1])["status"] == "queued"
+    assert queue.get(ids[1])["attempts"] == 0
+    assert queue.get(ids[0])["status"] == "cancelled"
+
+
+def test_retry_failed_skips_urls_with_an_active_job(queue):
+    failed = queue.enqueue(["https://a.com/"])["enqueued"][0]
+    queue.lease("owner")
+    queue.fail(failed, "owner", "boom", retryable=False)
+    active = queue.enqueue(["https://a.com/"])["enqueued"][0]
+
+    assert queue.retry_failed() == 0
+    assert queue.get(failed)["status"] == "cancelled"
+    assert queue.get(active)["status"] == "queued"
+    assert queue.pending() == 1
+
+
+def test_cancel_only_affects_queued_jobs(queue):
+    running = queue.enqueue(["https://a.com/1"])["enqueued"][0]
+    queued = queue.enqueue(["https://a.com/2"])["enqueued"][0]
+    queue.lease("owner")  # Reserva el más antiguo
+    assert not queue.cancel(running)
+    assert queue.cancel(queued)
+    assert queue.get(queued)["status"] == "cancelled"
@@ -0,0 +1,112 @@
+"""CrawlSegmentStore: registros empaquetados, segmentos, lectura secuencial y migración"""
+
+import json
+import os
+
+import pytest
+
+
+@pytest.fixture
+def store(bs, tmp_path):
+    store = bs.CrawlSegmentStore(str(tmp_path), segment_bytes=1024 * 1024)
+    yield store
+    store.close()
+
+
+def artifact(path, url="https://example.com/page", crawled_at=1000.0, title="Página"):
+    return {"content_path": path, "url": url, "crawled_at": crawled_at, "title": title}
+
+
+def test_append_and_read_back(store):
+    content = "# Título\n\nContenido con acentos: áéíóú".encode()
+    packed = store.append_many([(artifact("/crawled/a_content.md"), content, {"url": "https://example.com/page"})])
+
+    assert packed == 1
+    assert store.read("/crawled/a_content.md") == content.decode()
+    assert store.read_metadata("/crawled/a_content.md") == {"url": "https://example.com/page"}
+    row = store.get("/crawled/a_content.md")
+    assert row["normalized_url"] == "https://example.com/page"
+    assert row["domain"] == "example.com"
+    assert row["size"] == len(content)
+    assert store.read("/crawled/missing.md") is None
+
+
+def test_identical_content_is_not_packed_twice(store):
+    item = (artifact("/crawled/a_content.md"), b"igual", {})
+    assert store.append_many([item]) == 1
+    assert store.append_many([item]) == 0
+    assert store.stats()["records"] == 1
+
+
+def test_records_roll_over_to_new_segments(bs, tmp_path):
+    store = bs.CrawlSegmentStore(str(tmp_path), segment_bytes=64)
+    try:
+        items = [(artifact(f"/crawled/{i}_content.md", f"https://example.com/{i}", crawled_at=float(i)),
+                  os.urandom(100), {"i": i}) for i in range(3)]
+        assert store.append_many(items) == 3
+        assert store.stats()["segments"] == 3
+
+        records = list(store.iter_records())
+        assert [record["metadata"]["i"] for record in records] == [0, 1, 2]
+        assert [record["segment"] for record in records] == [1, 2, 3]
+    finally:
+        store.close()
+
+
+def test_iter_records_filters_before_decoding(store, monkeypatch):
+    store.append_many([
+        (artifact(f"/crawled/{i}_content.md", f"https://example.com/{i}", crawled_at=float(i)), b"x" * i, {})
+        for i in range(1, 5)
+    ])
+    decoded = []
+    original = store._decode
+    monkeypatch.setattr(store, "_decode", lambda record: decoded.append(1) or original(record))
+
+    records = list(store.iter_records(since=2.0, source_paths={"/crawled/3_content.md", "/crawled/1_content.md"}))
+    assert [record["source_path"] for record in records] == ["/crawled/3_content.md"]
+    assert len(decoded) == 1
+
+
+def test_corrupt_record_is_rejected(bs, store):
+    record = bytearray(store._encode({"url": "u"}, b"contenido"))
+    record[-1] ^= 0xFF
+    with pytest.raises(ValueError):
+        bs.CrawlSegmentStore._decode(bytes(record))
+
+
+def test_interrupted_append_is_discarded(store):
+    store.append_many([(artifact("/crawled/a_content.md"), b"primero", {})])
+    segment_path = store._segment_path(1)
+    # Cola sin indexar de una escritura que no llegó a confirmarse
+    with open(segment_path, "ab") as segment_file:
+        segment_file.write(b"basura")
+    store.append_many([(artifact("/crawled/b_content.md", "https://example.com/b"), b"segundo", {})])
+
+    assert store.read("/crawled/a_content.md") == "primero"
+    assert store.read("/crawled/b_content.md") == "segundo"
+
+
+def test_pack_artifacts_moves_loose_files_into_segments(bs, tmp_path):
+    crawled = tmp_path / "crawled"
+    crawled.mkdir()
+    content_path = crawled / "example_com_content.md"
+    metadata_path = crawled / "example_com_metadata.json"
+    content_path.write_text("contenido suelto", encoding="utf-8")
+    metadata_path.write_text(json.dumps({"url": "https://example.com/", "title": "Ejemplo"}), encoding="utf-8")
+    with open(crawled / "index.jsonl", "w", encoding="utf-8") as manifest:
+        manifest.write(json.dumps({"url": "https://example.com/", "contentFile": str(content_path),
+                                   "metadataFile": str(metadata_path), "title": "Ejemplo",
+                                   "timestamp": "2026-01-01T00:00:00Z"}) + "\n")
+
+    index = bs.CrawlArtifactIndex(str(crawled))
+    try:
+        stats = index.packed.pack_artifacts(index)
+        assert stats["packed"] == 1
+        assert stats["removedFiles"] == 2
+        assert not content_path.exists()
+        # La ruta original sigue siendo la clave del artefacto
+        assert index.read_content(str(content_path)) == "contenido suelto"
+        assert index.packed.read_metadata(str(content_path))["title"] == "Ejemplo"
+        assert [item["content"] for item in index.iter_contents()] == ["contenido suelto"]
+    finally:
+        index.close()
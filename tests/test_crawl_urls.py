@@ -0,0 +1,120 @@
+"""OllamaMCPSession.crawl_urls con un executor MCP falso (sin servidor ni red)"""
+
+import asyncio
+import json
+
+import pytest
+
+
+class FakeExecutor:
+    """Responde a bs.ingest_url como el servidor MCP; responses[url] sustituye la respuesta"""
+
+    def __init__(self, responses=None, delay=0.01):
+        self.responses = responses or {}
+        self.delay = delay
+        self.calls = []
+        self.active = self.max_active = 0
+
+    async def execute_tool(self, tool, arguments):
+        url = arguments["url"]
+        self.calls.append((tool, url))
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.active -= 1
+        response = self.responses.get(url)
+        if isinstance(response, Exception):
+            raise response
+        if response is not None:
+            return response
+        return tool_response({"status": "completed", "url": url, "title": f"Título {url}", "contentSize": 42,
+                              "files": {"contentFile": f"/crawled/{len(self.calls)}_content.md"}})
+
+
+def tool_response(payload):
+    text = payload if isinstance(payload, str) else json.dumps(payload)
+    return {"jsonrpc": "2.0", "id": 1, "result": {"content": [{"type": "text", "text": text}]}}
+
+
+@pytest.fixture
+def session(bs, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    session = bs.OllamaMCPSession()
+    session.mcp_executor = FakeExecutor()
+    return session
+
+
+def collect(session, run, urls, **options):
+    async def main():
+        return [result async for result in session.crawl_urls(urls, **options)]
+    return run(main())
+
+
+def test_every_unique_url_yields_one_result(session, run):
+    results = collect(session, run, ["https://a.com/1", " https://a.com/1 ", "https://b.com/", ""],
+                      concurrency=4, domain_delay=0)
+
+    assert sorted(result["url"] for result in results) == ["https://a.com/1", "https://b.com/"]
+    assert all(result["status"] == "completed" and result["contentSize"] == 42 for result in results)
+    assert all(tool == "bs.ingest_url" for tool, _ in session.mcp_executor.calls)
+
+
+def test_failures_become_error_results(session, run):
+    session.mcp_executor.responses = {
+        "https://a.com/down": ConnectionError("servidor MCP caído"),
+        "https://a.com/rpc": {"error": {"code": -32000, "message": "Timeout"}},
+        "https://a.com/site": tool_response({"error": "404 Not Found"}),
+        "https://a.com/text": tool_response("no es JSON"),
+    }
+    results = {result["url"]: result for result in collect(session, run, list(session.mcp_executor.responses),
+                                                           concurrency=2, per_domain_limit=2, domain_delay=0)}
+
+    assert {url: result["status"] for url, result in results.items()} == dict.fromkeys(results, "error")
+    assert results["https://a.com/down"]["error"] == "servidor MCP caído"
+    assert results["https://a.com/rpc"]["error"] == "Timeout"
+    assert results["https://a.com/site"]["error"] == "404 Not Found"
+    assert results["https://a.com/text"]["error"] == "Respuesta MCP sin contenido JSON"
+
+
+def test_non_object_payload_does_not_hang(session, run):
+    session.mcp_executor.responses = {"https://a.com/": tool_response([1, 2])}
+
+    async def main():
+        return await asyncio.wait_for(
+            asyncio.ensure_future(_collect_async(session, ["https://a.com/", "https://b.com/"])), timeout=5
+        )
+
+    results = {result["url"]: result for result in run(main())}
+    assert results["https://a.com/"]["status"] == "error"
+    assert results["https://b.com/"]["status"] == "completed"
+
+
+async def _collect_async(session, urls):
+    return [result async for result in session.crawl_urls(urls, domain_delay=0)]
+
+
+def test_concurrency_limits_are_respected(session, run):
+    urls = [f"https://a.com/{i}" for i in range(6)] + [f"https://b.com/{i}" for i in range(6)]
+    results = collect(session, run, urls, concurrency=3, per_domain_limit=1, domain_delay=0)
+
+    assert len(results) == 12
+    # Como mucho un crawl por dominio: con dos dominios nunca hay tres a la vez
+    assert session.mcp_executor.max_active == 2
+
+
+def test_closing_the_stream_cancels_pending_crawls(session, run):
+    session.mcp_executor.delay = 0.05
+    urls = [f"https://site{i}.com/" for i in range(10)]
+
+    async def main():
+        stream = session.crawl_urls(urls, concurrency=2, domain_delay=0)
+        first = await stream.__anext__()
+        await stream.aclose()
+        await asyncio.sleep(0.1)
+        return first
+
+    assert run(main())["status"] == "completed"
+    assert len(session.mcp_executor.calls) < len(urls)
+    assert session.mcp_executor.active == 0
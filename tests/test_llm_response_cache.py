@@ -0,0 +1,139 @@
+"""LLMResponseCache: LRU en memoria, TTL, persistencia en disco y coalescencia"""
+
+import asyncio
+import threading
+
+import pytest
+
+
+def test_key_is_independent_of_argument_order(bs):
+    assert bs.LLMResponseCache.make_key(model="m", prompt="p") == bs.LLMResponseCache.make_key(prompt="p", model="m")
+    assert bs.LLMResponseCache.make_key(model="m", prompt="p") != bs.LLMResponseCache.make_key(model="m", prompt="q")
+
+
+def test_memory_lru_evicts_least_recently_used(bs):
+    cache = bs.LLMResponseCache(max_entries=2)
+    cache.put("a", {"v": 1})
+    cache.put("b", {"v": 2})
+    assert cache.get("a") == {"v": 1}
+    cache.put("c", {"v": 3})
+
+    assert cache.get("b") is None
+    assert cache.get("a") == {"v": 1}
+    assert cache.get("c") == {"v": 3}
+
+
+def test_expired_entries_are_misses(bs):
+    cache = bs.LLMResponseCache(ttl=-1)
+    cache.put("a", {"v": 1})
+    assert cache.get("a") is None
+    assert "a" not in cache.entries
+
+
+def test_disk_cache_survives_a_new_instance(bs, tmp_path):
+    path = str(tmp_path / "llm-cache.sqlite")
+    first = bs.LLMResponseCache(disk_path=path)
+    first.put("a", {"v": 1})
+    first.close()
+
+    second = bs.LLMResponseCache(disk_path=path)
+    try:
+        assert second.get("a") == {"v": 1}
+    finally:
+        second.close()
+
+
+def test_disk_cache_keeps_at_most_max_disk_entries(bs, tmp_path):
+    cache = bs.LLMResponseCache(max_entries=1, disk_path=str(tmp_path / "llm-cache.sqlite"), max_disk_entries=2)
+    try:
+        for key in "abc":
+            cache.put(key, {"v": key})
+        assert cache.conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0] == 2
+    finally:
+        cache.close()
+
+
+def test_get_or_generate_uses_the_disk_from_a_thread(bs, run, tmp_path):
+    path = str(tmp_path / "llm-cache.sqlite")
+    threads = []
+
+    def on_disk(cache):
+        for name in ("_load", "_store"):
+            method = getattr(cache, name)
+
+            def recorded(*args, method=method):
+                threads.append(threading.current_thread())
+                return method(*args)
+            setattr(cache, name, recorded)
+        return cache
+
+    async def generate():
+        return {"content": "respuesta"}
+
+    first = on_disk(bs.LLMResponseCache(disk_path=path))
+    second = on_disk(bs.LLMResponseCache(disk_path=path))
+    try:
+        assert run(first.get_or_generate("k", generate)) == ({"content": "respuesta"}, "miss")
+        assert run(second.get_or_generate("k", generate)) == ({"content": "respuesta"}, "hit")
+        assert second.entries["k"][1] == {"content": "respuesta"}
+    finally:
+        first.close()
+        second.close()
+    # Miss de first (lectura y escritura) y hit de second (lectura)
+    assert len(threads) == 3
+    assert threading.main_thread() not in threads
+
+
+def test_identical_concurrent_requests_share_one_generation(bs, run):
+    cache = bs.LLMResponseCache()
+    calls = []
+
+    async def generate():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"content": "respuesta"}
+
+    async def main():
+        return await asyncio.gather(*[cache.get_or_generate("k", generate) for _ in range(3)])
+
+    results = run(main())
+    assert len(calls) == 1
+    assert [value for value, _ in results] == [{"content": "respuesta"}] * 3
+    assert sorted(status for _, status in results) == ["coalesced", "coalesced", "miss"]
+    assert run(cache.get_or_generate("k", generate))[1] == "hit"
+
+
+def test_failed_generation_is_retried_by_a_waiting_request(bs, run):
+    cache = bs.LLMResponseCache()
+    attempts = []
+
+    async def generate():
+        attempts.append(1)
+        await asyncio.sleep(0.01)
+        if len(attempts) == 1:
+            raise RuntimeError("Ollama caído")
+        return {"content": "ok"}
+
+    async def main():
+        return await asyncio.gather(cache.get_or_generate("k", generate), cache.get_or_generate("k", generate),
+                                    return_exceptions=True)
+
+    first, second = run(main())
+    assert isinstance(first, RuntimeError)
+    assert second == ({"content": "ok"}, "miss")
+    assert len(attempts) == 2
+    assert "k" not in cache.in_flight
+
+
+def test_cancelled_generation_does_not_leave_an_in_flight_entry(bs, run):
+    cache = bs.LLMResponseCache()
+
+    async def main():
+        task = asyncio.create_task(cache.get_or_generate("k", lambda: asyncio.sleep(10)))
+        await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    run(main())
+    assert cache.in_flight == {}
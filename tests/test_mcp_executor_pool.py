@@ -0,0 +1,79 @@
+"""MCPExecutorPool contra benchmarks/stub_mcp_server.py: reparto, sustitución de caídos y escalado"""
+
+import asyncio
+
+
+def run_pool(run, pool, scenario):
+    async def main():
+        assert await pool.start_mcp_server()
+        try:
+            return await scenario()
+        finally:
+            await pool.stop()
+    return run(main())
+
+
+def call(pool, i):
+    return pool.execute_tool("bs.ingest_url", {"url": f"https://a.com/{i}"})
+
+
+def test_calls_go_to_the_least_busy_worker(bs, run, stub_command):
+    pool = bs.MCPExecutorPool(stub_command(latency_ms=300), min_workers=2)
+
+    async def scenario():
+        calls = [asyncio.create_task(call(pool, i)) for i in range(6)]
+        await asyncio.sleep(0.1)
+        load = sorted(pool.load.values())
+        responses = await asyncio.gather(*calls)
+        return load, responses
+
+    load, responses = run_pool(run, pool, scenario)
+    assert load == [3, 3]
+    assert not any(response.get("error") for response in responses)
+    assert pool.workers == [] and not pool.initialized
+
+
+def test_dead_worker_is_skipped_and_replaced(bs, run, stub_command):
+    pool = bs.MCPExecutorPool(stub_command(latency_ms=10), min_workers=2, health_interval=0.1)
+
+    async def scenario():
+        dead = pool.workers[0]
+        dead.mcp_process.kill()
+        await dead.mcp_process.wait()
+        response = await call(pool, 0)
+        await asyncio.sleep(0.5)
+        return response, [worker.is_alive() for worker in pool.workers], dead in pool.workers
+
+    response, alive, still_pooled = run_pool(run, pool, scenario)
+    assert not response.get("error")
+    assert not still_pooled
+    assert alive == [True, True]
+
+
+def test_scales_up_under_load_and_back_down_when_idle(bs, run, stub_command):
+    pool = bs.MCPExecutorPool(stub_command(latency_ms=200), min_workers=1, max_workers=2, scale_up_load=2,
+                              health_interval=0.1, idle_timeout=0.2)
+
+    async def scenario():
+        # Dos llamadas en vuelo alcanzan scale_up_load en el único worker
+        await asyncio.gather(*[call(pool, i) for i in range(2)])
+        await pool.scaling_task
+        peak = len(pool.workers)
+        await asyncio.sleep(0.8)
+        return peak, len(pool.workers)
+
+    peak, after = run_pool(run, pool, scenario)
+    assert peak == 2
+    assert after == 1
+
+
+def test_no_workers_left_is_an_error_not_a_hang(bs, run, stub_command):
+    pool = bs.MCPExecutorPool(stub_command(latency_ms=10), min_workers=1)
+
+    async def scenario():
+        pool.workers[0].mcp_process.kill()
+        await pool.workers[0].mcp_process.wait()
+        return await asyncio.wait_for(call(pool, 0), timeout=5)
+
+    response = run_pool(run, pool, scenario)
+    assert response["error"]["message"] == "No hay workers MCP disponibles"
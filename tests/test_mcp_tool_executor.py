@@ -0,0 +1,57 @@
+"""MCPToolExecutor contra benchmarks/stub_mcp_server.py: multiplexación por ID y caída del lector"""
+
+import asyncio
+import json
+import time
+
+
+def payload_url(response):
+    return json.loads(response["result"]["content"][0]["text"])["url"]
+
+
+def test_concurrent_calls_get_their_own_out_of_order_responses(bs, run, stub_command):
+    # Latencias de 20 a 380 ms: el servidor responde en otro orden que el de envío
+    executor = bs.MCPToolExecutor(stub_command(latency_ms=200, jitter_ms=180), verbose=False)
+    urls = [f"https://site{i}.com/" for i in range(20)]
+    completed = []
+
+    async def call(url):
+        response = await executor.execute_tool("bs.ingest_url", {"url": url}, retries=0)
+        completed.append(url)
+        return response
+
+    async def main():
+        await executor.start_mcp_server()
+        try:
+            started = time.monotonic()
+            responses = await asyncio.gather(*[call(url) for url in urls])
+            return responses, time.monotonic() - started
+        finally:
+            await executor.stop()
+
+    responses, elapsed = run(main())
+    assert [payload_url(response) for response in responses] == urls
+    assert completed != urls
+    # Todas en vuelo a la vez sobre un único proceso, no una detrás de otra
+    assert elapsed < 2.0
+    assert executor.pending_requests == {}
+
+
+def test_pending_calls_fail_when_the_server_dies(bs, run, stub_command):
+    executor = bs.MCPToolExecutor(stub_command(latency_ms=10000), verbose=False)
+
+    async def main():
+        await executor.start_mcp_server()
+        try:
+            calls = [asyncio.create_task(executor.execute_tool("bs.ingest_url", {"url": f"https://a.com/{i}"},
+                                                                 retries=0)) for i in range(3)]
+            await asyncio.sleep(0.2)
+            assert executor.in_flight == 3
+            executor.mcp_process.kill()
+            return await asyncio.wait_for(asyncio.gather(*calls), timeout=5)
+        finally:
+            await executor.stop()
+
+    responses = run(main())
+    assert [response["error"]["message"] for response in responses] == ["Servidor MCP desconectado"] * 3
+    assert executor.pending_requests == {}